@@ -1,4 +1,5 @@
 from res_ads.utils.getredis import get_redis_client
+from scrapy_redis.utils import push_start_urls
 import json
 
 k = "realestate_spider:testurls"
@@ -6,4 +7,5 @@ k = "realestate_spider:testurls"
 url = "https://www.realestate.com.au/property-acreage+semi-rural-vic-langwarrin-148001440"
 data = {"url":url, "meta":{}}
 r = get_redis_client()
-r.lpush(k, json.dumps(data))
\ No newline at end of file
+# 推送后通过 Pub/Sub 唤醒正在等待的 spider
+push_start_urls(r, k, json.dumps(data))
\ No newline at end of file
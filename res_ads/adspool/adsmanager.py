@@ -1,6 +1,7 @@
 import requests
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from selenium import webdriver
 from selenium.common.exceptions import WebDriverException, InvalidSessionIdException
 from selenium.webdriver.chrome.options import Options
@@ -8,14 +9,29 @@ from selenium.webdriver.chrome.service import Service
 
 logger = logging.getLogger(__name__)
 
+# 备用 profile 的预热和失效会话的关闭在后台线程中进行，不占用采集线程
+_background = ThreadPoolExecutor(max_workers=4, thread_name_prefix='ads-standby')
+
+
 class AdsPowerDriverManager:
-    def __init__(self, user_id, api_key, api_host="http://local.adspower.net:50325"):
+    def __init__(self, user_id, api_key, api_host="http://local.adspower.net:50325", network_policy=None,
+                 capture_responses=False, standby_user_id=None):
         self.user_id = user_id
         self.api_key = api_key
         self.api_host = api_host
+        self.network_policy = network_policy  # NetworkPolicy，连接浏览器后应用
+        self.capture_responses = capture_responses  # 开启 performance 日志，用于统计页面流量和读取浏览器已下载的图片内容
         self.driver = None
         self.webdriver_path = None
         self.debugger_address = None
+        # 热备：另一个 profile 在后台保持启动，当前会话失效时直接切换，不必等待冷启动
+        self.standby = None
+        self._standby_future = None
+        self.failovers = 0
+        if standby_user_id:
+            self.standby = AdsPowerDriverManager(standby_user_id, api_key, api_host=api_host,
+                                                 network_policy=network_policy,
+                                                 capture_responses=capture_responses)
 
     def start_browser(self):
         """
@@ -27,23 +43,108 @@ class AdsPowerDriverManager:
             if resp.get("code") != 0:
                 logger.error(f"启动浏览器失败，user_id: {self.user_id}, 错误信息: {resp.get('msg')}")
                 return False
-
-            self.webdriver_path = resp["data"]["webdriver"]
-            self.debugger_address = resp["data"]["ws"]["selenium"]
-
-            chrome_options = Options()
-            chrome_options.add_experimental_option("debuggerAddress", self.debugger_address)
-            chrome_options.add_argument("--disable-gpu")
-
-            service = Service(executable_path=self.webdriver_path)
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            self.driver.set_page_load_timeout(300)
+            self._connect(resp["data"])
             logger.info(f"成功启动浏览器，user_id: {self.user_id}")
             return True
         except Exception as e:
             logger.error(f"启动浏览器时发生异常，user_id: {self.user_id}, 异常信息: {e}")
             return False
 
+    def attach_browser(self):
+        """
+        连接已经在运行的 AdsPower 浏览器实例（爬虫重启时不必关闭再冷启动）。
+        实例未运行或连接后会话无效时返回 False。
+        """
+        active_url = f"{self.api_host}/api/v1/browser/active?user_id={self.user_id}&api_key={self.api_key}"
+        try:
+            resp = requests.get(active_url).json()
+            data = resp.get("data") or {}
+            if resp.get("code") != 0 or data.get("status") != "Active":
+                return False
+            self._connect(data)
+        except Exception as e:
+            logger.warning(f"连接运行中的浏览器失败，user_id: {self.user_id}, 异常信息: {e}")
+            self.driver = None
+            return False
+        if not self.is_driver_valid():
+            return False
+        logger.info(f"已连接运行中的浏览器，user_id: {self.user_id}")
+        return True
+
+    def _connect(self, data):
+        self.webdriver_path = data["webdriver"]
+        self.debugger_address = data["ws"]["selenium"]
+
+        chrome_options = Options()
+        chrome_options.add_experimental_option("debuggerAddress", self.debugger_address)
+        chrome_options.add_argument("--disable-gpu")
+        if self.capture_responses:
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+        service = Service(executable_path=self.webdriver_path)
+        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        self.driver.set_page_load_timeout(300)
+        if self.network_policy is not None:
+            self.network_policy.apply(self.driver)
+
+    def prepare_standby(self):
+        """在后台启动备用 profile（已在运行时直接连接）。"""
+        if self.standby is None:
+            return
+        standby = self.standby
+        self._standby_future = _background.submit(lambda: standby.attach_browser() or standby.restart_browser())
+
+    def standby_ready(self):
+        future = self._standby_future
+        return (future is not None and future.done() and not future.exception() and future.result()
+                and self.standby.is_driver_valid())
+
+    def failover(self, standby_wait=120):
+        """
+        当前会话失效时恢复：备用 profile 已就绪时交换两者的会话（立即完成），失效的会话在后台关闭并重新启动，
+        成为新的备用；备用正在启动时最多等待 standby_wait 秒；没有可用的备用时退回到 restart_browser。
+        """
+        future = self._standby_future
+        if future is not None and not future.done():
+            # 备用浏览器正在启动，等它比重新冷启动当前 profile 更快
+            try:
+                future.result(timeout=standby_wait)
+            except Exception as e:
+                logger.warning(f"等待备用浏览器启动失败：{e}")
+        if not self.standby_ready():
+            logger.warning(f"没有就绪的备用浏览器，重新启动，user_id: {self.user_id}")
+            if not self.restart_browser():
+                return False
+            # 备用的预热失败或会话失效时重新预热
+            if self.standby is not None and (self._standby_future is None or self._standby_future.done()):
+                self.prepare_standby()
+            return True
+
+        failed_user_id = self.user_id
+        self._swap(self.standby)
+        self.failovers += 1
+        standby = self.standby
+        self._standby_future = _background.submit(standby.restart_browser)
+        logger.info(f"切换到备用浏览器，user_id: {failed_user_id} -> {self.user_id}")
+        return True
+
+    def _swap(self, other):
+        for name in ('user_id', 'driver', 'webdriver_path', 'debugger_address'):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            setattr(self, name, theirs)
+            setattr(other, name, mine)
+
+    def close(self, timeout=60):
+        """关闭当前会话和备用 profile。"""
+        self.stop_browser()
+        if self.standby is not None:
+            if self._standby_future is not None:
+                try:
+                    self._standby_future.result(timeout=timeout)
+                except Exception as e:
+                    logger.warning(f"等待备用浏览器启动时发生异常：{e}")
+            self.standby.stop_browser()
+
     def is_driver_valid(self):
         """
         检查当前 WebDriver 是否有效。
@@ -0,0 +1,528 @@
+import base64
+import json
+import logging
+import re
+import time
+
+from scrapy import Selector
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.action_chains import ActionChains
+
+from res_ads.exceptions import BlockPageError
+from res_ads.parser import image_size
+
+logger = logging.getLogger('capture')
+
+OFF_MARKET_XPATH = '//div[@data-testid="error-404"]//h1[contains(text(), "Looks like this page is off the market")]'
+# 反爬拦截页：没有房源内容，只有访问被拒绝/验证提示
+BLOCK_PAGE_XPATH = ('//title[contains(text(), "Access Denied") or contains(text(), "Attention Required")]'
+                    ' | //h1[contains(text(), "Access Denied")]'
+                    ' | //*[contains(text(), "Your request could not be processed")]')
+
+# 一次性读取 gallery 的完整图片列表，返回候选列表（每个候选是按顺序排列的链接数组）：
+# 1. PhotoSwipe 实例（v4 的 items / v5 的 dataSource）
+# 2. 页面内嵌的 ArgonautExchange 状态中 media.images[].templatedUrl（含 {size} 占位符）
+GALLERY_STATE_JS = """
+var candidates = [];
+var pswp = window.pswp || (window.lightbox && window.lightbox.pswp);
+if (pswp) {
+    var items = pswp.items || (pswp.options && pswp.options.dataSource) || [];
+    var srcs = [];
+    for (var i = 0; i < items.length; i++) {
+        if (items[i] && items[i].src) { srcs.push(items[i].src); }
+    }
+    if (srcs.length) { candidates.push(srcs); }
+}
+function walk(node, depth) {
+    if (!node || typeof node !== 'object' || depth > 40) { return; }
+    if (node.media && Array.isArray(node.media.images)) {
+        var urls = [];
+        node.media.images.forEach(function (img) {
+            var url = img && (img.templatedUrl || img.url || img.src);
+            if (url) { urls.push(url); }
+        });
+        if (urls.length) { candidates.push(urls); }
+    }
+    for (var key in node) {
+        var value = node[key];
+        if (typeof value === 'string' && (value.charAt(0) === '{' || value.charAt(0) === '[')) {
+            try { value = JSON.parse(value); } catch (e) { continue; }
+        }
+        walk(value, depth + 1);
+    }
+}
+walk(window.ArgonautExchange, 0);
+return candidates;
+"""
+
+# 解析需要的页面区块：anchor 是区块容器（用来定位滚动），ready 表示区块已经填充了内容，timeout 为秒
+READY_SECTIONS = [
+    {'name': 'address', 'anchor': 'h1.property-info-address', 'ready': 'h1.property-info-address', 'timeout': 10},
+    {'name': 'primary_features', 'anchor': 'ul.property-info__primary-features',
+     'ready': 'ul.property-info__primary-features li', 'timeout': 6},
+    {'name': 'static_map', 'anchor': '.static-map__img', 'ready': '.static-map__img[style*="url("]', 'timeout': 6},
+    {'name': 'features', 'anchor': '[data-testid="all-property-features-section"]',
+     'ready': '[data-testid="all-property-features-section"] p', 'timeout': 6},
+    {'name': 'agent_panel', 'anchor': '.contact-agent-panel',
+     'ready': '.contact-agent-panel .agent-info__name', 'timeout': 8},
+]
+# 出现这些元素时页面不会再有房源区块（下架 404 页），不再等待
+READY_ABORT_SELECTOR = '[data-testid="error-404"]'
+
+# 依次处理每个区块：直接滚动到区块容器，用 MutationObserver 监听内容填充，满足 ready 选择器立即进入下一个区块。
+# 容器还没挂载时每 250ms 向下翻一屏，触发懒加载。返回 {name: {'ready': bool, 'ms': int}}
+READY_JS = """
+var sections = arguments[0], abortSelector = arguments[1], done = arguments[arguments.length - 1];
+var results = {}, index = 0;
+function next() {
+    if (index >= sections.length || (abortSelector && document.querySelector(abortSelector))) {
+        window.scrollTo(0, 0);
+        done(results);
+        return;
+    }
+    var section = sections[index++], started = performance.now();
+    var finished = false, scrolled = false, observer = null, timer = null, stepper = null;
+    function finish(ready) {
+        if (finished) { return; }
+        finished = true;
+        if (observer) { observer.disconnect(); }
+        clearTimeout(timer);
+        clearInterval(stepper);
+        results[section.name] = {ready: ready, ms: Math.round(performance.now() - started)};
+        next();
+    }
+    function check() {
+        if (!scrolled) {
+            var anchor = document.querySelector(section.anchor);
+            if (anchor) {
+                anchor.scrollIntoView({block: 'center'});
+                scrolled = true;
+            }
+        }
+        if (document.querySelector(section.ready)) {
+            finish(true);
+            return true;
+        }
+        return false;
+    }
+    if (check()) { return; }
+    observer = new MutationObserver(check);
+    observer.observe(document.body, {childList: true, subtree: true, attributes: true, attributeFilter: ['style', 'src', 'class']});
+    stepper = setInterval(function () {
+        if (!scrolled) { window.scrollBy(0, window.innerHeight); }
+        check();
+    }, 250);
+    timer = setTimeout(function () { finish(false); }, section.timeout * 1000);
+}
+next();
+"""
+
+
+class BrowserCaptureError(Exception):
+    """
+    浏览器采集失败。不继承 OSError，Scrapy 的 RetryMiddleware 不会立即重试，
+    由 spider 的 errback 按失败类型（timeout）放入 retry_request 的延迟重试队列。
+    """
+
+
+class ListingCapture:
+    """
+    在一个 WebDriver 会话中完成房源页面的加载、滚动和 gallery 图片采集。
+
+    所有方法都是阻塞调用，只能在 browser 线程中执行。
+    """
+
+    js_top = "window.scrollTo({ top: 0, behavior: 'smooth' });"
+    js_gallery_srcs = ("return Array.from(document.querySelectorAll('img.pswp__img'))"
+                       ".map(function (img) { return img.src; }).filter(Boolean);")
+    js_current_src = ("var img = document.querySelector('.pswp__item:not([aria-hidden=\"true\"]) img.pswp__img')"
+                      " || document.querySelector('img.pswp__img'); return img ? img.src : null;")
+    # 跳到第 arguments[0] 张（从 0 开始），没有 PhotoSwipe 实例时返回 false
+    js_goto = ("var pswp = window.pswp || (window.lightbox && window.lightbox.pswp);"
+               " if (!pswp || !pswp.goTo) { return false; } pswp.goTo(arguments[0]); return true;")
+
+    js_load_ms = """
+var nav = performance.getEntriesByType('navigation')[0] || {};
+var end = nav.loadEventEnd || nav.domContentLoadedEventEnd || performance.now();
+return Math.round(end - (nav.startTime || 0));
+"""
+
+    def __init__(self, driver, scroll='auto', page_load_timeout=60, sections=None, spool=None):
+        """
+        :param scroll: 'auto' 按 READY_SECTIONS 等待解析需要的区块就绪（见 wait_until_ready）；
+                       'always' 缓慢滚动到底部（旧方式）
+        :param page_load_timeout: 页面加载超时（秒），超时后页面主体已可用时直接使用
+        :param sections: 覆盖 READY_SECTIONS
+        :param spool: MediaSpool，设置后把浏览器已下载的 gallery 图片写入 spool（需要浏览器开启 performance 日志）
+        """
+        self.driver = driver
+        self.scroll = scroll
+        self.page_load_timeout = page_load_timeout
+        self.sections = sections if sections is not None else READY_SECTIONS
+        self.spool = spool
+        # 当前页面的 CDP Network 事件，performance 日志读取后即被清空，这里累积保存
+        self.events = []
+
+    def capture(self, url, known_images=None):
+        """
+        加载 url 并返回采集结果。
+        known_images 是上一次尝试已经采集到的 gallery 链接（request.meta['gallery_partial']），
+        逐张点击时与本次采集到的链接合并：
+        {
+            'page_source': 滚动完成后的页面源码（点击 gallery 之前）,
+            'gallery': {'images': [...], 'total_images': int | None},
+            'off_market': bool,
+            'readiness': {区块: {'ready': bool, 'ms': int}},
+            'metrics': {'bytes': int, 'resources': int, 'load_ms': int}（打开 gallery 之前）,
+            'spooled': 写入 spool 的图片链接,
+        }
+        """
+        # 丢弃上一个页面留下的 performance 日志
+        self.performance_log()
+        self.events = []
+        if not self.safe_get(url):
+            raise BrowserCaptureError(f"load page failed: {url}")
+
+        readiness = {}
+        if self.scroll == 'always':
+            self.scroll_down_slowly()
+        else:
+            readiness = self.wait_until_ready()
+        metrics = self.page_metrics()
+
+        page_source = self.driver.page_source
+        sel = Selector(text=page_source)
+
+        result = {
+            'page_source': page_source,
+            'gallery': {'images': [], 'total_images': None},
+            'off_market': False,
+            'readiness': readiness,
+            'metrics': metrics,
+            'spooled': [],
+        }
+
+        if sel.xpath(BLOCK_PAGE_XPATH):
+            raise BlockPageError(f"block page: {url}")
+
+        # 检查页面中是否包含特定的文本
+        if sel.xpath(OFF_MARKET_XPATH):
+            logger.info(f"跳过页面：{url}，因为包含指定的文本。")
+            result['off_market'] = True
+            return result
+
+        result['gallery'] = self.capture_gallery(sel, known_images)
+        if self.spool is not None:
+            # 首图（hero-image）和 gallery 图片就是 spider 放进 origin_images 的链接
+            wanted = set(result['gallery']['images'])
+            wanted.update(sel.xpath('//div[@class="hero-image"]//source/@srcset').getall())
+            result['spooled'] = self.spool_responses(wanted)
+        return result
+
+    def safe_get(self, url: str, retries: int = 1, delay: int = 5) -> bool:
+        """
+        尝试加载页面，若发生 TimeoutException，则重试指定次数。
+        默认只加载一次，失败后由 spider 的 retry_request 按退避策略重试，不在 browser 线程中等待。
+        :param url: 要加载的 URL
+        :param retries: 最大尝试次数（至少为 1）
+        :param delay: 每次重试前的等待时间（秒）
+        :return: True 表示加载成功，False 表示加载失败
+        """
+        if retries < 1:
+            raise ValueError("retries 必须至少为 1")
+
+        driver = self.driver
+        driver.set_page_load_timeout(self.page_load_timeout)
+
+        for attempt in range(1, retries + 1):
+            try:
+                driver.get(url)
+                return True
+            except TimeoutException as e:
+                # 第三方资源拖慢了 load 事件，但房源主体已经渲染时直接使用
+                if self.page_usable():
+                    logger.info(f"加载 {url} 超时，页面主体已可用，停止加载: {e.msg}")
+                    return True
+                logger.warning(f"第 {attempt} 次尝试加载 {url} 时发生异常: {e}")
+                if attempt < retries:
+                    self.reset_page(attempt, delay)
+            except WebDriverException as e:
+                logger.warning(f"第 {attempt} 次尝试加载 {url} 时发生异常: {e}")
+                if attempt < retries:
+                    self.reset_page(attempt, delay)
+        return False  # 所有重试失败后返回 False
+
+    def page_usable(self):
+        """停止仍在进行的加载，检查房源主体（地址标题或内嵌状态）是否已经存在。"""
+        try:
+            self.driver.execute_script("window.stop()")
+            return bool(self.driver.execute_script(
+                "return !!(window.ArgonautExchange || document.querySelector('h1.property-info-address'));"))
+        except WebDriverException:
+            return False
+
+    def reset_page(self, attempt, delay):
+        driver = self.driver
+        sleep_time = delay * (2 ** (attempt - 1))  # 指数退避
+        logger.info(f"{sleep_time} 秒后重试...")
+        time.sleep(sleep_time)
+        # 停止页面加载并清理当前页面状态
+        try:
+            driver.execute_script("window.stop()")
+        except Exception as stop_exception:
+            logger.warning(f"执行 window.stop() 时发生异常: {stop_exception}")
+        driver.get("about:blank")
+
+    def page_metrics(self):
+        """
+        页面加载的流量和耗时。
+        流量按 CDP Network.loadingFinished 的 encodedDataLength（实际传输的字节数）累加，跨域资源同样计入
+        （Performance API 中没有 Timing-Allow-Origin 的跨域资源 transferSize/encodedBodySize 都是 0）；
+        被屏蔽或失败的请求只有 Network.loadingFailed，不计入。需要浏览器开启 performance 日志，否则流量为 0。
+        耗时从 Performance API 的 navigation 记录读取。
+        """
+        finished = [event.get('params', {}) for event in self.network_events()
+                    if event['method'] == 'Network.loadingFinished']
+        metrics = {
+            'bytes': int(sum(params.get('encodedDataLength', 0) for params in finished)),
+            'resources': len(finished),
+            'load_ms': 0,
+        }
+        try:
+            metrics['load_ms'] = self.driver.execute_script(self.js_load_ms) or 0
+        except WebDriverException as e:
+            logger.warning(f"读取页面加载耗时失败: {e}")
+        return metrics
+
+    def performance_log(self):
+        """读取并清空浏览器的 performance 日志（CDP Network 事件），浏览器未开启时返回空列表。"""
+        try:
+            return self.driver.get_log('performance')
+        except WebDriverException as e:
+            logger.debug(f"读取 performance 日志失败: {e}")
+            return []
+
+    def network_events(self):
+        """读取 performance 日志中新的 CDP Network 事件，追加到 self.events 并返回当前页面的全部事件。"""
+        for entry in self.performance_log():
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, TypeError, ValueError):
+                continue
+            if message.get('method', '').startswith('Network.'):
+                self.events.append(message)
+        return self.events
+
+    def spool_responses(self, wanted):
+        """
+        从 Network.responseReceived 事件中找出 wanted 中的图片响应，用 Network.getResponseBody
+        读取浏览器已经下载的内容写入 spool，媒体管道上传时不必再下载一次。
+        必须在离开当前页面之前调用，页面跳转后响应内容会被浏览器释放。
+
+        :return: 写入 spool 的图片链接
+        """
+        request_ids = {}
+        for message in self.network_events():
+            if message['method'] != 'Network.responseReceived':
+                continue
+            params = message.get('params', {})
+            response = params.get('response', {})
+            if params.get('type') == 'Image' and response.get('status') == 200 and response.get('url') in wanted:
+                request_ids[response['url']] = params['requestId']
+
+        spooled = []
+        for url, request_id in request_ids.items():
+            try:
+                body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            except WebDriverException as e:
+                # 内容已被浏览器释放（缓存淘汰等），由媒体管道重新下载
+                logger.debug(f"读取图片内容失败 {url}: {e}")
+                continue
+            data = body.get('body', '')
+            data = base64.b64decode(data) if body.get('base64Encoded') else data.encode('utf-8')
+            if data:
+                self.spool.put(url, data)
+                spooled.append(url)
+        logger.info("spool 写入 %s/%s 张图片", len(spooled), len(wanted))
+        return spooled
+
+    def wait_until_ready(self):
+        """
+        等待解析需要的区块（READY_SECTIONS）就绪，代替逐步滚动 + 固定 sleep。
+        每个区块有自己的超时，区块已就绪时立即进入下一个。
+
+        :return: {区块: {'ready': bool, 'ms': int}}，脚本执行失败时返回空字典
+        """
+        driver = self.driver
+        driver.set_script_timeout(sum(section['timeout'] for section in self.sections) + 10)
+        try:
+            readiness = driver.execute_async_script(READY_JS, self.sections, READY_ABORT_SELECTOR) or {}
+        except WebDriverException as e:
+            logger.warning(f"等待页面区块就绪失败: {e}")
+            return {}
+        for name, result in readiness.items():
+            if not result['ready']:
+                logger.warning("区块 %s 在 %sms 内未就绪", name, result['ms'])
+        return readiness
+
+    def scroll_down_slowly(self, pause_time=0.5, scroll_increment=100):
+        """
+        缓慢地向下滚动页面，直到页面底部。
+
+        :param pause_time: 每次滚动后的暂停时间（秒）
+        :param scroll_increment: 每次滚动的像素数
+        """
+        driver = self.driver
+        last_height = driver.execute_script("return document.body.scrollHeight")
+        current_position = 0
+
+        while current_position < last_height:
+            current_position += scroll_increment
+            driver.execute_script(f"window.scrollTo(0, {current_position});")
+            time.sleep(pause_time)
+            last_height = driver.execute_script("return document.body.scrollHeight")
+
+    def capture_gallery(self, sel: Selector, known_images=None):
+        """
+        打开 gallery 并收集所有图片链接。
+
+        优先用一次 execute_script 从 PhotoSwipe 实例或页面内嵌状态（ArgonautExchange）读取完整列表，
+        读取不到或与 gallery 实际显示的不一致时，退回逐张点击“下一张”。
+
+        :param sel: 打开 gallery 之前的页面 Selector，用来读取首图 alt 中的总图片数
+        :param known_images: 上一次尝试已经采集到的链接，逐张点击时作为起点
+        :return: {'images': 按出现顺序去重的图片链接, 'total_images': 总图片数或 None,
+                  'complete': 是否采集齐, 'source': 'state' 或 'clicks'}
+        """
+        driver = self.driver
+        driver.execute_script(self.js_top)
+
+        # 提取alt属性中的总图片数
+        alt_text = sel.xpath('//div[@class="hero-image"]//img/@alt').get()
+        total_images = None
+        if alt_text:
+            match = re.search(r'image \d+ of (\d+)', alt_text)
+            if match:
+                total_images = int(match.group(1))
+                logger.info("will be crawl total images:%s", total_images)
+
+        # 点击展开gallery
+        try:
+            gallery_btn = WebDriverWait(driver, 30).until(
+                EC.element_to_be_clickable(
+                    (By.CLASS_NAME, 'hero-image'))
+            )
+            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", gallery_btn)
+            ActionChains(driver).move_to_element(gallery_btn).click().perform()
+        except Exception as e:
+            logger.error(f"Error clicking button: {e}")
+
+        # 等待页面加载
+        wait = WebDriverWait(driver, 10)
+        wait.until(EC.presence_of_element_located((By.CLASS_NAME, "pswp__img")))
+        first_src = wait.until(lambda d: (d.execute_script(self.js_current_src) or False))
+
+        images = self.gallery_from_state(first_src, total_images)
+        source = 'state'
+        if images is None:
+            images = self.gallery_from_clicks(total_images, known_images)
+            source = 'clicks'
+
+        complete = total_images is None or len(images) >= total_images
+        logger.info("收集到的图片链接大小：%s (%s)", len(images), source)
+        return {'images': images, 'total_images': total_images, 'complete': complete, 'source': source}
+
+    def gallery_from_state(self, first_src, total_images):
+        """
+        从 PhotoSwipe 实例或内嵌状态一次性读取 gallery 列表。
+        第一张必须与 gallery 当前显示的图片一致，且数量与 total_images 相符，否则返回 None。
+        """
+        try:
+            candidates = self.driver.execute_script(GALLERY_STATE_JS) or []
+        except WebDriverException as e:
+            logger.warning(f"读取 gallery 状态失败: {e}")
+            return None
+
+        # 模板链接（{size}）使用当前显示图片的尺寸段，保证与点击采集得到的链接一致；
+        # 当前图片没有尺寸段（data: URI、占位图等）时无法展开模板，改为逐张点击
+        size = image_size(first_src)
+        if not size:
+            logger.info("gallery 当前图片没有尺寸段，改为逐张点击: %.80s", first_src)
+            return None
+        for urls in candidates:
+            images = list(dict.fromkeys(url.replace('{size}', size) for url in urls))
+            if images and images[0] == first_src and (total_images is None or len(images) == total_images):
+                return images
+        logger.info("gallery 状态不可用，改为逐张点击")
+        return None
+
+    def gallery_from_clicks(self, total_images, known_images=None, stall_timeout=5, max_stalls=2):
+        """
+        逐张点击“下一张”收集图片，每次点击后等待 gallery 中的 src 变化，而不是固定 sleep。
+        数量不足时在当前位置继续等待/点击（最多 max_stalls 次），不会从第一张重新开始。
+        重试时浏览器会重新加载页面，known_images（上一次尝试采集到的链接）作为起点：先用 PhotoSwipe 的 goTo
+        跳过已采集的图片，跳转不可用时逐张点击经过，切换到已采集的图片不算作停滞。
+        两次采集到的链接合起来达到总数即可结束。
+        """
+        driver = self.driver
+        wait = WebDriverWait(driver, 10)
+
+        # 用 dict 保持插入顺序，图片按 gallery 中出现的顺序排列；两次都从第一张开始，顺序一致
+        images = dict.fromkeys(known_images or ())
+        if images:
+            try:
+                jumped = driver.execute_script(self.js_goto, len(images))
+            except WebDriverException as e:
+                jumped = False
+                logger.debug(f"gallery 跳转失败: {e}")
+            logger.info("已有 %s 张图片，%s", len(images), "跳到下一张未采集的图片" if jumped else "逐张点击经过")
+        stalls = 0
+        # 连续没有新图片的点击次数，超过已采集的数量说明已经转了一圈
+        unchanged = 0
+
+        while True:
+            # 一次脚本调用读取当前 gallery 中所有图片的 src
+            srcs = driver.execute_script(self.js_gallery_srcs) or []
+            added = False
+            for src in srcs:
+                if src not in images:
+                    logger.info("gallery add src: %s", src)
+                    images[src] = None
+                    added = True
+            unchanged = 0 if added else unchanged + 1
+
+            if total_images and len(images) >= total_images:
+                break
+            if unchanged > len(images):
+                logger.info("gallery 已转完一圈，轮播结束:%s", len(images))
+                break
+
+            current = driver.execute_script(self.js_current_src)
+            # 点击“下一张”按钮
+            try:
+                next_button = wait.until(EC.element_to_be_clickable((By.CLASS_NAME, "pswp__button--arrow--right")))
+                driver.execute_script("arguments[0].scrollIntoView({block:'center'});", next_button)
+                ActionChains(driver).move_to_element(next_button).click().perform()
+            except Exception as e:
+                logger.error(f"无法点击“下一张”按钮：{e}")
+                break
+
+            # 等待出现新图片，或当前显示的图片切换（切换到已采集的图片时继续点击）
+            try:
+                WebDriverWait(driver, stall_timeout, poll_frequency=0.1).until(
+                    lambda d: (any(src not in images for src in (d.execute_script(self.js_gallery_srcs) or []))
+                               or d.execute_script(self.js_current_src) != current)
+                )
+                stalls = 0
+            except TimeoutException:
+                stalls += 1
+                # 没有总数时无法判断是否已到最后一张，直接结束
+                if not total_images or stalls > max_stalls:
+                    logger.info("未加载新图片，轮播结束:%s", len(images))
+                    break
+                logger.info("图片未切换，在当前位置继续：%s/%s", len(images), total_images)
+
+        return list(images)
@@ -1,82 +1,249 @@
 import logging
-import threading
-from queue import Queue
-from threading import RLock
+import time
+from collections import deque
+from threading import Condition
 
-
-import requests
 from scrapy.utils.project import get_project_settings
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
+
+from res_ads.adspool.adsmanager import AdsPowerDriverManager
+from res_ads.adspool.network import NetworkPolicy
 
 logger = logging.getLogger('driverpool')
 settings = get_project_settings()
 
 
+class DriverCheckoutTimeout(TimeoutError):
+    """在 checkout_timeout 内没有借到浏览器，或连接池正在关闭。继承 TimeoutError，按 'timeout' 类型延迟重试。"""
+
+
+class ProfileMetrics:
+    """单个 profile 的计数：借出次数、等待时间、已服务页面数、会话重建次数和切换到备用浏览器的次数。"""
+
+    def __init__(self):
+        self.borrows = 0
+        self.wait_ms = 0
+        self.max_wait_ms = 0
+        self.pages = 0
+        self.failures = 0
+        self.replacements = 0
+        self.replace_failures = 0
+        self.failovers = 0
+
+    def as_dict(self, session_age):
+        return {
+            'borrows': self.borrows,
+            'wait_ms': self.wait_ms,
+            'max_wait_ms': self.max_wait_ms,
+            'pages': self.pages,
+            'failures': self.failures,
+            'replacements': self.replacements,
+            'replace_failures': self.replace_failures,
+            'failovers': self.failovers,
+            'session_age': int(session_age),
+        }
+
+
 class AdsWebDriverPool:
-    def __init__(self, user_ids):
-        self._lock = RLock()  # 改为可重入锁
-        # self.lock = threading.Lock()
-        self.pool = Queue()
+    """
+    AdsPower 浏览器连接池，每个 profile 同一时间只借给一个线程。
+
+    - 借出：空闲 profile 按 FIFO 轮换；没有空闲时等待，最多 checkout_timeout 秒，超时抛出 DriverCheckoutTimeout。
+      等待时不持有锁，其他线程可以同时归还和借出。
+    - 健康检查：借出前和归还时都检查会话；会话失效时通过 AdsPower API 停止并重新启动 profile。
+      重启失败的 profile 暂时移出轮换，revive_interval 秒后再尝试；启动时连接不上的 profile 同样处理。
+      配置了备用 profile（standby_ids）时，失效的会话直接切换到已在后台启动的备用浏览器。
+      连接池中的 user_id 是槽位，切换后实际使用的 profile 见 manager.user_id。
+    - 统计：每个 profile 的借出次数、等待时间、页面数和会话时长，见 metrics()。
+    - 关闭：close_all() 先停止借出，等待已借出的浏览器归还（最多 drain_timeout 秒），再关闭所有 profile。
+    """
+
+    def __init__(self, user_ids, api_key=None, network_policy=None, capture_responses=False,
+                 checkout_timeout=None, revive_interval=None, standby_ids=None):
+        self._cond = Condition()
+        self.idle = deque()
+        self.borrowed = set()
+        self.dead = {}  # user_id -> 下次尝试重启的时间
         self.user_ids = user_ids
+        # 按位置与 user_ids 对应的备用 profile，没有备用的 profile 失效时冷启动
+        self.standby_ids = dict(zip(user_ids, standby_ids or []))
+        self.api_key = api_key if api_key is not None else settings.get('ADS_API_KEY', '')
+        self.network_policy = network_policy if network_policy is not None else NetworkPolicy.from_settings(settings)
+        self.capture_responses = capture_responses
+        self.checkout_timeout = (checkout_timeout if checkout_timeout is not None
+                                 else settings.getfloat('ADS_POOL_CHECKOUT_TIMEOUT', 300))
+        self.revive_interval = (revive_interval if revive_interval is not None
+                                else settings.getfloat('ADS_POOL_REVIVE_INTERVAL', 60))
+        self.closing = False
+        self.managers = {}
+        self.started_at = {}
+        self.profile_metrics = {}
         self._initialize_pool()
 
+    def __len__(self):
+        """槽位数（user_ids 的个数），包括启动失败、等待重启的 profile。"""
+        return len(self.managers)
+
+    def available(self):
+        """当前在轮换中（空闲或已借出）的 profile 数。"""
+        with self._cond:
+            return len(self.idle) + len(self.borrowed)
+
     def _initialize_pool(self):
         for user_id in self.user_ids:
-            driver = self._create_driver(user_id)
-            if driver:
-                self.pool.put((user_id, driver))
-
-    def _create_driver(self, user_id):
-        # 启动 AdsPower 浏览器实例
-        open_url = f"http://local.adspower.net:50325/api/v1/browser/start?user_id={user_id}&api_key={settings.get('ADS_API_KEY')}"
-        resp = requests.get(open_url).json()
-        if resp.get("code") != 0:
-            logger.error(f"启动浏览器失败，user_id: {user_id}, 错误信息: {resp.get('msg')}")
-            return None
-
-        chrome_driver = resp["data"]["webdriver"]
-        debug_addr = resp["data"]["ws"]["selenium"]
-
-        chrome_options = Options()
-        chrome_options.add_experimental_option("debuggerAddress", debug_addr)
-        # chrome_options.page_load_strategy = 'eager'
-        chrome_options.add_argument("--disable-gpu")
-
-        service = Service(executable_path=chrome_driver)
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        driver.set_page_load_timeout(30)
-        return driver
-
-    def get_driver(self):
-        with self._lock:  # 加锁保证原子操作
-            return self.pool.get()
-
-    def release_driver(self, user_id, driver):
+            manager = AdsPowerDriverManager(user_id=user_id, api_key=self.api_key,
+                                            network_policy=self.network_policy,
+                                            capture_responses=self.capture_responses,
+                                            standby_user_id=self.standby_ids.get(user_id))
+            self.managers[user_id] = manager
+            self.started_at[user_id] = time.time()
+            self.profile_metrics[user_id] = ProfileMetrics()
+            if self._start(manager):
+                self.idle.append(user_id)
+            else:
+                # 与会话失效后重启失败的 profile 一样，revive_interval 秒后由 _revive_dead 重试
+                logger.error(f"启动浏览器失败，{self.revive_interval}s 后重试，user_id: {user_id}")
+                self.dead[user_id] = time.monotonic() + self.revive_interval
+
+    def _start(self, manager):
+        # 优先连接已在运行的实例；连接不上时关闭可能残留的实例后重新启动
+        if not manager.attach_browser():
+            manager.stop_browser()
+            if not manager.start_browser():
+                return False
+        manager.prepare_standby()
+        return True
+
+    def get_driver(self, timeout=None):
+        """
+        借一个健康的浏览器，返回 (user_id, driver)。
+        :param timeout: 最多等待的秒数，默认 checkout_timeout
+        :raise DriverCheckoutTimeout: 超时、连接池正在关闭或所有 profile 都无法重启
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            self._revive_dead()
+            with self._cond:
+                while not self.idle and not self.closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DriverCheckoutTimeout(
+                            f"no idle browser in {timeout}s ({len(self.borrowed)} borrowed, {len(self.dead)} dead)")
+                    # 有 profile 等待重启时定期醒来尝试
+                    self._cond.wait(min(remaining, self.revive_interval) if self.dead else remaining)
+                    if self.dead and not self.idle:
+                        break
+                if self.closing:
+                    raise DriverCheckoutTimeout("driver pool is closing")
+                if not self.idle:
+                    continue
+                user_id = self.idle.popleft()
+                self.borrowed.add(user_id)
+
+            # 健康检查在锁外进行，不阻塞其他线程
+            if self._ensure_alive(user_id):
+                wait_ms = int((time.monotonic() - started) * 1000)
+                metrics = self.profile_metrics[user_id]
+                metrics.borrows += 1
+                metrics.wait_ms += wait_ms
+                metrics.max_wait_ms = max(metrics.max_wait_ms, wait_ms)
+                return user_id, self.managers[user_id].driver
+            with self._cond:
+                self.borrowed.discard(user_id)
+                self._cond.notify_all()
+
+    def release_driver(self, user_id, driver, failed=False):
+        """
+        归还浏览器。failed=True 表示这次采集出错，归还前检查会话是否仍然有效。
+        """
+        metrics = self.profile_metrics[user_id]
+        if failed:
+            metrics.failures += 1
+        else:
+            metrics.pages += 1
         try:
-            driver.delete_all_cookies()
-            driver.get("about:blank")  # 重置到空白页
-            # 关闭所有窗口
-            for handle in driver.window_handles:
+            # 只关闭多余的标签页，保留一个窗口，否则会话会被关闭
+            handles = driver.window_handles
+            for handle in handles[1:]:
                 driver.switch_to.window(handle)
                 driver.close()
+            driver.switch_to.window(handles[0])
+            driver.get("about:blank")  # 重置到空白页
+            alive = True
         except Exception as e:
             logger.warning(f"清理浏览器状态失败: {str(e)}")
-        finally:
-            with self._lock:
-                self.pool.put((user_id, driver))
-    # def release_driver(self, user_id, driver):
-    #     with self._lock:
-    #         self.pool.put((user_id, driver))
-
-    def close_all(self):
-        while not self.pool.empty():
-            user_id, driver = self.pool.get()
-            try:
-                driver.quit()
-            except Exception:
-                pass
-            # 关闭 AdsPower 浏览器实例
-            close_url = f"http://local.adspower.net:50325/api/v1/browser/stop?user_id={user_id}&api_key={settings.get('ADS_API_KEY')}"
-            requests.get(close_url)
+            alive = False
+        # 清理失败说明会话已失效，在归还线程中直接重建，下一个借用者拿到的是健康的会话
+        if not alive or failed:
+            alive = self._ensure_alive(user_id)
+        with self._cond:
+            self.borrowed.discard(user_id)
+            if alive:
+                self.idle.append(user_id)
+            self._cond.notify_all()
+
+    def _ensure_alive(self, user_id):
+        """会话有效时返回 True；失效时通过 AdsPower API 重启，重启失败的 profile 移出轮换。"""
+        manager = self.managers[user_id]
+        if manager.is_driver_valid():
+            return True
+        return self._replace(user_id)
+
+    def _replace(self, user_id):
+        manager = self.managers[user_id]
+        metrics = self.profile_metrics[user_id]
+        if self.closing:
+            return False
+        logger.warning(f"WebDriver 无效，切换备用浏览器或重新启动，user_id: {user_id}")
+        failovers = manager.failovers
+        if manager.failover():
+            metrics.replacements += 1
+            metrics.failovers += manager.failovers - failovers
+            self.started_at[user_id] = time.time()
+            with self._cond:
+                self.dead.pop(user_id, None)
+            return True
+        metrics.replace_failures += 1
+        logger.error(f"重启浏览器失败，{self.revive_interval}s 后重试，user_id: {user_id}")
+        with self._cond:
+            self.dead[user_id] = time.monotonic() + self.revive_interval
+        return False
+
+    def _revive_dead(self):
+        """重启已到重试时间的 profile，成功后放回空闲队列。"""
+        now = time.monotonic()
+        with self._cond:
+            due = [user_id for user_id, retry_at in self.dead.items() if retry_at <= now]
+            for user_id in due:
+                # 占位，避免多个线程同时重启同一个 profile
+                self.dead[user_id] = now + self.revive_interval
+        for user_id in due:
+            if self._replace(user_id):
+                with self._cond:
+                    self.idle.append(user_id)
+                    self._cond.notify_all()
+
+    def metrics(self):
+        """{user_id: {borrows, wait_ms, max_wait_ms, pages, failures, replacements, replace_failures, session_age}}"""
+        now = time.time()
+        return {user_id: metrics.as_dict(now - self.started_at[user_id])
+                for user_id, metrics in self.profile_metrics.items()}
+
+    def close_all(self, drain_timeout=None):
+        """停止借出，等待已借出的浏览器归还后关闭所有 profile。阻塞调用，不要在 reactor 线程中执行。"""
+        drain_timeout = drain_timeout if drain_timeout is not None else settings.getfloat('ADS_POOL_DRAIN_TIMEOUT', 60)
+        deadline = time.monotonic() + drain_timeout
+        with self._cond:
+            self.closing = True
+            self._cond.notify_all()
+            while self.borrowed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"等待浏览器归还超时，强制关闭：{sorted(self.borrowed)}")
+                    break
+                self._cond.wait(remaining)
+            self.idle.clear()
+        for manager in self.managers.values():
+            # 关闭 WebDriver 会话和 AdsPower 浏览器实例（包括备用）
+            manager.close()
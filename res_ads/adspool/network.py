@@ -0,0 +1,77 @@
+import logging
+
+logger = logging.getLogger('network')
+
+# 房源解析用不到的第三方统计、广告、字体和视频
+DEFAULT_BLOCKED_URLS = [
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*googlesyndication.com*',
+    '*doubleclick.net*',
+    '*facebook.net*',
+    '*connect.facebook.com*',
+    '*hotjar.com*',
+    '*nr-data.net*',
+    '*js-agent.newrelic.com*',
+    '*tiqcdn.com*',
+    '*adnxs.com*',
+    '*criteo.*',
+    '*bing.com/bat*',
+    '*clarity.ms*',
+    '*.woff*',
+    '*.ttf*',
+    '*.otf*',
+    '*.mp4*',
+    '*.webm*',
+    '*.m3u8*',
+    '*youtube.com/embed*',
+    '*my.matterport.com*',
+]
+
+# 图片请求。屏蔽后 <img> 的 src 仍然保留在 DOM 中，只是不下载图片内容
+IMAGE_URLS = [
+    '*.jpg*',
+    '*.jpeg*',
+    '*.png*',
+    '*.webp*',
+    '*.gif*',
+    '*.avif*',
+]
+
+
+class NetworkPolicy:
+    """
+    通过 CDP Network.setBlockedURLs 屏蔽浏览器中不需要的请求，在 WebDriver 连接到 AdsPower 浏览器后应用。
+
+    :param blocked_urls: 额外屏蔽的 URL 模式（支持 * 通配符）
+    :param block_defaults: 是否屏蔽 DEFAULT_BLOCKED_URLS
+    :param block_images: 是否屏蔽图片内容（图片由 GCSMediaPipeline 另外下载，与 MEDIA_SPOOL_DIR 互斥）
+    """
+
+    def __init__(self, blocked_urls=None, block_defaults=True, block_images=False):
+        patterns = list(DEFAULT_BLOCKED_URLS) if block_defaults else []
+        if block_images:
+            patterns.extend(IMAGE_URLS)
+        patterns.extend(blocked_urls or [])
+        self.patterns = list(dict.fromkeys(patterns))
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            blocked_urls=settings.getlist('CAPTURE_BLOCKED_URLS'),
+            block_defaults=settings.getbool('CAPTURE_BLOCK_DEFAULTS', True),
+            block_images=settings.getbool('CAPTURE_BLOCK_IMAGES', False),
+        )
+
+    def apply(self, driver):
+        """对 driver 当前连接的标签页应用屏蔽规则，失败时只记录日志，不影响采集。"""
+        if not self.patterns:
+            return True
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.patterns})
+            logger.info("已屏蔽 %s 个 URL 模式", len(self.patterns))
+            return True
+        except Exception as e:
+            logger.warning(f"设置 Network.setBlockedURLs 失败: {e}")
+            return False
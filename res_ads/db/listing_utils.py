@@ -1,14 +1,260 @@
+import logging
+import threading
+
+from scrapy.utils.project import get_project_settings
+from twisted.internet import defer, task, threads
+
 from res_ads.db.models import Listing
-from res_ads.db import session
+from res_ads.db import Session
+from res_ads.items import FINGERPRINT_FIELDS, listing_fingerprint  # noqa: F401
+from res_ads.utils.getredis import get_redis_client
+
+logger = logging.getLogger('listing_index')
+settings = get_project_settings()
+
+class ListingIndex:
+    """
+    wp_listings 中 url_md5 / unique_id 的存在性索引。
+
+    start() 在线程中用 keyset 分页（id > last_id ORDER BY id LIMIT n）批量加载，之后每隔 refresh_interval
+    秒在线程中增量加载新行，pipeline 插入新房源时调用 add() 同步更新。查询方法只读索引，不会执行 SQL，
+    可以在 reactor 线程中调用。
+
+    backend:
+        'redis' - 保存在 Redis set 中，所有 spider 进程共享，只有第一个进程需要全量加载
+        'local' - 保存在进程内的 set 中
+    """
+
+    def __init__(self, backend='redis', key_prefix='wp_listings:index', batch_size=10000, refresh_interval=300):
+        if backend not in ('redis', 'local'):
+            raise ValueError(f"unknown listing index backend: {backend}")
+        self.backend = backend
+        self.batch_size = batch_size
+        self.refresh_interval = refresh_interval
+        self.url_md5_key = f"{key_prefix}:url_md5"
+        self.unique_id_key = f"{key_prefix}:unique_id"
+        self.last_id_key = f"{key_prefix}:last_id"
+        self.content_hash_key = f"{key_prefix}:content_hash"
+
+        self.server = get_redis_client() if backend == 'redis' else None
+        self._url_md5s = set()
+        self._unique_ids = set()
+        self._content_hashes = {}
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._refresh_task = None
+        self._users = 0
+
+    def _get_last_id(self):
+        if self.server is not None:
+            return int(self.server.get(self.last_id_key) or 0)
+        return self._last_id
+
+    def _set_last_id(self, last_id):
+        if self.server is not None:
+            # 多个进程同时加载时只保留最大的 last_id
+            if last_id > self._get_last_id():
+                self.server.set(self.last_id_key, last_id)
+        else:
+            self._last_id = last_id
+
+    def _store(self, rows):
+        url_md5s = [row.url_md5 for row in rows if row.url_md5]
+        unique_ids = [row.unique_id for row in rows if row.unique_id]
+        content_hashes = {row.unique_id: row.content_hash for row in rows if row.unique_id and row.content_hash}
+        if self.server is not None:
+            with self.server.pipeline(transaction=False) as pipe:
+                if url_md5s:
+                    pipe.sadd(self.url_md5_key, *url_md5s)
+                if unique_ids:
+                    pipe.sadd(self.unique_id_key, *unique_ids)
+                if content_hashes:
+                    pipe.hset(self.content_hash_key, mapping=content_hashes)
+                pipe.execute()
+        else:
+            self._url_md5s.update(url_md5s)
+            self._unique_ids.update(unique_ids)
+            self._content_hashes.update(content_hashes)
+
+    def refresh(self):
+        """从上次加载的位置开始，用 keyset 分页加载新增的行。"""
+        with self._lock:
+            last_id = self._get_last_id()
+            loaded = 0
+            db = Session()
+            try:
+                while True:
+                    rows = (
+                        db.query(Listing.id, Listing.url_md5, Listing.unique_id, Listing.content_hash)
+                        .filter(Listing.id > last_id)
+                        .order_by(Listing.id)
+                        .limit(self.batch_size)
+                        .all()
+                    )
+                    if not rows:
+                        break
+                    self._store(rows)
+                    last_id = rows[-1].id
+                    self._set_last_id(last_id)
+                    loaded += len(rows)
+            finally:
+                db.close()
+            if loaded:
+                logger.info("listing index loaded %s rows, last_id: %s", loaded, last_id)
+
+    def start(self):
+        """
+        第一次调用时在线程中加载索引，并启动定时增量加载。返回的 Deferred 在首次加载完成后触发，
+        spider_opened / open_spider 返回它，爬虫在索引就绪后才开始请求。
+        """
+        self._users += 1
+        if self._loaded is None:
+            self._loaded = threads.deferToThread(self.refresh)
+            self._loaded.addErrback(lambda failure: logger.error("listing index load failed: %s", failure.value))
+            if self.refresh_interval > 0:
+                self._refresh_task = task.LoopingCall(self._refresh_in_thread)
+                self._loaded.addCallback(self._schedule_refresh)
+        d = defer.Deferred()
+        self._loaded.addBoth(lambda result: (d.callback(None), result)[1])
+        return d
+
+    def _schedule_refresh(self, _):
+        # LoopingCall.start() 返回的 Deferred 在停止时才触发，不能作为回调的返回值
+        self._refresh_task.start(self.refresh_interval, now=False)
+
+    def stop(self):
+        self._users -= 1
+        if self._users <= 0 and self._refresh_task is not None and self._refresh_task.running:
+            self._refresh_task.stop()
+
+    def _refresh_in_thread(self):
+        # LoopingCall 等待返回的 Deferred 完成后才安排下一次，加载不会重叠
+        d = threads.deferToThread(self.refresh)
+        d.addErrback(lambda failure: logger.error("listing index refresh failed: %s", failure.value))
+        return d
+
+    def contains_url_md5(self, url_md5):
+        if self.server is not None:
+            return bool(self.server.sismember(self.url_md5_key, url_md5))
+        return url_md5 in self._url_md5s
+
+    def contains_unique_id(self, unique_id):
+        if self.server is not None:
+            return bool(self.server.sismember(self.unique_id_key, unique_id))
+        return unique_id in self._unique_ids
+
+    def content_hash(self, unique_id):
+        """返回已入库房源的内容指纹，不存在时返回 None"""
+        if self.server is not None:
+            return self.server.hget(self.content_hash_key, unique_id)
+        return self._content_hashes.get(unique_id)
+
+    def add(self, url_md5=None, unique_id=None, content_hash=None):
+        if self.server is not None:
+            with self.server.pipeline(transaction=False) as pipe:
+                if url_md5:
+                    pipe.sadd(self.url_md5_key, url_md5)
+                if unique_id:
+                    pipe.sadd(self.unique_id_key, unique_id)
+                if unique_id and content_hash:
+                    pipe.hset(self.content_hash_key, unique_id, content_hash)
+                pipe.execute()
+        else:
+            if url_md5:
+                self._url_md5s.add(url_md5)
+            if unique_id:
+                self._unique_ids.add(unique_id)
+            if unique_id and content_hash:
+                self._content_hashes[unique_id] = content_hash
 
 
 class ListingHelper:
+    # 存在性索引，LISTING_INDEX_BACKEND 为 'none' 时直接查询 MySQL
+    _index = None
+    _index_lock = threading.Lock()
+
+    # GCSMediaPipeline 生成/改写的字段，内容未变化时从数据库带回 item
+    MEDIA_FIELDS = ('images', 'floor_plan', 'statement_pdf', 'agents', 'agency')
+
     @staticmethod
-    def exists_by_url_md5(url_md5: str) -> bool:
+    def _first(columns, **filters):
+        """
+        用单独的 session 查询一行。这些方法会在 pipeline 的线程池和 reactor 线程中同时调用，
+        不能共用模块级的 session（Session 不是线程安全的）。
+        """
+        db = Session()
+        try:
+            return db.query(*columns).filter_by(**filters).first()
+        finally:
+            db.close()
+
+    @classmethod
+    def index(cls):
+        if cls._index is None:
+            backend = settings.get('LISTING_INDEX_BACKEND', 'redis')
+            if not backend or backend == 'none':
+                return None
+            with cls._index_lock:
+                if cls._index is None:
+                    cls._index = ListingIndex(
+                        backend=backend,
+                        batch_size=settings.getint('LISTING_INDEX_BATCH_SIZE', 10000),
+                        refresh_interval=settings.getint('LISTING_INDEX_REFRESH_INTERVAL', 300),
+                    )
+        return cls._index
+
+    @classmethod
+    def start_index(cls):
+        """加载存在性索引并启动定时刷新，返回首次加载完成时触发的 Deferred。"""
+        index = cls.index()
+        if index is None:
+            return defer.succeed(None)
+        return index.start()
+
+    @classmethod
+    def stop_index(cls):
+        index = cls.index()
+        if index is not None:
+            index.stop()
+
+    @classmethod
+    def exists_by_url_md5(cls, url_md5: str) -> bool:
         """根据 url_md5 判断 Listing 是否已存在"""
-        return session.query(Listing.id).filter_by(url_md5=url_md5).first() is not None
+        index = cls.index()
+        if index is not None:
+            return index.contains_url_md5(url_md5)
+        return cls._first([Listing.id], url_md5=url_md5) is not None
 
-    @staticmethod
-    def exists_by_unique_id(unique_id: str) -> bool:
+    @classmethod
+    def exists_by_unique_id(cls, unique_id: str) -> bool:
         """根据 unique_id 判断 Listing 是否已存在"""
-        return session.query(Listing.id).filter_by(unique_id=unique_id).first() is not None
+        index = cls.index()
+        if index is not None:
+            return index.contains_unique_id(unique_id)
+        return cls._first([Listing.id], unique_id=unique_id) is not None
+
+    @classmethod
+    def content_hash(cls, unique_id: str):
+        """根据 unique_id 获取已入库房源的内容指纹"""
+        index = cls.index()
+        if index is not None:
+            return index.content_hash(unique_id)
+        row = cls._first([Listing.content_hash], unique_id=unique_id)
+        return row.content_hash if row is not None else None
+
+    @classmethod
+    def stored_media(cls, unique_id: str):
+        """
+        已入库房源的 MEDIA_FIELDS（GCS 地址），房源不存在时返回 None。
+        索引中只有指纹，总是查询 MySQL，只在线程中调用。
+        """
+        row = cls._first([getattr(Listing, field) for field in cls.MEDIA_FIELDS], unique_id=unique_id)
+        return dict(row._mapping) if row is not None else None
+
+    @classmethod
+    def mark_exists(cls, url_md5: str, unique_id: str, content_hash: str = None):
+        """房源写入数据库后更新存在性索引"""
+        index = cls.index()
+        if index is not None:
+            index.add(url_md5=url_md5, unique_id=unique_id, content_hash=content_hash)
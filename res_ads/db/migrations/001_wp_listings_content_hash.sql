@@ -0,0 +1,10 @@
+-- wp_listings 增加内容指纹列（Listing.content_hash / idx_listing_content_hash）。
+-- Base.metadata.create_all 不会修改已存在的表，已有的库需要手动执行一次：
+--     mysql -h <host> -u <user> -p <database> < res_ads/db/migrations/001_wp_listings_content_hash.sql
+-- 部署包含 content_hash 的代码之前执行，否则 ListingIndex.refresh、ListingHelper.content_hash
+-- 和 ListingStorePipeline 的 upsert 会报 Unknown column 'content_hash'。
+-- 新列允许 NULL，旧行的指纹为空，下一次采集时按内容变化处理并写入。
+ALTER TABLE wp_listings
+    ADD COLUMN content_hash CHAR(40) NULL COMMENT '内容指纹，内容未变化时跳过写库和图片上传' AFTER agency,
+    ADD INDEX idx_listing_content_hash (content_hash),
+    ALGORITHM=INPLACE, LOCK=NONE;
@@ -21,6 +21,7 @@ class Listing(Base):
         Index('idx_listing_type', 'listing_type'),
         Index('idx_listing_price', 'lower_price', 'upper_price'),
         Index('idx_listing_geo', 'latitude', 'longitude'),
+        Index('idx_listing_content_hash', 'content_hash'),
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True, comment="主键")
@@ -62,6 +63,9 @@ class Listing(Base):
     agents = Column(JSON, nullable=True, comment="代理人信息列表")
     agency = Column(JSON, nullable=True, comment="机构信息")
 
+    # 已有的表需要执行 migrations/001_wp_listings_content_hash.sql，create_all 不会添加新列
+    content_hash = Column(CHAR(40), nullable=True, comment="内容指纹，内容未变化时跳过写库和图片上传")
+
     status = Column(TINYINT, default=0, nullable=False, comment="数据处理状态：0=初始，1=已处理，2=无效")
     post_id = Column(Integer, nullable=True, comment="关联的 WordPress property ID")
 
@@ -0,0 +1,25 @@
+class ListingRetryError(Exception):
+    """
+    房源采集/解析失败，需要延迟重试。failure_class 决定使用哪条退避策略（REDIS_RETRY_POLICY）。
+    """
+    failure_class = 'default'
+
+
+class GalleryIncompleteError(ListingRetryError):
+    """gallery 中采集到的图片数少于页面声明的总数。"""
+    failure_class = 'gallery_incomplete'
+
+
+class MissingAddressError(ListingRetryError):
+    """页面缺少地址或图片等关键字段。"""
+    failure_class = 'missing_address'
+
+
+class InvalidListingIdError(ListingRetryError):
+    """页面中取不到 unique_id。重试也会得到同样的页面，不重试，直接进入 :dead 队列以便排查。"""
+    failure_class = 'invalid_listing_id'
+
+
+class BlockPageError(ListingRetryError):
+    """页面被反爬拦截（访问被拒绝/验证页），立即重试没有意义。"""
+    failure_class = 'block_page'
@@ -0,0 +1,178 @@
+import re
+import threading
+import weakref
+
+from lxml import etree
+
+# 页面区块：区块 -> 定位区块根节点的 XPath，与原来各个解析函数中整个文档范围的 XPath 前半部分一致
+SECTIONS = {
+    'address': '//h1[contains(@class, "property-info-address")]',
+    'price': '//span[contains(@class, "property-price")]',
+    'pdf_link': '//a[contains(@href, ".pdf")]',
+    'media_image': '//button[contains(@class, "overview-MediaImage")]',
+    'media_floorplan': '//button[contains(@class, "overview-MediaFloorplan")]',
+    'primary_features': '//ul[contains(@class, "property-info__primary-features")]',
+    'property_type': '//div[contains(@class, "property-type")]',
+    'property_id_p': '//p[contains(text(), "Property ID")]',
+    'property_id_li': '//li[contains(text(), "Property ID")]',
+    'features': '//div[@data-testid="all-property-features-section"]',
+    'map': '//div[contains(@class, "static-map__img")]',
+    'description': '//div[@data-testid="PropertyDescription"]',
+    'contact_panel': '//div[@class="contact-agent-panel"]',
+    'agency': '//div[contains(@class, "sidebar-traffic-driver")]',
+    'agency_detail': '//div[contains(@class, "sidebar-traffic-driver__detail-info")]',
+    'branding': '//img[@class="branding__image"]',
+    'state_script': '//script[contains(text(), "ArgonautExchange")]',
+    'jsonld': '//script[@type="application/ld+json"]',
+    'hero': '//div[@class="hero-image"]',
+    'error_404': '//div[@data-testid="error-404"]',
+}
+
+FIRST = 'first'
+ALL = 'all'
+
+# 字段规则：字段 -> (区块, 相对区块的 XPath, first/all)
+RULES = {
+    'address': ('address', 'text()', FIRST),
+    'price_text': ('price', 'text()', FIRST),
+    'statement_pdf': ('pdf_link', '@href', FIRST),
+    'media_images': ('media_image', './/picture//img/@src', ALL),
+    'media_floorplans': ('media_floorplan', './/picture//img/@src', ALL),
+    'primary_features': ('primary_features', './/li', ALL),
+    'primary_type_text': ('primary_features', './/p[last()]/text()', FIRST),
+    'property_type_text': ('property_type', 'text()', FIRST),
+    'property_id_p': ('property_id_p', 'text()', ALL),
+    'property_id_li': ('property_id_li', 'text()', ALL),
+    'features': ('features', './/p/text()', ALL),
+    'map_style': ('map', '@style', FIRST),
+    'description_title': ('description', './/h2/text()', FIRST),
+    'description_paragraphs': ('description', './/p[@class="property-description__content"]/text()', ALL),
+    'agents': ('contact_panel', './/li[contains(@class, "agent-info__agent")]', ALL),
+    'agency_name': ('agency', './/a[contains(@class, "sidebar-traffic-driver__name")]/text()', FIRST),
+    'agency_address': ('agency_detail', 'text()', FIRST),
+    'agency_logo': ('branding', '@src', FIRST),
+    'state_script': ('state_script', 'text()', FIRST),
+    'jsonld': ('jsonld', 'text()', ALL),
+    'hero_srcset': ('hero', './/source/@srcset', FIRST),
+    'off_market': ('error_404', './/h1[contains(text(), "Looks like this page is off the market")]', FIRST),
+}
+
+# 在 primary_features 的每个 li、contact_panel 的每个代理人 li 中执行的规则
+FEATURE_RULES = {
+    'label': ('@aria-label', FIRST),
+    'value': ('.//p/text()', FIRST),
+}
+AGENT_RULES = {
+    'name': ('.//a[contains(@class, "agent-info__name")]/text()', FIRST),
+    'photo_url': ('.//div[contains(@class, "agent-info__photo")]//img/@src', FIRST),
+    'phone_href': ('.//div[contains(@class, "phone")]//a[contains(@href, "tel:")]/@href', ALL),
+}
+
+
+def _xpath(expr):
+    # smart_strings=False：返回普通 str，不持有文档引用，可以 pickle 到其他进程
+    return etree.XPath(expr, smart_strings=False)
+
+
+COMPILED_SECTIONS = {name: _xpath(expr) for name, expr in SECTIONS.items()}
+COMPILED_RULES = {field: (section, _xpath(expr), mode) for field, (section, expr, mode) in RULES.items()}
+COMPILED_FEATURE_RULES = {field: (_xpath(expr), mode) for field, (expr, mode) in FEATURE_RULES.items()}
+COMPILED_AGENT_RULES = {field: (_xpath(expr), mode) for field, (expr, mode) in AGENT_RULES.items()}
+
+TEL_RE = re.compile(r'tel:(\d+)')
+
+
+def _apply(compiled, nodes, mode):
+    if mode == FIRST:
+        for node in nodes:
+            result = compiled(node)
+            if result:
+                return result[0]
+        return None
+    results = []
+    for node in nodes:
+        results.extend(compiled(node))
+    return results
+
+
+class ListingDocument:
+    """
+    房源页面的区块化解析。
+
+    每个区块在第一次用到时用预编译的 XPath 在整个文档中定位一次，之后所有字段只在所属区块内执行预编译的
+    相对 XPath（RULES），结果缓存。结果与原来对整个文档执行的 XPath 一致：同一区块嵌套时只保留最外层，
+    区块按文档顺序排列，first 取第一个结果，all 按文档顺序合并。
+    内嵌状态可用时 ListingParser 不会用到 XPath 回退，对应的区块也不会扫描。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._sections = {}
+        self._cache = {}
+
+    def section(self, name):
+        if name not in self._sections:
+            found = []
+            seen = set()
+            for element in COMPILED_SECTIONS[name](self.root):
+                # 嵌套在同一区块中的节点已经被外层区块覆盖
+                if seen and any(ancestor in seen for ancestor in element.iterancestors(element.tag)):
+                    continue
+                seen.add(element)
+                found.append(element)
+            self._sections[name] = found
+        return self._sections[name]
+
+    def get(self, field):
+        if field not in self._cache:
+            section, compiled, mode = COMPILED_RULES[field]
+            self._cache[field] = _apply(compiled, self.section(section), mode)
+        return self._cache[field]
+
+    def primary_features(self):
+        """[(aria-label, 值)]"""
+        return [
+            tuple(_apply(compiled, (li,), mode) for compiled, mode in COMPILED_FEATURE_RULES.values())
+            for li in self.get('primary_features')
+        ]
+
+    def agents(self):
+        """[{'name', 'photo_url', 'phone'}]，与原 parse_agent_and_agency 的取值方式一致。"""
+        agents = []
+        for li in self.get('agents'):
+            values = {field: _apply(compiled, (li,), mode) for field, (compiled, mode) in COMPILED_AGENT_RULES.items()}
+            phone = ''
+            for href in values['phone_href']:
+                match = TEL_RE.search(href)
+                if match:
+                    phone = match.group(1)
+                    break
+            agents.append({
+                'name': (values['name'] or '').strip(),
+                'photo_url': (values['photo_url'] or '').strip(),
+                'phone': phone.strip(),
+            })
+        return agents
+
+
+_documents = weakref.WeakKeyDictionary()
+_documents_lock = threading.Lock()
+
+
+def listing_document(sel):
+    """
+    返回 Selector 对应的 ListingDocument。同一个页面的多个解析函数共用一次区块扫描。
+    按 Selector 缓存（弱引用，Selector 被回收后自动移除），线程池中并发解析的页面互不影响。
+    """
+    with _documents_lock:
+        document = _documents.get(sel)
+    if document is None:
+        document = ListingDocument(sel.root)
+        with _documents_lock:
+            document = _documents.setdefault(sel, document)
+    return document
+
+
+def clear_document_cache():
+    with _documents_lock:
+        _documents.clear()
@@ -3,9 +3,11 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
 
-import scrapy
+import hashlib
 import json
 
+import scrapy
+
 class CombinedRealEstateItem(scrapy.Item):
     # 房源基本信息
     # scrapy过来的数据尤其是一些非常长的内容，比如images, features, agent, agency等相关的不好判断内容的正确性。我们先直接用json保存入库即可。
@@ -66,6 +68,9 @@ class CombinedRealEstateItem(scrapy.Item):
     # 辅助内容
     image_type_groups = scrapy.Field()
     image_index_in_type = scrapy.Field()
+    content_hash = scrapy.Field()   # 内容指纹，见 listing_fingerprint
+    field_sources = scrapy.Field()  # 每个字段的来源：state / jsonld / xpath，见 ListingParser
+    embedded_media = scrapy.Field() # 内嵌状态中的完整图片/户型图列表（{size} 模板链接）
 
     @classmethod
     def convert_images_to_json(cls, images):
@@ -76,4 +81,26 @@ class CombinedRealEstateItem(scrapy.Item):
         try:
             return json.dumps(images)
         except Exception:
-            return '[]'
\ No newline at end of file
+            return '[]'
+
+
+# 参与内容指纹计算的字段。images/floor_plan/statement_pdf 等由 pipeline 生成的字段不参与，
+# 图片用 origin_images（保持顺序）代替。
+FINGERPRINT_FIELDS = (
+    'url', 'title', 'property_type', 'listing_type', 'address', 'street', 'suburb', 'state',
+    'postcode', 'price_text', 'lower_price', 'upper_price', 'bedrooms', 'bathrooms', 'car_spaces',
+    'land_size', 'description_title', 'description', 'council_rates', 'features', 'latitude',
+    'longitude', 'agents', 'agency', 'origin_pdfs', 'origin_images',
+)
+
+
+def listing_fingerprint(item):
+    """
+    计算房源的内容指纹（sha1），内容相同的 item 指纹一定相同。
+
+    必须在 GCSMediaPipeline 改写 agents/agency 图片地址之前计算，spider 生成 item 时会写入
+    item['content_hash']。
+    """
+    data = {field: item.get(field) for field in FINGERPRINT_FIELDS}
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
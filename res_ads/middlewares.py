@@ -2,13 +2,25 @@
 #
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
+import hashlib
 
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
 from scrapy.http import HtmlResponse
+from twisted.internet.threads import deferToThread, deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+from res_ads.adspool.capture import BrowserCaptureError, ListingCapture
+from res_ads.adspool.driverpool import AdsWebDriverPool, DriverCheckoutTimeout
+from res_ads.adspool.network import NetworkPolicy
+from res_ads.db.listing_utils import ListingHelper
+from res_ads.exceptions import BlockPageError
+from res_ads.utils.listing_url import parse_listing_url
+from res_ads.utils.spool import MediaSpool
 
 class FakeDownloaderMiddleware:
     def process_request(self, request, spider):
@@ -16,6 +28,201 @@ class FakeDownloaderMiddleware:
         return HtmlResponse(url=request.url, body=html, encoding='utf-8', request=request)
 
 
+class ListingPreflightMiddleware:
+    """
+    浏览器加载之前的去重检查。
+
+    先用 url_md5 检查，再用正则从 URL 中取出 unique_id 和 property type 检查，
+    已存在的房源直接 IgnoreRequest，不会占用浏览器。取到的 unique_id/property_type
+    写入 request.meta，spider 解析时不必重复查库。
+    存在性索引在 spider_opened 时于线程中加载，加载完成前不会开始请求。
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler.stats)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        return ListingHelper.start_index()
+
+    def spider_closed(self, spider):
+        ListingHelper.stop_index()
+
+    def process_request(self, request, spider):
+        url_md5 = hashlib.md5(request.url.encode('utf-8')).hexdigest()
+        # 判断是否已爬取
+        if ListingHelper.exists_by_url_md5(url_md5):
+            spider.logger.warning("url:%s exists in db.", url_md5)
+            self._skip('url_md5')
+            raise IgnoreRequest(f"url_md5 {url_md5} exists")
+
+        parsed = parse_listing_url(request.url)
+        if parsed:
+            property_type, unique_id = parsed
+            if ListingHelper.exists_by_unique_id(unique_id):
+                spider.logger.warning("unique_id:%s exists in db.", unique_id)
+                self._skip('unique_id')
+                raise IgnoreRequest(f"unique_id {unique_id} exists")
+            request.meta['unique_id'] = unique_id
+            request.meta['property_type'] = property_type
+
+        self.stats.inc_value('preflight/passed')
+        return None
+
+    def _skip(self, reason):
+        self.stats.inc_value(f'preflight/skipped/{reason}')
+        self.stats.inc_value('preflight/browser_loads_saved')
+
+
+class AdsPowerBrowserMiddleware:
+    """
+    用 AdsPower 浏览器下载页面的 downloader middleware。
+
+    每个请求从 AdsWebDriverPool 借一个空闲的浏览器，在 browser 线程池中完成加载、滚动和
+    gallery 采集，返回 HtmlResponse。gallery 数据放在 response.meta['gallery'] 中。
+    线程池大小等于成功启动的 profile 数，所以并发数就是健康 profile 的数量。
+    借浏览器最多等待 ADS_POOL_CHECKOUT_TIMEOUT 秒，超时按 'timeout' 类型延迟重试；
+    每个 profile 的借出等待、页面数和会话时长在关闭时写入 browser/pool/* 统计。
+
+    profile 列表取自 spider.ads_users，没有时取 ADS_USER_IDS 配置；备用 profile 取自 spider.ads_standby_users
+    或 ADS_STANDBY_USER_IDS，按位置对应，会话失效时切换到已在后台启动的备用浏览器。
+    设置 request.meta['dont_browser'] = True 可以跳过浏览器下载。
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.driver_pool = None
+        self.threadpool = None
+        # 'auto'：等待解析需要的区块就绪；'always'：缓慢滚动到底部
+        self.scroll = crawler.settings.get('CAPTURE_SCROLL', 'auto')
+        self.page_load_timeout = crawler.settings.getint('CAPTURE_PAGE_LOAD_TIMEOUT', 60)
+        # MEDIA_SPOOL_DIR 设置后，浏览器已下载的图片写入本地 spool，由 GCSMediaPipeline 直接读取
+        self.spool = MediaSpool.from_settings(crawler.settings)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        user_ids = getattr(spider, 'ads_users', None) or self.crawler.settings.getlist('ADS_USER_IDS')
+        if not user_ids:
+            # signal 中抛出的异常会被吞掉，直接关闭爬虫
+            spider.logger.error("ads user_ids is None")
+            self.crawler.engine.close_spider(spider, 'no_browser_profiles')
+            return
+
+        settings = self.crawler.settings
+        self.driver_pool = AdsWebDriverPool(user_ids, network_policy=NetworkPolicy.from_settings(settings),
+                                            capture_responses=True,
+                                            checkout_timeout=settings.getfloat('ADS_POOL_CHECKOUT_TIMEOUT', 300),
+                                            revive_interval=settings.getfloat('ADS_POOL_REVIVE_INTERVAL', 60),
+                                            standby_ids=(getattr(spider, 'ads_standby_users', None)
+                                                         or settings.getlist('ADS_STANDBY_USER_IDS')))
+        if not self.driver_pool.available():
+            spider.logger.error("no AdsPower profile could be started: %s", user_ids)
+            self.crawler.engine.close_spider(spider, 'no_browser_profiles')
+            return
+
+        # 按槽位数创建线程，启动失败的 profile 重启成功后也有线程可用
+        self.threadpool = ThreadPool(minthreads=1, maxthreads=len(self.driver_pool), name='browser')
+        self.threadpool.start()
+        spider.logger.info("Browser slots: %s (%s started)", len(self.driver_pool), self.driver_pool.available())
+
+    def spider_closed(self, spider):
+        # 等待浏览器归还和调用 AdsPower API 关闭 profile 都是阻塞的，在线程中执行，不阻塞 reactor
+        d = deferToThread(self._shutdown)
+        d.addCallback(self._record_pool_metrics)
+        return d
+
+    def _shutdown(self):
+        metrics = {}
+        if self.driver_pool is not None:
+            # 先停止借出并等待正在加载的页面完成，再关闭 profile
+            self.driver_pool.close_all(drain_timeout=self.crawler.settings.getfloat('ADS_POOL_DRAIN_TIMEOUT', 60))
+            metrics = self.driver_pool.metrics()
+        if self.threadpool is not None:
+            self.threadpool.stop()
+        if self.spool is not None:
+            self.spool.cleanup()
+        return metrics
+
+    def _record_pool_metrics(self, metrics):
+        for user_id, values in metrics.items():
+            for name, value in values.items():
+                self.stats.set_value(f'browser/pool/{name}/{user_id}', value)
+
+    def process_request(self, request, spider):
+        if request.meta.get('dont_browser'):
+            return None
+
+        if self.threadpool is None:
+            # 没有可用的浏览器，爬虫正在关闭；按下载失败处理，不确认租约
+            raise BrowserCaptureError(f"no browser profile available for {request.url}")
+
+        from twisted.internet import reactor
+        return deferToThreadPool(reactor, self.threadpool, self._download, request, spider)
+
+    def _download(self, request, spider):
+        try:
+            user_id, driver = self.driver_pool.get_driver()
+        except DriverCheckoutTimeout:
+            self.stats.inc_value('browser/pool/checkout_timeout')
+            raise
+        failed = True
+        try:
+            result = ListingCapture(driver, scroll=self.scroll, page_load_timeout=self.page_load_timeout,
+                                    spool=self.spool).capture(request.url, request.meta.get('gallery_partial'))
+            failed = False
+        except BlockPageError:
+            # 被拦截的页面不走 RetryMiddleware 的立即重试，交给 spider 延迟重试
+            self.stats.inc_value('browser/blocked')
+            self.stats.inc_value(f'browser/blocked/{user_id}')
+            raise
+        except BrowserCaptureError:
+            self.stats.inc_value('browser/errors')
+            raise
+        except Exception as e:
+            self.stats.inc_value('browser/errors')
+            raise BrowserCaptureError(f"capture {request.url} failed on {user_id}: {e}") from e
+        finally:
+            # 出错时归还前检查会话，失效的会话在归还时重建
+            self.driver_pool.release_driver(user_id, driver, failed=failed)
+
+        self.stats.inc_value('browser/pages')
+        self.stats.inc_value(f'browser/pages/{user_id}')
+        # 流量和加载时间，按 profile 统计，用来评估资源屏蔽的效果（平均值 = 总数 / browser/pages/{user_id}）
+        metrics = result.get('metrics') or {}
+        if metrics:
+            self.stats.inc_value('browser/bytes', metrics['bytes'])
+            self.stats.inc_value(f'browser/bytes/{user_id}', metrics['bytes'])
+            self.stats.inc_value('browser/load_ms', metrics['load_ms'])
+            self.stats.inc_value(f'browser/load_ms/{user_id}', metrics['load_ms'])
+        if result.get('spooled'):
+            self.stats.inc_value('media/spool/stored', len(result['spooled']))
+        for name, readiness in result.get('readiness', {}).items():
+            self.stats.inc_value(f"readiness/{name}/{'ready' if readiness['ready'] else 'timeout'}")
+            self.stats.inc_value(f'readiness/{name}/ms', readiness['ms'])
+            self.stats.max_value(f'readiness/{name}/max_ms', readiness['ms'])
+
+        request.meta['browser_user_id'] = user_id
+        request.meta['gallery'] = result['gallery']
+        # 写入 spool 的图片，spider 跳过或解析失败时删除
+        request.meta['spooled'] = result.get('spooled', [])
+        request.meta['off_market'] = result['off_market']
+        request.meta['capture_timings'] = {'readiness': result.get('readiness', {}), 'metrics': metrics}
+        return HtmlResponse(url=request.url, body=result['page_source'], encoding='utf-8', request=request)
+
+
 
 class ResAdsSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -0,0 +1,707 @@
+import hashlib
+import html
+import json
+import logging
+import re
+from urllib.parse import unquote, urlparse
+
+from scrapy import Selector
+
+from res_ads.exceptions import GalleryIncompleteError, InvalidListingIdError, MissingAddressError
+from res_ads.extract import listing_document
+from res_ads.items import CombinedRealEstateItem, listing_fingerprint
+from res_ads.utils.listing_url import PROPERTY_TYPE_MAPPING, parse_listing_url
+
+logger = logging.getLogger('parser')
+
+# 字段来源，记录在 item['field_sources'] 中
+SOURCE_STATE = 'state'      # 页面内嵌的 ArgonautExchange 状态
+SOURCE_JSONLD = 'jsonld'    # JSON-LD
+SOURCE_XPATH = 'xpath'      # 渲染后的 HTML
+SOURCE_URL = 'url'          # 房源 URL
+
+
+def _decode_nested(value, depth=0):
+    """ArgonautExchange 中的数据是多层 JSON 字符串，逐层解码。"""
+    if depth > 40:
+        return value
+    if isinstance(value, str) and value[:1] in ('{', '['):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return value
+    if isinstance(value, dict):
+        return {k: _decode_nested(v, depth + 1) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode_nested(v, depth + 1) for v in value]
+    return value
+
+
+def _find_listing(node, unique_id=None):
+    """在解码后的状态中查找房源对象（同时包含 address 和 media/generalFeatures 的字典）。"""
+    stack = [node]
+    found = None
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if isinstance(current.get('address'), dict) and ('media' in current or 'generalFeatures' in current):
+                if unique_id is None or str(current.get('id')) == str(unique_id):
+                    return current
+                found = found or current
+            stack.extend(reversed(list(current.values())))
+        elif isinstance(current, list):
+            stack.extend(reversed(current))
+    return found
+
+
+def extract_embedded_state(sel: Selector, unique_id=None):
+    """
+    从页面中读取内嵌数据，只解析一次：
+    返回 (listing, jsonld)，listing 是 ArgonautExchange 中的房源对象（找不到为 None），
+    jsonld 是所有 JSON-LD 对象的列表。
+    """
+    listing = None
+    document = listing_document(sel)
+    script = document.get('state_script')
+    if script:
+        start = script.find('{')
+        if start >= 0:
+            try:
+                state, _ = json.JSONDecoder().raw_decode(script, start)
+                listing = _find_listing(_decode_nested(state), unique_id)
+            except ValueError as e:
+                logger.warning("ArgonautExchange 解析失败: %s", e)
+
+    jsonld = []
+    for text in document.get('jsonld'):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            continue
+        for obj in (data if isinstance(data, list) else [data]):
+            if isinstance(obj, dict):
+                jsonld.extend(obj.get('@graph', [obj]))
+    return listing, jsonld
+
+
+def _get(obj, *path):
+    for key in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def _int(value):
+    try:
+        return int(float(str(value).replace(',', '')))
+    except (TypeError, ValueError):
+        return None
+
+
+def resolve_templated_url(url, size):
+    """
+    把内嵌状态中的 {size} 模板链接换成页面实际使用的尺寸。
+    模板链接在没有尺寸时返回 None（带 {size} 的链接无法下载），调用方应跳过该链接。
+    """
+    if '{size}' not in url:
+        return url
+    return url.replace('{size}', size) if size else None
+
+
+def image_size(url):
+    """reastatic 图片链接路径的第一段是尺寸，如 /800x600-resize,extend/..."""
+    if not url:
+        return None
+    segments = urlparse(url.split(' ')[0]).path.split('/')
+    return segments[1] if len(segments) > 2 else None
+
+
+class ListingParser:
+    """
+    房源页面字段解析。
+
+    每一组字段先从页面内嵌的 JSON 状态（ArgonautExchange / JSON-LD）读取，取不到时再回退到 XPath，
+    每个字段的来源记录在 item['field_sources'] 中。内嵌状态在服务端渲染时就已经存在，不依赖滚动加载。
+    """
+
+    def parse(self, url: str, sel: Selector, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        """解析除图片以外的所有字段。"""
+        parsed = parse_listing_url(url)
+        listing, jsonld = extract_embedded_state(sel, parsed[1] if parsed else None)
+        item['field_sources'] = {}
+
+        sections = (
+            # (内嵌数据映射, XPath 回退)
+            (lambda: self.state_address(listing), lambda: self.parse_address(sel, item)),
+            (lambda: self.state_primary_features(listing), lambda: self.parse_primary_features(sel, item)),
+            (lambda: self.state_coordinates(listing, jsonld), lambda: self.parse_coordinates(sel, item)),
+            (lambda: self.state_description(listing), lambda: self.parse_description(sel, item)),
+            (lambda: None, lambda: self.parse_property_features(sel, item)),
+            (lambda: None, lambda: self.parse_agent_and_agency(sel, item)),
+            (lambda: self.state_property_id_type(url, listing), lambda: self.parse_property_id_type(url, sel, item)),
+            (lambda: self.state_price(listing), lambda: self.parse_price(sel, item)),
+        )
+        for from_state, from_xpath in sections:
+            fields = from_state()
+            if fields:
+                source = fields.pop('_source', SOURCE_STATE)
+                item.update(fields)
+                for key in fields:
+                    item['field_sources'][key] = source
+            else:
+                before = dict(item)
+                from_xpath()
+                for key, value in item.items():
+                    if key != 'field_sources' and (key not in before or before[key] is not value):
+                        item['field_sources'][key] = SOURCE_XPATH
+
+        # 价格说明 PDF 只在页面链接中
+        if 'statement_pdf' not in item:
+            before = dict(item)
+            self.parse_statement_pdf(sel, item)
+            for key in item.keys() - before.keys():
+                item['field_sources'][key] = SOURCE_XPATH
+
+        item['embedded_media'] = self.state_media(listing)
+        return item
+
+    # —— 内嵌数据映射：返回字段字典，取不到时返回 None —— #
+
+    def state_address(self, listing):
+        full_address = _get(listing, 'address', 'display', 'fullAddress')
+        if not full_address:
+            return None
+        fields = dict(self.apply_address(full_address.strip(), {}))
+        if fields['suburb'] is None:
+            # 地址格式与正则不符时使用结构化字段
+            fields['suburb'] = _get(listing, 'address', 'suburb')
+            fields['state'] = (_get(listing, 'address', 'state') or '').upper() or None
+            fields['postcode'] = _get(listing, 'address', 'postcode')
+        return fields
+
+    def state_primary_features(self, listing):
+        general = _get(listing, 'generalFeatures')
+        if not isinstance(general, dict):
+            return None
+        fields = {}
+        for key, name in (('bedrooms', 'bedrooms'), ('bathrooms', 'bathrooms'), ('car_spaces', 'parkingSpaces')):
+            value = _int(_get(general, name, 'value'))
+            if value is not None:
+                fields[key] = value
+        land = _get(listing, 'propertySizes', 'land', 'displayValue')
+        match = re.search(r'([\d.]+)', str(land or '').replace(',', ''))
+        if match:
+            fields['land_size'] = _int(match.group(1))
+        return fields or None
+
+    def state_coordinates(self, listing, jsonld):
+        location = _get(listing, 'address', 'location') or {}
+        lat, lng = location.get('latitude'), location.get('longitude')
+        source = SOURCE_STATE
+        if lat is None or lng is None:
+            for obj in jsonld:
+                geo = obj.get('geo') if isinstance(obj, dict) else None
+                if isinstance(geo, dict) and geo.get('latitude') is not None:
+                    lat, lng, source = geo.get('latitude'), geo.get('longitude'), SOURCE_JSONLD
+                    break
+        if lat is None or lng is None:
+            return None
+        return {'latitude': float(lat), 'longitude': float(lng), '_source': source}
+
+    def state_description(self, listing):
+        description = _get(listing, 'description')
+        if not description:
+            return None
+        fields = {}
+        title = _get(listing, 'title')
+        if title:
+            fields['description_title'] = title.strip()
+        # 与 XPath 路径一致：只取第一个 <br> 之前的段落
+        first = re.split(r'<br\s*/?>', description, maxsplit=1)[0]
+        fields['description'] = html.unescape(re.sub(r'<[^>]+>', '', first)).strip()
+        return fields
+
+    def state_property_id_type(self, url, listing):
+        parsed = parse_listing_url(url)
+        if parsed:
+            return {'property_type': parsed[0], 'unique_id': parsed[1], '_source': SOURCE_URL}
+        unique_id = _get(listing, 'id')
+        if not unique_id:
+            return None
+        raw_property_type = (_get(listing, 'propertyType', 'display') or '').strip().lower()
+        return {
+            'unique_id': str(unique_id),
+            'property_type': PROPERTY_TYPE_MAPPING.get(raw_property_type, 'house'),
+        }
+
+    def state_price(self, listing):
+        price_text = _get(listing, 'price', 'display')
+        if price_text is None:
+            return None
+        return dict(self.apply_price_text(price_text.strip(), {}))
+
+    def state_media(self, listing):
+        """内嵌状态中的完整图片和户型图列表（{size} 模板链接），没有时为空列表。"""
+        def urls(key):
+            result = []
+            for media in _get(listing, 'media', key) or []:
+                url = _get(media, 'templatedUrl') or _get(media, 'url')
+                if url:
+                    result.append(url)
+            return result
+
+        return {'images': urls('images'), 'floorplans': urls('floorplans')}
+
+    # —— XPath 路径 —— #
+
+    def parse_property_id_type(self, url: str, sel: Selector, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        """
+        从 URL 或 HTML 内容中提取 property ID 和 property type。
+
+        异常:
+            ValueError: 如果无法提取 property ID 或 property type。
+        """
+
+        # 尝试从 URL 中提取
+        parsed = parse_listing_url(url)
+        if parsed:
+            item['property_type'], item['unique_id'] = parsed
+            return item
+
+        document = listing_document(sel)
+
+        # 提取 Property ID
+        id_elements = document.get('property_id_p')
+        if not id_elements:
+            id_elements = document.get('property_id_li')
+        if id_elements:
+            id_text = ''.join(id_elements)
+            id_match = re.search(r'Property ID:\s*(\d+)', id_text)
+            if id_match:
+                item['unique_id'] = id_match.group(1)
+            else:
+                raise ValueError("无法从 HTML 中提取 property ID。")
+        else:
+            raise ValueError("HTML 中未找到包含 'Property ID' 的元素。")
+
+        # 提取 property_type
+        property_type_text = document.get('primary_type_text')
+        if not property_type_text:
+            property_type_text = document.get('property_type_text')
+        if property_type_text:
+            raw_property_type = property_type_text.strip().lower()
+            item['property_type'] = PROPERTY_TYPE_MAPPING.get(raw_property_type, 'house')
+        else:
+            item['property_type'] = 'house'  # 默认值
+
+        return item
+
+    def parse_price(self, sel: Selector, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        """
+        从 Selector 中提取价格信息，并填充到 item 的字段中。
+        """
+        # 提取价格文本
+        price_text = (listing_document(sel).get('price_text') or '').strip()
+        item = self.apply_price_text(price_text, item)
+
+        # 提取价格 PDF 链接
+        item = self.parse_statement_pdf(sel, item)
+        return item
+
+    def parse_statement_pdf(self, sel: Selector, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        pdf_url = listing_document(sel).get('statement_pdf')
+        if pdf_url:
+            item['statement_pdf'] = pdf_url
+            item['origin_pdfs'] = [pdf_url]
+        return item
+
+    def apply_price_text(self, price_text: str, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        """根据价格文本填充 price_text、lower_price 和 upper_price。"""
+        item['price_text'] = price_text
+
+        # 初始化最低和最高价格
+        lower_price = None
+        upper_price = None
+
+        # 处理价格范围，如 "$1,950,000 - $2,100,000"
+        range_match = re.match(r'^\$?([\d,]+)\s*[-–—]\s*\$?([\d,]+)', price_text)
+        if range_match:
+            lower_price = int(range_match.group(1).replace(',', ''))
+            upper_price = int(range_match.group(2).replace(',', ''))
+
+        # 处理单一价格，如 "$250,000"
+        elif re.match(r'^\$?[\d,]+$', price_text):
+            lower_price = upper_price = int(price_text.replace('$', '').replace(',', ''))
+
+        # 处理带有描述的价格，如 "OFFERS OVER $489,000"
+        else:
+            single_price_match = re.search(r'\$([\d,]+)', price_text)
+            if single_price_match:
+                lower_price = int(single_price_match.group(1).replace(',', ''))
+                upper_price = None  # 无法确定上限
+
+        # 填充到 item 中
+        item['lower_price'] = lower_price
+        item['upper_price'] = upper_price
+
+        return item
+
+    def parse_property_images(self, sel: Selector, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        # 定义允许的图片扩展名
+        allowed_extensions = ('.jpg', '.jpeg', '.png', '.webp')
+
+        # 提取房屋展示图片
+        document = listing_document(sel)
+        image_urls = document.get('media_images')
+        for url in image_urls:
+            if url and url.lower().endswith(allowed_extensions):
+                if 'placeholderSrc' in url:
+                    raise ValueError(f"检测到占位符图片，终止解析。URL: {url}")
+                item['origin_images'].append(url)
+                item['image_meta'][url] = 'property'  # 房屋展示图
+            else:
+                logger.error("不支持的图片格式或无效链接：%s", url)
+
+        # 提取户型图
+        floorplan_urls = document.get('media_floorplans')
+        for url in floorplan_urls:
+            if url and url.lower().endswith(allowed_extensions):
+                if 'placeholderSrc' in url:
+                    raise ValueError(f"检测到占位符图片，终止解析。URL: {url}")
+                item['origin_images'].append(url)
+                item['image_meta'][url] = 'floorplan'  # 户型图
+            else:
+                logger.error("不支持的图片格式或无效链接：%s", url)
+
+        return item
+
+
+    def build_item(self, url, sel, meta, name, listing_exists=None):
+        """
+        根据浏览器下载的页面和 request.meta['gallery'] 构造 CombinedRealEstateItem。
+        页面需要跳过（下架、房源已入库）时返回 None，数据不完整时抛出异常。
+
+        listing_exists(unique_id) 返回 True 时按已入库跳过；不传时不检查（离线基准测试）。
+        这里不访问数据库和 Redis，只依赖 res_ads.extract 和 res_ads.items。
+        """
+        item = CombinedRealEstateItem()
+
+        item['name'] = name
+        item['listing_type'] = 'sale'
+        item['url'] = url
+        item['url_md5'] = hashlib.md5(url.encode('utf-8')).hexdigest()
+        item['origin_images'] = []
+        item['image_meta'] = {}
+
+        document = listing_document(sel)
+
+        # 检查页面中是否包含特定的文本（OFF_MARKET_XPATH）
+        if document.get('off_market') is not None:
+            logger.info(f"跳过页面：{url}，因为包含指定的文本。")
+            return None  # 跳过该页面的处理
+
+        # 先读页面内嵌的 JSON 状态，取不到的字段回退到 XPath
+        item = self.parse(url, sel, item)
+
+        logger.info(item)
+
+        unique_id = item.get('unique_id')
+        if not unique_id:
+            logger.warning("unique_id not found: %s", url)
+            raise InvalidListingIdError(f"unique_id not found: {url}")
+        if listing_exists is not None and listing_exists(unique_id):
+            # 已入库的房源（URL 中没有 unique_id，预检时无法识别）按跳过处理，直接确认
+            logger.info("unique_id %s exists, skip %s", unique_id, url)
+            return None
+
+        # 从第一张图片入手
+        # 提取srcset中的图片链接
+        first_srcset = document.get('hero_srcset')
+
+        # 将首图放在首位
+        if first_srcset:
+            item["origin_images"].append(first_srcset)
+            item['image_meta'][first_srcset] = 'property'  # 房屋展示图
+
+        gallery = meta.get('gallery') or {}
+        gallery_images = gallery.get('images', [])
+        total_images = gallery.get('total_images')
+
+        # gallery 没有采集齐时，使用内嵌状态中的完整列表（按 gallery/首图的尺寸展开模板链接）
+        media = item.get('embedded_media') or {}
+        if media.get('images') and (not total_images or total_images > len(gallery_images)):
+            size = image_size(gallery_images[0] if gallery_images else first_srcset)
+            if size:
+                gallery_images = [resolve_templated_url(src, size) for src in media['images']]
+                total_images = total_images or len(gallery_images)
+                item['field_sources']['origin_images'] = SOURCE_STATE
+
+        for src in gallery_images:
+            logger.info(src)
+
+        if total_images and total_images > len(gallery_images):
+            logger.error("cannot load all images. %s > %s", total_images, len(gallery_images))
+            raise GalleryIncompleteError("cannot load all images. %s > %s" % (total_images, len(gallery_images)))
+
+        for src in gallery_images:
+            if src not in item['origin_images']: # 如果有首图了，则不追加到数组里面，这样的话就能pin住首图
+                item['origin_images'].append(src)
+                item['image_meta'][src] = 'property'  # 房屋展示图
+
+        # 户型图放在最后，并标记为 floorplan
+        size = image_size(gallery_images[0] if gallery_images else first_srcset)
+        for src in media.get('floorplans', []):
+            src = resolve_templated_url(src, size)
+            if src is None:
+                logger.warning("skip floorplan without image size: %s", url)
+                continue
+            if src not in item['origin_images']:
+                item['origin_images'].append(src)
+            item['image_meta'][src] = 'floorplan'  # 户型图
+
+        item = self.order_images(item)
+
+        logger.info(item)
+
+        # 检查关键字段是否存在
+        if not item.get('address') or not item.get('origin_images'):
+            logger.warning(f"关键字段缺失: {item['url']}")
+            raise MissingAddressError(f"关键字段缺失: {item['url']}")
+
+        item['content_hash'] = listing_fingerprint(item)
+        return item
+
+    def order_images(self, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        # 分类图片并记录索引
+        # item['origin_images'] = [
+        #     'https://example.com/images/property1.jpg',
+        #     'https://example.com/images/floorplan1.jpg',
+        #     'https://example.com/images/agent1.jpg',
+        #     'https://example.com/images/property2.jpg',
+        #     'https://example.com/images/floorplan2.jpg'
+        # ]
+        # item['image_meta'] = {
+        #     'https://example.com/images/property1.jpg': 'property',
+        #     'https://example.com/images/floorplan1.jpg': 'floorplan',
+        #     'https://example.com/images/agent1.jpg': 'agent',
+        #     'https://example.com/images/property2.jpg': 'property',
+        #     'https://example.com/images/floorplan2.jpg': 'floorplan'
+        # }
+        # item['image_type_groups']：一个字典，键为图片类型，值为该类型下的图片 URL 列表。例如：
+        # {
+        #     'property': ['url1', 'url3'],
+        #     'floorplan': ['url2'],
+        #     'agent': ['url4']
+        # }
+        # item['image_index_in_type']：一个字典，键为图片 URL，值为该图片在其类型列表中的索引。例如：
+        # {
+        #     'url1': 0,
+        #     'url2': 0,
+        #     'url3': 1,
+        #     'url4': 0
+        # }
+        # 通过以上处理，您可以方便地根据图片类型对图片进行分类，并获取每个图片在其分类中的索引，便于后续的处理和命名。
+        image_type_groups = {}
+        image_index_in_type = {}
+        for url in item['origin_images']:
+            image_type = item['image_meta'].get(url, 'property')  # 默认类型为 'property'
+            if image_type not in image_type_groups:
+                image_type_groups[image_type] = []
+            index = len(image_type_groups[image_type])
+            image_type_groups[image_type].append(url)
+            image_index_in_type[url] = index
+
+        item['image_type_groups'] = image_type_groups
+        item['image_index_in_type'] = image_index_in_type
+
+        return item
+
+    def parse_address(self, sel: Selector, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        """
+        从 Selector 中提取地址信息，并填充到 item 的字段中。
+        """
+        # 提取完整地址
+        full_address = (listing_document(sel).get('address') or '').strip()
+        return self.apply_address(full_address, item)
+
+    def apply_address(self, full_address: str, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        """根据完整地址填充 address、title 以及拆分出的街道、郊区、州和邮编。"""
+        item['address'] = full_address
+        item['title'] = full_address
+
+        # 使用正则表达式提取街道、郊区、州和邮政编码
+        # 示例地址格式：'9 Willurah Street, Forest Hill, Vic 3131'
+        address_pattern = re.compile(
+            r'^(?P<street>.*?),\s*(?P<suburb>.*?),\s*(?P<state>[A-Za-z]{2,3})\s+(?P<postcode>\d{4})$'
+        )
+
+        match = address_pattern.match(full_address)
+        if match:
+            item['street'] = match.group('street').strip()
+            item['suburb'] = match.group('suburb').strip()
+            item['state'] = match.group('state').strip().upper()
+            item['postcode'] = match.group('postcode').strip()
+        else:
+            # 如果地址格式不符合预期，可以设置为 None 或留空
+            item['street'] = None
+            item['suburb'] = None
+            item['state'] = None
+            item['postcode'] = None
+
+        return item
+
+    def parse_primary_features(self, sel: Selector, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        for aria_label, value in listing_document(sel).primary_features():
+            if aria_label and value:
+                aria_label = aria_label.lower()
+                if 'bedroom' in aria_label:
+                    item['bedrooms'] = int(value)
+                elif 'bathroom' in aria_label:
+                    item['bathrooms'] = int(value)
+                elif 'car space' in aria_label:
+                    item['car_spaces'] = int(value)
+                elif 'land size' in aria_label:
+                    # 匹配前导数字，可能带小数或单位，如 "585m²"、"828.5 sqm"
+                    match = re.search(r'([\d.]+)', value)
+                    if match:
+                        land_size = match.group(1)
+                        try:
+                            item['land_size'] = int(float(land_size))
+                        except ValueError:
+                            logger.warning("parse error land_size:%s", value)
+        return item
+
+    def parse_property_features(self, sel: Selector, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        """
+        解析房产特征信息，并将其存储为 JSON 格式。
+
+        参数:
+            sel (Selector): Scrapy 的 Selector 对象。
+            item (CombinedRealEstateItem): 用于存储提取数据的 Item 对象。
+
+        返回:
+            CombinedRealEstateItem: 包含提取特征信息的 Item 对象。
+        """
+        features = {}
+
+        # 提取所有的 <p> 标签文本
+        p_elements = listing_document(sel).get('features')
+
+        for text in p_elements:
+            text = text.strip()
+            if not text:
+                continue
+            if ':' in text:
+                key, value = text.split(':', 1)
+                # key = key.lower().replace(' ', '_')  # 转小写+下划线格式 TODO: "Air conditioning" → {'air_conditioning': True}
+                features[key.strip()] = value.strip()
+            else:
+                features[text] = True
+
+        logger.info("features: %s", features)
+        # 将特征字典转换为 JSON 字符串，并存储到 item 中, 如果多次转码会有反斜杠在逗号前面，这样php在读取时会出问题
+        # item['features'] = json.dumps(features, ensure_ascii=False)
+        item['features'] = features
+        logger.info("item['features']: %s", item['features'])
+
+        return item
+
+    def parse_coordinates(self, sel: Selector, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        """
+        从静态地图的背景图像 URL 中提取经纬度坐标，并添加到 item 中。
+
+        :param sel: Scrapy 的 Selector 对象，用于解析 HTML。
+        :param item: 包含爬取数据的字典。
+        :return: 更新后的 item，包含 'latitude' 和 'longitude' 键（如果提取成功）。
+        """
+        # 提取 style 属性中的背景图像 URL
+        style_attr = listing_document(sel).get('map_style')
+        if style_attr:
+            # 使用正则表达式提取 URL
+            match = re.search(r'url\(["\']?(.*?)["\']?\)', style_attr)
+            if match:
+                map_url = match.group(1)
+                # 提取 URL 中的经纬度参数
+                decoded_url = unquote(map_url)
+
+                # 使用正则表达式提取经纬度
+                coord_match = re.search(r'markers=.*?\|(-?\d+\.\d+),(-?\d+\.\d+)', decoded_url)
+                if coord_match:
+                    latitude = float(coord_match.group(1))
+                    longitude = float(coord_match.group(2))
+                    item['latitude'] = latitude
+                    item['longitude'] = longitude
+        return item
+
+    def parse_description(self, sel: Selector, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        """
+        提取房产描述信息并填充到 item 中。
+
+        参数:
+            sel (Selector): Scrapy 的 Selector 对象。
+            item (dict): 存储提取信息的字典。
+
+        返回:
+            dict: 包含描述信息的 item。
+        """
+        # 提取描述标题
+        document = listing_document(sel)
+        description_title = document.get('description_title')
+        if description_title:
+            item['description_title'] = description_title.strip()
+
+        # 提取完整描述内容
+        description_paragraphs = document.get('description_paragraphs')
+        if description_paragraphs:
+            # 合并段落并去除多余空白
+            # full_description = '\n'.join([para.strip() for para in description_paragraphs if para.strip()])
+            # item['description'] = full_description
+            item['description'] = description_paragraphs[0].strip()
+        return item
+
+    def parse_agent_and_agency(self, sel: Selector, item: CombinedRealEstateItem) -> CombinedRealEstateItem:
+        """
+        解析代理人和公司信息，并将其存储为 JSON 格式。
+
+        参数:
+            sel (Selector): Scrapy 的 Selector 对象。
+            item (CombinedRealEstateItem): 用于存储提取数据的 Item 对象。
+
+        返回:
+            CombinedRealEstateItem: 包含提取代理人和公司信息的 Item 对象。
+        """
+        document = listing_document(sel)
+
+        # 提取代理人信息（name, photo_url, phone）
+        agents = document.agents()
+        for agent_info in agents:
+            photo_url = agent_info['photo_url']
+            # added to origin_images to download
+            if photo_url:
+                item['origin_images'].append(photo_url)
+                item['image_meta'][photo_url] = 'agent'  # 代理人头像
+
+        # 提取公司信息
+        agency_name = (document.get('agency_name') or '').strip()
+        agency_address = (document.get('agency_address') or '').strip()
+        agency_url = document.get('agency_logo')
+        if agency_url:
+            item['origin_images'].append(agency_url)
+            item['image_meta'][agency_url] = 'agency'  # 代理人头像
+
+        agency = {
+            'name': agency_name,
+            'agency_url': agency_url,
+            'address': agency_address
+        }
+
+        # 将代理人和公司信息存储到 item 中
+        # item['agents'] = json.dumps(agents, ensure_ascii=False)
+        # item['agency'] = json.dumps(agency, ensure_ascii=False)
+        item['agents'] = agents
+        item['agency'] = agency
+        logger.info("item['agents']:%s", item['agents'])
+        logger.info("item['agency']:%s", item['agency'])
+
+        return item
@@ -1,34 +1,98 @@
 import datetime
-import hashlib
 
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import or_, select
+from sqlalchemy.dialects.mysql import insert
+from twisted.internet import defer, task, threads
 
 from res_ads.db import engine
 from res_ads.db.models import Listing
+from res_ads.db.listing_utils import ListingHelper, listing_fingerprint
+from res_ads.signals import listing_store_failed, listing_stored
 
 import logging
-import datetime
 from sqlalchemy.exc import IntegrityError
 
 logger = logging.getLogger('listing')
-Session = sessionmaker(bind=engine)
+
+# 重复时需要更新的字段（unique_id 和 created_at 保持不变）
+UPDATE_FIELDS = (
+    'url', 'url_md5', 'title', 'property_type', 'listing_type', 'address', 'street', 'suburb',
+    'state', 'postcode', 'price_text', 'lower_price', 'upper_price', 'bedrooms', 'bathrooms',
+    'car_spaces', 'land_size', 'description_title', 'description', 'council_rates', 'features',
+    'images', 'floor_plan', 'statement_pdf', 'latitude', 'longitude', 'agents', 'agency',
+    'publish_date', 'content_hash', 'updated_at',
+)
+
 
 class ListingStorePipeline:
+    """
+    批量写入 wp_listings。
+
+    item 先放入缓冲区，缓冲区达到 batch_size 或每隔 flush_interval 秒时，
+    用一条多行 INSERT ... ON DUPLICATE KEY UPDATE 写入（按 uq_listing_unique_id 去重）。写库在线程中执行，不阻塞 reactor。
+    url / url_md5 已经属于另一个 unique_id 的行不写入（ON DUPLICATE KEY UPDATE 会覆盖那一条房源），按唯一约束冲突处理。
+    批量写入遇到 IntegrityError 时把批次对半拆分重试，只丢弃出错的那一行。
+    内容指纹（content_hash）与库中一致的 item 直接跳过，不更新 updated_at。
+
+    item_scraped 时数据还在缓冲区中，每一行写入成功（或确认不需要写入）后才发送 listing_stored，
+    spider 收到后确认租约；写入失败时发送 listing_store_failed，批次不丢弃确认，租约到期后重新采集。
+
+    Settings
+    --------
+    LISTING_BATCH_SIZE : int (default: 50)
+    LISTING_FLUSH_INTERVAL : float (default: 10)
+    """
+
+    def __init__(self, batch_size=50, flush_interval=10, stats=None, signals=None):
+        self.stats = stats
+        self.signals = signals
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.flush_task = None
+        # 正在线程中写入的批次
+        self.writing = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            batch_size=crawler.settings.getint('LISTING_BATCH_SIZE', 50),
+            flush_interval=crawler.settings.getfloat('LISTING_FLUSH_INTERVAL', 10),
+            stats=crawler.stats,
+            signals=crawler.signals,
+        )
+
     def open_spider(self, spider):
-        self.session = Session()
+        self.buffer = []
+        if self.flush_interval > 0:
+            self.flush_task = task.LoopingCall(self.flush)
+            self.flush_task.start(self.flush_interval, now=False)
+        # 内容指纹从存在性索引读取，等待索引加载完成
+        return ListingHelper.start_index()
 
     def close_spider(self, spider):
-        self.session.close()
+        if self.flush_task is not None and self.flush_task.running:
+            self.flush_task.stop()
+        self.flush()
+        ListingHelper.stop_index()
+        # 等待所有批次写完，listing_stored 发出后 spider 才能确认
+        return defer.DeferredList(list(self.writing))
 
     def process_item(self, item, spider):
         logger.info('processing item:%s', item)
         unique_id = item.get('unique_id')
         if not unique_id:
             logger.error("Item missing unique_id, skipping.")
+            self._send(listing_store_failed, item.get('url_md5'), retryable=False)
             return item
 
-        # 查找是否已存在此 unique_id
-        existing = self.session.query(Listing).filter_by(unique_id=unique_id).first()
+        content_hash = item.get('content_hash') or listing_fingerprint(item)
+        if ListingHelper.content_hash(unique_id) == content_hash:
+            logger.info("Listing %s unchanged, skip writing.", unique_id)
+            self._inc_stats('fingerprint/db/hit')
+            self._send(listing_stored, item.get('url_md5'))
+            return item
+        self._inc_stats('fingerprint/db/miss')
 
         now = datetime.datetime.utcnow()
 
@@ -63,31 +127,113 @@ class ListingStorePipeline:
             'agents': item.get('agents'),
             'agency': item.get('agency'),
             'publish_date': item.get('publish_date'),
+            'content_hash': content_hash,
             'updated_at': now
         }
 
+        self.buffer.append(dict(data, unique_id=unique_id, created_at=now))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+        return item
+
+    def _inc_stats(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def _send(self, signal, url_md5, **kwargs):
+        if self.signals is not None:
+            self.signals.send_catch_log(signal=signal, url_md5=url_md5, **kwargs)
+
+    def flush(self):
+        """在线程中写入缓冲区中的所有行，返回写入完成时触发的 Deferred。"""
+        if not self.buffer:
+            return None
+        rows, self.buffer = self.buffer, []
+        d = threads.deferToThread(self._write_rows, rows)
+        self.writing.add(d)
+        d.addCallback(self._dispatch)
+        d.addErrback(lambda failure: logger.error("Listing flush failed: %s", failure.value))
+        d.addBoth(lambda _: self.writing.discard(d))
+        return d
+
+    def _dispatch(self, outcomes):
+        """回到 reactor 线程后更新统计并发送 listing_stored / listing_store_failed。"""
+        for stat, signal, url_md5, kwargs in outcomes:
+            if stat:
+                self._inc_stats(stat)
+            self._send(signal, url_md5, **kwargs)
+
+    def _write_rows(self, rows):
+        """在线程中执行，返回 [(统计项, 信号, url_md5, 信号参数)]。"""
+        outcomes = []
         try:
-            if existing:
-                # 更新已有字段
-                for field, value in data.items():
-                    setattr(existing, field, value)
-                logger.info(f"Updated existing listing: {unique_id}, data:{data}")
-            else:
-                # 新建对象
-                new_listing = Listing(
-                    unique_id=unique_id,
-                    created_at=now,
-                    **data
-                )
-                self.session.add(new_listing)
-                logger.info(f"Inserted new listing: {unique_id}, data:{data}")
-
-            self.session.commit()
+            rows = self._reject_collisions(rows, outcomes)
+        except Exception as e:
+            logger.exception(f"Unexpected error: {e}, unique_ids:{[row['unique_id'] for row in rows]}")
+            return [('listing/store/failed', listing_store_failed, row['url_md5'], {'retryable': True}) for row in rows]
+        if rows:
+            self._write(rows, outcomes)
+        return outcomes
+
+    def _reject_collisions(self, rows, outcomes):
+        """
+        去掉 url / url_md5 已经属于另一个 unique_id 的行（库中已有的或同一批次中排在前面的），
+        这些行按唯一约束冲突处理（retryable=False）。
+        """
+        table = Listing.__table__
+        owners = {}
+        with engine.connect() as conn:
+            result = conn.execute(
+                select(table.c.unique_id, table.c.url, table.c.url_md5).where(or_(
+                    table.c.url.in_([row['url'] for row in rows if row['url']]),
+                    table.c.url_md5.in_([row['url_md5'] for row in rows if row['url_md5']]),
+                ))
+            )
+            for unique_id, url, url_md5 in result:
+                owners[('url', url)] = unique_id
+                owners[('url_md5', url_md5)] = unique_id
+
+        accepted = []
+        for row in rows:
+            keys = [(field, row[field]) for field in ('url', 'url_md5') if row[field]]
+            conflicts = {owners[key] for key in keys if owners.get(key, row['unique_id']) != row['unique_id']}
+            if conflicts:
+                logger.error("Listing %s conflicts with %s on url/url_md5, skip writing: %s",
+                             row['unique_id'], sorted(conflicts), row['url'])
+                outcomes.append(('listing/store/integrity_error', listing_store_failed, row['url_md5'],
+                                 {'retryable': False}))
+                continue
+            for key in keys:
+                owners[key] = row['unique_id']
+            accepted.append(row)
+        return accepted
+
+    def _write(self, rows, outcomes):
+        stmt = insert(Listing.__table__).values(rows)
+        stmt = stmt.on_duplicate_key_update({field: stmt.inserted[field] for field in UPDATE_FIELDS})
+        try:
+            with engine.begin() as conn:
+                conn.execute(stmt)
         except IntegrityError as e:
-            logger.error(f"Database integrity error: {e}, data:{data}")
-            self.session.rollback()
+            if len(rows) == 1:
+                logger.error(f"Database integrity error: {e}, data:{rows[0]}")
+                outcomes.append(('listing/store/integrity_error', listing_store_failed, rows[0]['url_md5'],
+                                 {'retryable': False}))
+                return
+            # 拆分批次，定位出错的行，其余行照常写入
+            middle = len(rows) // 2
+            self._write(rows[:middle], outcomes)
+            self._write(rows[middle:], outcomes)
+            return
         except Exception as e:
-            logger.exception(f"Unexpected error: {e}, data:{data}")
-            self.session.rollback()
+            # 不确认这些房源，租约到期后重新采集
+            logger.exception(f"Unexpected error: {e}, unique_ids:{[row['unique_id'] for row in rows]}")
+            for row in rows:
+                outcomes.append(('listing/store/failed', listing_store_failed, row['url_md5'], {'retryable': True}))
+            return
 
-        return item
+        for row in rows:
+            ListingHelper.mark_exists(row['url_md5'], row['unique_id'], row['content_hash'])
+            outcomes.append((None, listing_stored, row['url_md5'], {}))
+        logger.info("Upserted %s listings: %s", len(rows), [row['unique_id'] for row in rows])
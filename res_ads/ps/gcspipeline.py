@@ -12,29 +12,65 @@ from google.api_core import retry
 from io import BytesIO
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from twisted.internet.threads import deferToThread
 
+from res_ads.db.listing_utils import ListingHelper, listing_fingerprint
+from res_ads.ps.transfer import MediaTransferEngine
+from res_ads.utils.spool import MediaSpool
 from res_ads.settings import NEWS_ACCOUNTS, PS_SALT
 
 logger = logging.getLogger('gcs')
 
 class GCSMediaPipeline(ImagesPipeline):
 
-    def __init__(self, store_uri, gcs_credentials_path, gcs_bucket_name, *args, **kwargs):
+    def __init__(self, store_uri, gcs_credentials_path, gcs_bucket_name, *args,
+                 transfer_workers=16, download_per_host=4, upload_concurrency=8, stats=None, spool=None, **kwargs):
         super().__init__(store_uri, *args, **kwargs)
+        self.stats = stats
+        # 浏览器采集时写入的图片内容（MediaSpool），命中时不再下载
+        self.spool = spool
         # 其他初始化代码
         self.credentials = service_account.Credentials.from_service_account_file(gcs_credentials_path)
         self.client = storage.Client(credentials=self.credentials)
         self.bucket = self.client.bucket(gcs_bucket_name)
-        self.session = self._create_retry_session()
+        self.session = self._create_retry_session(pool_maxsize=transfer_workers)
+        self.engine = MediaTransferEngine(
+            self.session,
+            max_workers=transfer_workers,
+            per_host=download_per_host,
+            upload_concurrency=upload_concurrency,
+        )
 
     @classmethod
     def from_crawler(cls, crawler):
         store_uri = crawler.settings.get('IMAGES_STORE')
         gcs_credentials_path = crawler.settings.get('GOOGLE_APPLICATION_CREDENTIALS')
         gcs_bucket_name = crawler.settings.get('GCS_BUCKET_NAME')
-        return cls(store_uri, gcs_credentials_path, gcs_bucket_name)
+        return cls(
+            store_uri, gcs_credentials_path, gcs_bucket_name,
+            transfer_workers=crawler.settings.getint('MEDIA_TRANSFER_WORKERS', 16),
+            download_per_host=crawler.settings.getint('MEDIA_DOWNLOAD_PER_HOST', 4),
+            upload_concurrency=crawler.settings.getint('MEDIA_UPLOAD_CONCURRENCY', 8),
+            stats=crawler.stats,
+            spool=MediaSpool.from_settings(crawler.settings),
+        )
+
+    def close_spider(self, spider):
+        self.engine.shutdown()
 
     def process_item(self, item, spider):
+        # 下载/上传是阻塞 IO，放到线程中执行，避免阻塞 Twisted reactor
+        return deferToThread(self._process_item, item, spider)
+
+    def _process_item(self, item, spider):
+        try:
+            return self._transfer_item(item, spider)
+        finally:
+            # 内容未变化、DropItem 或上传出错时 spool 中的图片没有被取走，在这里删除
+            if self.spool is not None:
+                self.spool.discard(item.get('origin_images', []))
+
+    def _transfer_item(self, item, spider):
         origin_images = item.get('origin_images', [])
         image_meta = item.get('image_meta', {})
         image_index_map = item.get('image_index_in_type', {})
@@ -43,6 +79,24 @@ class GCSMediaPipeline(ImagesPipeline):
         if not origin_images:
             raise DropItem("Item does not contain 'origin_images'")
 
+        # 内容指纹必须在改写 agents/agency 图片地址之前计算
+        if not item.get('content_hash'):
+            item['content_hash'] = listing_fingerprint(item)
+        if ListingHelper.content_hash(unique_id) == item['content_hash']:
+            # 跳过上传，但 images/floor_plan/statement_pdf 和改写后的 agents/agency 要与未命中时一样
+            # 是 GCS 地址，从数据库中带回；读不到时按未命中处理
+            try:
+                stored = ListingHelper.stored_media(unique_id)
+            except Exception as e:
+                logger.warning("Failed to load stored media of %s: %s", unique_id, e)
+                stored = None
+            if stored is not None:
+                logger.info("Listing %s unchanged, skip media transfer.", unique_id)
+                self._inc_stats('fingerprint/media/hit')
+                item.update(stored)
+                return item
+        self._inc_stats('fingerprint/media/miss')
+
         images_info = []
         floor_plans_info = []
 
@@ -52,14 +106,19 @@ class GCSMediaPipeline(ImagesPipeline):
             logger.error('cdn_prefix was not found in item')
             cdn_prefix = 'https://cdn.jiwu.com.au'
 
-        for idx, image_url in enumerate(origin_images):
-            try:
-                response = self.session.get(image_url, timeout=30)
-                response.raise_for_status()
-                image_data = response.content
-            except Exception as e:
-                logger.error(f"Download failed: {image_url}: {e}")
-                continue
+        def transfer_image(task):
+            idx, image_url = task
+            image_data = self.spool.pop(image_url) if self.spool is not None else None
+            if image_data is not None:
+                self._inc_stats('media/spool/hit')
+            else:
+                if self.spool is not None:
+                    self._inc_stats('media/spool/miss')
+                try:
+                    image_data = self.engine.download(image_url)
+                except Exception as e:
+                    logger.error(f"Download failed: {image_url}: {e}")
+                    return None
 
             image_type = image_meta.get(image_url, 'property')
             image_index = image_index_map.get(image_url, idx)
@@ -79,19 +138,28 @@ class GCSMediaPipeline(ImagesPipeline):
             image_file.seek(0)
 
             try:
-                blob.upload_from_file(image_file, content_type='image/jpeg', retry=self.retry_strategy())
+                self.engine.upload(blob.upload_from_file, image_file, content_type='image/jpeg', retry=self.retry_strategy())
                 logger.info(f"GCS successfully uploaded: {blob_path}")
             except Exception as e:
                 logger.error(f"GCS upload failed: {blob_path}: {e}")
-                continue
+                return None
 
-            uploaded = {
+            return {
                 "url": file_full_path,
                 "origin_url": image_url,
                 "index": image_index,
                 "type": image_type,
             }
 
+        # 并发下载/上传，结果按 origin_images 原始顺序返回，保证输出与串行处理一致
+        for uploaded in self.engine.run(transfer_image, list(enumerate(origin_images))):
+            if uploaded is None:
+                continue
+
+            image_url = uploaded["origin_url"]
+            image_type = uploaded["type"]
+            file_full_path = uploaded["url"]
+
             # 暂时为了php调试方便，只给一个数组
             if image_type == 'floorplan':
                 floor_plans_info.append(file_full_path)
@@ -136,14 +204,13 @@ class GCSMediaPipeline(ImagesPipeline):
         origin_pdfs = item.get("origin_pdfs", [])
         pdfs_uploaded = []
 
-        for idx, pdf_url in enumerate(origin_pdfs):
+        def transfer_pdf(task):
+            idx, pdf_url = task
             try:
-                response = self.session.get(pdf_url, timeout=30)
-                response.raise_for_status()
-                pdf_data = response.content
+                pdf_data = self.engine.download(pdf_url)
             except Exception as e:
                 logger.error(f"PDF download failed: {pdf_url}: {e}")
-                continue
+                return None
 
             filename = f"{unique_id}-{idx}.pdf"
             blob_path = os.path.join('jiwu', 'realestate', unique_id, filename)
@@ -156,17 +223,25 @@ class GCSMediaPipeline(ImagesPipeline):
             blob.content_type = "application/pdf"
 
             try:
-                blob.upload_from_file(pdf_file, retry=self.retry_strategy())
+                self.engine.upload(blob.upload_from_file, pdf_file, retry=self.retry_strategy())
                 logger.info(f"PDF GCS successfully uploaded: {blob_path}")
-                pdfs_uploaded.append(blob.public_url)
+                return blob.public_url
             except Exception as e:
                 logger.error(f"PDF upload failed: {blob_path}: {e}")
-                continue
+                return None
+
+        for public_url in self.engine.run(transfer_pdf, list(enumerate(origin_pdfs))):
+            if public_url is not None:
+                pdfs_uploaded.append(public_url)
 
         item["statement_pdf"] = pdfs_uploaded
 
         return item
 
+    def _inc_stats(self, key):
+        if self.stats is not None:
+            self.stats.inc_value(key)
+
     def retry_strategy(self):
         return retry.Retry(
             predicate=retry.if_transient_error,
@@ -176,7 +251,7 @@ class GCSMediaPipeline(ImagesPipeline):
             deadline=300.0
         )
 
-    def _create_retry_session(self, retries=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504)):
+    def _create_retry_session(self, retries=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504), pool_maxsize=10):
         session = requests.Session()
         retry_strage = Retry(
             total=retries,
@@ -186,7 +261,7 @@ class GCSMediaPipeline(ImagesPipeline):
             status_forcelist=status_forcelist,
             allowed_methods=["GET"]
         )
-        adapter = HTTPAdapter(max_retries=retry_strage)
+        adapter = HTTPAdapter(max_retries=retry_strage, pool_maxsize=pool_maxsize)
         session.mount('http://', adapter)
         session.mount('https://', adapter)
         return session
\ No newline at end of file
@@ -0,0 +1,62 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+logger = logging.getLogger('transfer')
+
+
+class MediaTransferEngine:
+    """
+    有界并发的下载/上传引擎。
+
+    下载按 host 限流（每个 host 最多 per_host 个并发），上传使用独立的并发上限，
+    两者共享同一个线程池。run() 返回结果的顺序与传入任务顺序一致。
+    """
+
+    def __init__(self, session, max_workers=16, per_host=4, upload_concurrency=8, timeout=30):
+        self.session = session
+        self.timeout = timeout
+        self.per_host = per_host
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='media')
+        self._upload_slots = threading.BoundedSemaphore(upload_concurrency)
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            sem = self._host_slots.get(host)
+            if sem is None:
+                sem = self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return sem
+
+    def download(self, url):
+        """下载 url 并返回内容，受 per-host 并发限制。"""
+        with self._host_semaphore(url):
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            return response.content
+
+    def upload(self, func, *args, **kwargs):
+        """在上传并发限制内执行 func(*args, **kwargs)。"""
+        with self._upload_slots:
+            return func(*args, **kwargs)
+
+    def run(self, func, tasks):
+        """
+        并发执行 func(task)，按 tasks 的原始顺序返回结果列表。
+        单个任务抛出的异常会被记录，对应结果为 None。
+        """
+        futures = [self._executor.submit(func, task) for task in tasks]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"Transfer task failed: {e}")
+                results.append(None)
+        return results
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
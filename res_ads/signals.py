@@ -0,0 +1,6 @@
+# ListingStorePipeline 写入一个房源（或确认内容未变化、不需要写入）后发送，参数：url_md5
+listing_stored = object()
+
+# ListingStorePipeline 写入失败时发送，参数：url_md5, retryable
+# retryable=False 表示重试也不会成功（例如违反唯一约束），可以直接确认
+listing_store_failed = object()
@@ -0,0 +1,162 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import scrapy
+from scrapy.http import HtmlResponse
+
+from res_ads.db.listing_utils import ListingHelper
+from res_ads.items import CombinedRealEstateItem
+from res_ads.parser import ListingParser
+from res_ads.spiders.realestate import ListingItemMixin, RealestateSpider, StoredAckMixin, retry_meta
+from res_ads.spiders.replay import build_page, init_worker
+from res_ads.utils.archive import STATUS_FAILED, STATUS_OK, STATUS_SKIPPED, SnapshotArchive
+from res_ads.utils.pagestream import PageStream, decode_page
+from scrapy_redis.spiders import RedisSpider
+
+logger = logging.getLogger('pageparser')
+
+
+class RealestatePageParserSpider(StoredAckMixin, ListingItemMixin, RedisSpider):
+    """
+    采集与解析分离时的解析端：从 PageStream（PAGE_STREAM_KEY）读取 RealestateSpider 发布的页面，
+    在进程池中解析（默认使用全部 CPU 核心），item 经过项目配置的 pipeline。
+    解析失败的房源按失败类型写入与 RealestateSpider 相同的延迟重试队列，由采集端重新加载。
+    生成 item 的记录在房源写入数据库后才 XACK（StoredAckMixin），写入失败的记录保持未确认，由 XAUTOCLAIM 重新处理；
+    跳过的记录和写入重试队列的记录直接确认。
+    设置 MAX_IDLE_TIME_BEFORE_CLOSE 后，PageStream 连续这么多秒没有新记录时关闭爬虫。
+    SNAPSHOT_ARCHIVE_DIR 设置后由解析端按解析结果写入快照归档（采集端发布页面时不归档）。
+
+    scrapy crawl realestate_parser
+    scrapy crawl realestate_parser -a workers=8
+    """
+    name = "realestate_parser"
+    # 重试队列（:retry / :dead）与采集端共用
+    redis_key = RealestateSpider.redis_key
+
+    custom_settings = {
+        'DOWNLOADER_MIDDLEWARES': {
+            'res_ads.middlewares.ListingPreflightMiddleware': None,
+            'res_ads.middlewares.AdsPowerBrowserMiddleware': None,
+        },
+        'REDIS_START_URLS_NOTIFY': False,
+        # 解析端不从 start url 队列取数据，也不回收采集端的租约
+        'REDIS_START_URLS_LEASE_TIME': 0,
+        'REDIS_RETRY_POLICY': RealestateSpider.custom_settings['REDIS_RETRY_POLICY'],
+    }
+
+    def __init__(self, workers=None, batch_size=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.workers = int(workers) if workers else os.cpu_count()
+        self.batch_size = int(batch_size) if batch_size else self.workers * 4
+        self.parser = ListingParser()
+        self.page_stream = None
+        self.executor = None
+        self.stopped = False
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.page_stream = PageStream.from_settings(spider.server, crawler.settings)
+        if spider.page_stream is None:
+            raise ValueError("PAGE_STREAM_KEY is not set")
+        spider.archive = SnapshotArchive.from_settings(crawler.settings)
+        spider.archive_failed = crawler.settings.getbool('SNAPSHOT_ARCHIVE_FAILED', False)
+        spider.setup_store_acks(crawler)
+        return spider
+
+    def next_requests(self):
+        # 输入来自 PageStream，不读取 start url 队列
+        return []
+
+    async def start(self):
+        from twisted.internet import threads
+
+        self.page_stream.ensure_group()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker)
+        logger.info("解析 %s，进程数 %s", self.page_stream.key, self.workers)
+        self.spider_idle_start_time = int(time.time())
+        while not self.stopped:
+            entries = await threads.deferToThread(self.page_stream.read, self.batch_size)
+            if not entries:
+                idle_time = int(time.time()) - self.spider_idle_start_time
+                if self.max_idle_time and idle_time >= self.max_idle_time:
+                    # start() 结束后 spider_idle 按同样的空闲时间关闭爬虫
+                    logger.info("PageStream 已空闲 %s 秒，停止读取", idle_time)
+                    break
+                continue
+            self.spider_idle_start_time = int(time.time())
+            results = await threads.deferToThread(self.parse_entries, entries)
+            done = []
+            for (entry_id, fields), (status, result) in zip(entries, results):
+                item = self.handle_result(fields, status, result)
+                if item is None:
+                    done.append(entry_id)
+                    continue
+                self.defer_ack(item, partial(self.page_stream.ack, [entry_id]))
+                yield item
+            self.page_stream.ack(done)
+
+    def parse_entries(self, entries):
+        results = list(self.executor.map(_parse_entry, [fields for _, fields in entries]))
+        self.archive_entries(entries, results)
+        return results
+
+    def archive_entries(self, entries, results):
+        """在线程中执行：按解析结果把页面写入快照归档，与 RealestateSpider 直接解析时的状态一致。"""
+        if self.archive is None:
+            return
+        for (_, fields), (status, result) in zip(entries, results):
+            if status == 'error' and not self.archive_failed:
+                continue
+            try:
+                url, page_source, meta, _ = decode_page(fields)
+            except Exception as e:
+                logger.warning("无法解码页面，跳过归档 %s: %s", fields.get('url'), e)
+                continue
+            response = HtmlResponse(url=url, body=page_source, encoding='utf-8', request=scrapy.Request(url, meta=meta))
+            if status == 'item':
+                self.archive_page(response, STATUS_OK, result.get('unique_id'))
+            else:
+                self.archive_page(response, STATUS_SKIPPED if status == 'skipped' else STATUS_FAILED)
+
+    def handle_result(self, fields, status, result):
+        stats = self.crawler.stats
+        stats.inc_value(f'page_stream/parsed/{status}')
+        url = fields['url']
+        meta = json.loads(fields['meta'])
+        if status == 'skipped':
+            return None
+        if status == 'item':
+            item = CombinedRealEstateItem(result)
+            # 工作进程不访问数据库，URL 中没有 unique_id 的房源在这里检查是否已存在
+            unique_id = item.get('unique_id')
+            if meta.get('unique_id') == unique_id or not ListingHelper.exists_by_unique_id(unique_id):
+                return item
+            # 已入库的房源按跳过处理，不重试
+            stats.inc_value('page_stream/parsed/exists')
+            return None
+        else:
+            failure_class, reason = result
+        request = scrapy.Request(url, meta={'retry_attempts': meta.get('retry_attempts', 0)})
+        self.retry_request(request, failure_class, reason, meta=retry_meta(meta, failure_class))
+        return None
+
+    def closed(self, reason):
+        self.stopped = True
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.archive is not None:
+            self.archive.close()
+
+
+def _parse_entry(fields):
+    """在工作进程中解压并解析一条 PageStream 记录。"""
+    try:
+        url, page_source, meta, _ = decode_page(fields)
+    except Exception as e:
+        return 'error', ('default', f"{fields.get('url')}: {e!r}")
+    return build_page(url, page_source, meta)
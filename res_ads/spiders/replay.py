@@ -0,0 +1,130 @@
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+import scrapy
+from scrapy.http import HtmlResponse
+
+from res_ads.items import CombinedRealEstateItem
+from res_ads.parser import ListingParser
+from res_ads.spiders.realestate import ListingItemMixin, RealestateSpider
+from res_ads.utils.archive import STATUS_OK, decode_record, read_frames, read_index, segments
+
+logger = logging.getLogger('replay')
+
+
+class RealestateReplaySpider(ListingItemMixin, scrapy.Spider):
+    """
+    离线重放：用当前的解析逻辑重新解析 SnapshotArchive 中的页面，不需要 AdsPower 和 Redis。
+    解压和解析在进程池中完成（默认使用全部 CPU 核心），item 仍然经过项目配置的 pipeline。
+    进程池中最多同时提交 window 条记录（默认 workers * 4），等待结果在线程中进行，不阻塞 reactor，
+    解析完成一条就输出一条。
+
+    scrapy crawl realestate_replay -a archive=/data/snapshots
+    scrapy crawl realestate_replay -a archive=/data/snapshots -a since=20261001 -a until=20261031 -a workers=8
+    scrapy crawl realestate_replay -a archive=/data/snapshots -a status=ok,failed
+    scrapy crawl realestate_replay -a archive=/data/snapshots -a workers=8 -a window=64
+    """
+    name = "realestate_replay"
+    # 生成的 item 与线上爬虫一致（item['name'] 用于取 NEWS_ACCOUNTS 配置）
+    item_name = "realestate"
+
+    custom_settings = {
+        'DOWNLOADER_MIDDLEWARES': {
+            'res_ads.middlewares.ListingPreflightMiddleware': None,
+            'res_ads.middlewares.AdsPowerBrowserMiddleware': None,
+        },
+    }
+
+    def __init__(self, archive=None, since=None, until=None, status=STATUS_OK, workers=None, window=None,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not archive:
+            raise ValueError("archive 参数不能为空")
+        self.archive_dir = archive
+        self.since = since
+        self.until = until
+        self.statuses = set(status.split(','))
+        self.workers = int(workers) if workers else os.cpu_count()
+        self.window = int(window) if window else self.workers * 4
+        self.parser = ListingParser()
+
+    def listing_exists(self, response, unique_id):
+        # 重放是为了重新解析已入库的房源，不做去重检查
+        return False
+
+    async def start(self):
+        from twisted.internet import threads
+
+        tasks = self.iter_tasks()
+        pending = set()
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker)
+        try:
+            while True:
+                done, pending = await threads.deferToThread(self.next_results, executor, tasks, pending)
+                if not done:
+                    break
+                for future in done:
+                    status, result = future.result()
+                    self.crawler.stats.inc_value(f'replay/{status}')
+                    if status == 'item':
+                        yield CombinedRealEstateItem(result)
+                    elif status == 'error':
+                        logger.warning("重放失败：%s", result[1])
+        finally:
+            # 爬虫提前关闭时不等待还没有完成的记录
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def next_results(self, executor, tasks, pending):
+        """
+        在线程中执行：把进程池中的记录补足到 window 条（读取快照文件也在这里），等待至少一条完成。
+        :return: (已完成的 future, 未完成的 future)，全部处理完时两者都为空
+        """
+        for task in islice(tasks, self.window - len(pending)):
+            pending.add(executor.submit(_replay_record, task))
+        if not pending:
+            return set(), set()
+        return wait(pending, return_when=FIRST_COMPLETED)
+
+    def iter_tasks(self):
+        for path in segments(self.archive_dir, self.since, self.until):
+            entries = [entry for entry in read_index(path) if entry['status'] in self.statuses]
+            logger.info("重放 %s：%s 条记录", path, len(entries))
+            for frame in read_frames(path, entries):
+                yield path, frame
+
+
+_worker = None
+
+
+def init_worker():
+    global _worker
+    _worker = RealestateReplaySpider(archive='-', workers=1)
+
+
+def build_page(url, page_source, meta):
+    """
+    在工作进程中解析一个页面（需要先调用 init_worker），返回 (状态, 结果)：
+    ('item', item 字典)、('skipped', None) 或 ('error', (失败类型, 错误信息))。
+    """
+    try:
+        response = HtmlResponse(url=url, body=page_source, encoding='utf-8',
+                                request=scrapy.Request(url, meta=meta))
+        item = _worker.build_item(response)
+    except Exception as e:
+        return 'error', (RealestateSpider.failure_class(e), f"{url}: {e!r}")
+    if item is None:
+        return 'skipped', None
+    item['name'] = RealestateReplaySpider.item_name
+    return 'item', dict(item)
+
+
+def _replay_record(task):
+    """在工作进程中解压并解析一条快照。"""
+    path, frame = task
+    try:
+        header, page_source = decode_record(path, frame)
+    except Exception as e:
+        return 'error', ('default', f"{path}: {e!r}")
+    return build_page(header['url'], page_source, header['meta'])
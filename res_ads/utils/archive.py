@@ -0,0 +1,163 @@
+import fcntl
+import gzip
+import json
+import logging
+import os
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger('archive')
+
+STATUS_OK = 'ok'
+STATUS_SKIPPED = 'skipped'
+STATUS_FAILED = 'failed'
+
+
+class SnapshotArchive:
+    """
+    浏览器下载的页面快照归档，只追加写入，用于解析逻辑修改后离线重新解析（见 RealestateReplaySpider）。
+
+    按 UTC 日期分段：{directory}/{YYYYMMDD}.snap.zst（没有安装 zstandard 时为 .snap.gz）。
+    每条记录单独压缩为一个 zstd frame / gzip member，内容为一行 JSON 头加页面源码：
+        {"url": ..., "url_md5": ..., "unique_id": ..., "ts": ..., "status": ..., "meta": {...}}\n<html>
+    旁边的 {YYYYMMDD}.idx 每行记录一条的位置（JSON：url_md5, unique_id, ts, status, offset, length），
+    读取时按索引定位，不需要解压整个文件。进程在写完数据、写索引之前退出时，最后一条记录只是读不到，不会损坏已有记录。
+    多个进程（多个 spider、pageparser）可以写同一个分段：每次追加时对数据文件加 flock，
+    在锁内定位到文件末尾取 offset，写完数据和索引后再释放。
+    """
+
+    def __init__(self, directory, compression='zstd', level=3):
+        if compression == 'zstd' and zstandard is None:
+            compression = 'gzip'
+        if compression not in ('zstd', 'gzip'):
+            raise ValueError(f"unknown compression: {compression}")
+        self.directory = directory
+        self.compression = compression
+        self.level = level
+        self._segment = None
+        self._data = None
+        self._index = None
+        if compression == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=level)
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """SNAPSHOT_ARCHIVE_DIR 未设置时返回 None（不启用）。"""
+        directory = settings.get('SNAPSHOT_ARCHIVE_DIR')
+        if not directory:
+            return None
+        return cls(directory,
+                   compression=settings.get('SNAPSHOT_ARCHIVE_COMPRESSION', 'zstd'),
+                   level=settings.getint('SNAPSHOT_ARCHIVE_LEVEL', 3))
+
+    @property
+    def suffix(self):
+        return '.snap.zst' if self.compression == 'zstd' else '.snap.gz'
+
+    def _open(self, segment):
+        if segment == self._segment:
+            return
+        self.close()
+        base = os.path.join(self.directory, segment)
+        self._data = open(base + self.suffix, 'ab')
+        self._index = open(base + '.idx', 'a', encoding='utf-8')
+        self._segment = segment
+
+    def _compress(self, data):
+        if self.compression == 'zstd':
+            return self._compressor.compress(data)
+        return gzip.compress(data, compresslevel=min(self.level, 9))
+
+    def append(self, url, url_md5, page_source, unique_id=None, status=STATUS_OK, meta=None, ts=None):
+        """追加一条快照，返回索引记录。"""
+        ts = ts if ts is not None else time.time()
+        self._open(time.strftime('%Y%m%d', time.gmtime(ts)))
+
+        header = {
+            'url': url,
+            'url_md5': url_md5,
+            'unique_id': unique_id,
+            'ts': ts,
+            'status': status,
+            'meta': meta or {},
+        }
+        if isinstance(page_source, str):
+            page_source = page_source.encode('utf-8')
+        frame = self._compress(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n' + page_source)
+
+        # 其他进程可能在本进程上次写入之后追加过，tell() 不可靠，锁内重新定位到末尾
+        fcntl.flock(self._data.fileno(), fcntl.LOCK_EX)
+        try:
+            offset = self._data.seek(0, os.SEEK_END)
+            self._data.write(frame)
+            self._data.flush()
+
+            entry = {
+                'url_md5': url_md5,
+                'unique_id': unique_id,
+                'ts': ts,
+                'status': status,
+                'offset': offset,
+                'length': len(frame),
+            }
+            self._index.write(json.dumps(entry) + '\n')
+            self._index.flush()
+        finally:
+            fcntl.flock(self._data.fileno(), fcntl.LOCK_UN)
+        return entry
+
+    def close(self):
+        for f in (self._data, self._index):
+            if f is not None:
+                f.close()
+        self._segment = self._data = self._index = None
+
+
+def segments(directory, since=None, until=None):
+    """返回归档目录中的分段（数据文件路径），按日期排序；since/until 为 YYYYMMDD（包含）。"""
+    paths = []
+    for name in os.listdir(directory):
+        if not name.endswith(('.snap.zst', '.snap.gz')):
+            continue
+        day = name.split('.', 1)[0]
+        if (since and day < since) or (until and day > until):
+            continue
+        paths.append(os.path.join(directory, name))
+    return sorted(paths)
+
+
+def read_index(path):
+    """读取数据文件对应的索引，跳过写了一半的最后一行。"""
+    entries = []
+    with open(path.rsplit('.snap.', 1)[0] + '.idx', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning("跳过损坏的索引行：%s", path)
+    return entries
+
+
+def decode_record(path, frame):
+    """解压一条记录，返回 (header, page_source)。"""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ValueError("zstandard is required to read %s" % path)
+        data = zstandard.ZstdDecompressor().decompress(frame)
+    else:
+        data = gzip.decompress(frame)
+    header, _, page_source = data.partition(b'\n')
+    return json.loads(header), page_source.decode('utf-8')
+
+
+def read_frames(path, entries):
+    """按索引读取原始（压缩的）记录，用于把解压/解析分发给其他进程。"""
+    with open(path, 'rb') as f:
+        for entry in entries:
+            f.seek(entry['offset'])
+            yield f.read(entry['length'])
@@ -0,0 +1,35 @@
+import re
+
+# 定义 property_type 映射关系
+PROPERTY_TYPE_MAPPING = {
+    'acreage+semi-rural': 'rural',
+    'residential+land': 'land',
+    'house': 'house',
+    'apartment': 'apartment',
+    'townhouse': 'townhouse',
+    'other': 'other',
+    'unit':'unit',
+    'cropping': 'cropping',
+    'villa': 'villa',
+    'studio': 'studio',
+    'duplex+semi-detached': 'house',
+    'mixed+farming': 'farming',
+    'retirement+living': 'living',
+    # 添加更多映射关系
+}
+
+LISTING_URL_PATTERN = re.compile(r'/property-([\w\+\-]+)-[\w\+\-]+-[\w\+\-]+-(\d+)')
+
+
+def parse_listing_url(url):
+    """
+    从房源 URL 中提取 property type 和 unique_id，不需要加载页面。
+
+    例如 https://www.realestate.com.au/property-house-vic-tarneit-148005336
+    返回 ('house', '148005336')；URL 不符合格式时返回 None。
+    """
+    match = LISTING_URL_PATTERN.search(url)
+    if not match:
+        return None
+    raw_property_type = match.group(1).lower()
+    return PROPERTY_TYPE_MAPPING.get(raw_property_type, 'other'), match.group(2)
@@ -0,0 +1,92 @@
+import base64
+import json
+import logging
+import os
+import socket
+import time
+import zlib
+
+import redis
+
+logger = logging.getLogger('pagestream')
+
+
+def _text(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class PageStream:
+    """
+    浏览器采集的原始页面队列（Redis Stream），采集和解析分离：
+    RealestateSpider 只负责浏览器加载并 publish，RealestatePageParserSpider 在多进程中解析。
+
+    每条记录的字段：url, page（zlib 压缩后 base64，连接开启 decode_responses 时也能传输）,
+    meta（JSON，build_item 需要的 request.meta）, timings（JSON，readiness/metrics）, ts。
+    解析端使用 consumer group，房源写入数据库后才 XACK；消费者退出或写入失败后未确认的记录超过 claim_idle 秒
+    由 XAUTOCLAIM 重新处理，claim_idle 需要大于 LISTING_FLUSH_INTERVAL 加上图片上传的时间。
+    """
+
+    def __init__(self, server, key, maxlen=10000, group='parsers', consumer=None, claim_idle=300):
+        self.server = server
+        self.key = key
+        self.maxlen = maxlen
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_idle = claim_idle
+
+    @classmethod
+    def from_settings(cls, server, settings):
+        """PAGE_STREAM_KEY 未设置时返回 None（不启用，采集后直接在爬虫进程中解析）。"""
+        key = settings.get('PAGE_STREAM_KEY')
+        if not key:
+            return None
+        return cls(server, key,
+                   maxlen=settings.getint('PAGE_STREAM_MAXLEN', 10000),
+                   group=settings.get('PAGE_STREAM_GROUP', 'parsers'),
+                   claim_idle=settings.getint('PAGE_STREAM_CLAIM_IDLE', 300))
+
+    def publish(self, url, page_source, meta=None, timings=None):
+        if isinstance(page_source, str):
+            page_source = page_source.encode('utf-8')
+        fields = {
+            'url': url,
+            'page': base64.b64encode(zlib.compress(page_source)).decode('ascii'),
+            'meta': json.dumps(meta or {}, ensure_ascii=False),
+            'timings': json.dumps(timings or {}),
+            'ts': time.time(),
+        }
+        # 近似裁剪，解析端长时间停止时只保留最近 maxlen 条
+        return self.server.xadd(self.key, fields, maxlen=self.maxlen, approximate=True)
+
+    def ensure_group(self):
+        try:
+            self.server.xgroup_create(self.key, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read(self, count, block_ms=2000):
+        """
+        读取最多 count 条新记录；没有新记录时接管其他消费者超时未确认的记录。
+        :return: [(entry_id, fields)]
+        """
+        response = self.server.xreadgroup(self.group, self.consumer, {self.key: '>'}, count=count, block=block_ms)
+        entries = response[0][1] if response else []
+        if not entries and self.claim_idle:
+            claimed = self.server.xautoclaim(self.key, self.group, self.consumer,
+                                             min_idle_time=self.claim_idle * 1000, count=count)
+            entries = claimed[1]
+            if entries:
+                logger.info("接管 %s 条超时未确认的页面", len(entries))
+        return [(_text(entry_id), {_text(k): _text(v) for k, v in fields.items()})
+                for entry_id, fields in entries if fields]
+
+    def ack(self, entry_ids):
+        if entry_ids:
+            self.server.xack(self.key, self.group, *entry_ids)
+
+
+def decode_page(fields):
+    """返回 (url, page_source, meta, timings)。"""
+    page_source = zlib.decompress(base64.b64decode(fields['page'])).decode('utf-8')
+    return fields['url'], page_source, json.loads(fields['meta']), json.loads(fields.get('timings') or '{}')
@@ -0,0 +1,93 @@
+import hashlib
+import logging
+import os
+import time
+
+logger = logging.getLogger('spool')
+
+
+class MediaSpool:
+    """
+    本地图片缓存目录：浏览器采集时写入已经下载过的图片内容，GCSMediaPipeline 上传时优先读取，避免二次下载。
+    文件名为 md5(url)，写入先写临时文件再 rename，读取方不会读到写了一半的文件。
+    没有被取走的文件（房源跳过、解析失败、内容未变化等）由 discard 删除；
+    遗漏的文件在写入时每隔 cleanup_interval 秒按 max_age 清理一次，长时间运行的爬虫不会无限占用磁盘。
+    """
+
+    def __init__(self, directory, max_age=3600, cleanup_interval=300):
+        self.directory = directory
+        self.max_age = max_age
+        self.cleanup_interval = cleanup_interval
+        self._next_cleanup = time.time() + cleanup_interval
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        MEDIA_SPOOL_DIR 未设置时返回 None（不启用）。
+        CAPTURE_BLOCK_IMAGES 开启时浏览器不下载图片，spool 没有内容可写，两者不能同时使用，此时也返回 None。
+        """
+        directory = settings.get('MEDIA_SPOOL_DIR')
+        if not directory:
+            return None
+        if settings.getbool('CAPTURE_BLOCK_IMAGES', False):
+            logger.warning("CAPTURE_BLOCK_IMAGES 已开启，浏览器不下载图片，忽略 MEDIA_SPOOL_DIR")
+            return None
+        return cls(directory, max_age=settings.getint('MEDIA_SPOOL_MAX_AGE', 3600),
+                   cleanup_interval=settings.getint('MEDIA_SPOOL_CLEANUP_INTERVAL', 300))
+
+    def path(self, url):
+        return os.path.join(self.directory, hashlib.md5(url.encode('utf-8')).hexdigest())
+
+    def put(self, url, data):
+        path = self.path(url)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        if time.time() >= self._next_cleanup:
+            self._next_cleanup = time.time() + self.cleanup_interval
+            self.cleanup()
+
+    def contains(self, url):
+        return os.path.exists(self.path(url))
+
+    def pop(self, url):
+        """读取并删除 url 对应的内容，不存在时返回 None。"""
+        path = self.path(url)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def discard(self, urls):
+        """删除 urls 对应的文件（不再需要的图片），返回删除的数量。"""
+        removed = 0
+        for url in urls:
+            try:
+                os.remove(self.path(url))
+                removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def cleanup(self):
+        """删除超过 max_age 秒未被取走的文件（例如 item 被丢弃的房源）。"""
+        deadline = time.time() - self.max_age
+        removed = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < deadline:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        if removed:
+            logger.info("spool 清理了 %s 个过期文件", removed)
+        return removed
@@ -0,0 +1,190 @@
+"""A compact msgpack serializer for requests stored in redis queues.
+
+Fields of ``Request.to_dict()`` that still hold their default values are
+dropped before packing, and payloads above a threshold are compressed with
+zlib or zstd, optionally primed with a shared dictionary.
+
+Use the module as ``SCHEDULER_SERIALIZER = "scrapy_redis.compactcompat"`` for
+the defaults, or ``"scrapy_redis.compactcompat.CompactSerializer"`` to
+configure it from settings.
+"""
+
+import pickle
+import zlib
+
+import msgpack
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from . import defaults
+
+# First byte of every payload: compression codec, plus a flag when the
+# shared dictionary was used.
+CODEC_RAW = 0x00
+CODEC_ZLIB = 0x01
+CODEC_ZSTD = 0x02
+FLAG_DICT = 0x10
+
+# msgpack ext types for values msgpack can't represent natively.
+EXT_TUPLE = 1
+EXT_PICKLE = 2
+
+
+def _request_defaults():
+    return {
+        "callback": None,
+        "errback": None,
+        "headers": {},
+        "body": b"",
+        "cookies": {},
+        "meta": {},
+        "encoding": "utf-8",
+        "flags": [],
+        "cb_kwargs": {},
+        "dont_filter": False,
+        "method": "GET",
+        "priority": 0,
+    }
+
+
+_DEFAULTS = _request_defaults()
+
+
+def _default(obj):
+    if isinstance(obj, tuple):
+        return msgpack.ExtType(EXT_TUPLE, _pack(list(obj)))
+    return msgpack.ExtType(EXT_PICKLE, pickle.dumps(obj, protocol=-1))
+
+
+def _ext_hook(code, data):
+    if code == EXT_TUPLE:
+        return tuple(_unpack(data))
+    if code == EXT_PICKLE:
+        return pickle.loads(data)
+    return msgpack.ExtType(code, data)
+
+
+def _pack(obj):
+    return msgpack.packb(obj, default=_default, use_bin_type=True, strict_types=True)
+
+
+def _unpack(data):
+    return msgpack.unpackb(
+        data, ext_hook=_ext_hook, raw=False, strict_map_key=False, use_list=True
+    )
+
+
+class CompactSerializer:
+    """Serializer with ``loads`` and ``dumps`` for request dicts.
+
+    Parameters
+    ----------
+    compression : str
+        ``"zlib"``, ``"zstd"`` or ``"none"``. Falls back to zlib when
+        zstandard is not installed.
+    threshold : int
+        Payloads smaller than this many bytes are stored uncompressed.
+    level : int, optional
+        Compression level.
+    dictionary : bytes, optional
+        Shared compression dictionary, e.g. trained on sample requests
+        with ``zstandard.train_dictionary``. Every reader needs the same one.
+
+    """
+
+    def __init__(self, compression="zlib", threshold=512, level=None, dictionary=None):
+        if compression == "zstd" and zstandard is None:
+            compression = "zlib"
+        if compression not in ("zlib", "zstd", "none"):
+            raise ValueError(f"unknown compression: {compression}")
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+        self.dictionary = dictionary
+
+        self._zstd_dict = None
+        if zstandard is not None and dictionary:
+            self._zstd_dict = zstandard.ZstdCompressionDict(dictionary)
+        if zstandard is not None:
+            kwargs = {"dict_data": self._zstd_dict} if self._zstd_dict else {}
+            self._zstd_c = zstandard.ZstdCompressor(level=level or 3, **kwargs)
+            self._zstd_d = zstandard.ZstdDecompressor(**kwargs)
+
+    @classmethod
+    def from_settings(cls, settings):
+        dictionary = None
+        path = settings.get("SCHEDULER_SERIALIZER_DICT")
+        if path:
+            with open(path, "rb") as f:
+                dictionary = f.read()
+        return cls(
+            compression=settings.get(
+                "SCHEDULER_SERIALIZER_COMPRESSION",
+                defaults.SCHEDULER_SERIALIZER_COMPRESSION,
+            ),
+            threshold=settings.getint(
+                "SCHEDULER_SERIALIZER_THRESHOLD",
+                defaults.SCHEDULER_SERIALIZER_THRESHOLD,
+            ),
+            level=settings.getint("SCHEDULER_SERIALIZER_LEVEL") or None,
+            dictionary=dictionary,
+        )
+
+    def dumps(self, obj):
+        if isinstance(obj, dict) and "url" in obj:
+            obj = {k: v for k, v in obj.items() if k not in _DEFAULTS or v != _DEFAULTS[k]}
+        data = _pack(obj)
+        if self.compression == "none" or len(data) < self.threshold:
+            return bytes((CODEC_RAW,)) + data
+
+        flags = FLAG_DICT if self.dictionary else 0
+        if self.compression == "zstd":
+            return bytes((CODEC_ZSTD | flags,)) + self._zstd_c.compress(data)
+        level = self.level if self.level is not None else -1
+        if self.dictionary:
+            c = zlib.compressobj(level, zdict=self.dictionary)
+        else:
+            c = zlib.compressobj(level)
+        return bytes((CODEC_ZLIB | flags,)) + c.compress(data) + c.flush()
+
+    def loads(self, s):
+        header, data = s[0], s[1:]
+        codec = header & 0x0F
+        if header & FLAG_DICT and not self.dictionary:
+            raise ValueError("payload was compressed with a dictionary")
+        if codec == CODEC_ZLIB:
+            if header & FLAG_DICT:
+                d = zlib.decompressobj(zdict=self.dictionary)
+            else:
+                d = zlib.decompressobj()
+            data = d.decompress(data) + d.flush()
+        elif codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise ValueError("zstandard is required to decode this payload")
+            data = self._zstd_d.decompress(data)
+        elif codec != CODEC_RAW:
+            raise ValueError(f"unknown payload header: {header:#x}")
+
+        obj = _unpack(data)
+        if isinstance(obj, dict) and "url" in obj:
+            restored = _request_defaults()
+            restored.update(obj)
+            obj = restored
+        return obj
+
+
+_serializer = CompactSerializer(
+    compression=defaults.SCHEDULER_SERIALIZER_COMPRESSION,
+    threshold=defaults.SCHEDULER_SERIALIZER_THRESHOLD,
+)
+
+
+def loads(s):
+    return _serializer.loads(s)
+
+
+def dumps(obj):
+    return _serializer.dumps(obj)
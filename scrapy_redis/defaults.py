@@ -6,6 +6,7 @@ DUPEFILTER_KEY = "dupefilter:%(timestamp)s"
 PIPELINE_KEY = "%(spider)s:items"
 
 STATS_KEY = "%(spider)s:stats"
+STATS_FLUSH_INTERVAL = 5
 
 REDIS_CLS = redis.StrictRedis
 REDIS_ENCODING = "utf-8"
@@ -22,8 +23,28 @@ SCHEDULER_QUEUE_KEY = "%(spider)s:requests"
 SCHEDULER_QUEUE_CLASS = "scrapy_redis.queue.PriorityQueue"
 SCHEDULER_DUPEFILTER_KEY = "%(spider)s:dupefilter"
 SCHEDULER_DUPEFILTER_CLASS = "scrapy_redis.dupefilter.RFPDupeFilter"
+BLOOMFILTER_CAPACITY = 1000000
+BLOOMFILTER_ERROR_RATE = 0.001
+BLOOMFILTER_GROWTH = 2
+BLOOMFILTER_TIGHTENING = 0.5
 SCHEDULER_PERSIST = False
+SCHEDULER_POP_BATCH_SIZE = 1
+SCHEDULER_SERIALIZER_COMPRESSION = "zlib"
+SCHEDULER_SERIALIZER_THRESHOLD = 512
 START_URLS_KEY = "%(name)s:start_urls"
 START_URLS_AS_SET = False
 START_URLS_AS_ZSET = False
+START_URLS_NOTIFY = False
+START_URLS_NOTIFY_CHANNEL = "%(redis_key)s:notify"
+START_URLS_POLL_INTERVAL = 60
+START_URLS_LEASE_TIME = 0
+START_URLS_LEASE_KEY = "%(redis_key)s:leases"
+START_URLS_REAP_INTERVAL = 60
+RETRY_KEY = "%(redis_key)s:retry"
+RETRY_DEAD_KEY = "%(redis_key)s:dead"
+RETRY_SHARE = 0.25
+# Backoff per failure class: delay = min(cap, base * 2 ** (attempt - 1)).
+RETRY_POLICY = {
+    "default": {"base": 60, "cap": 3600, "max_attempts": 5},
+}
 MAX_IDLE_TIME = 0
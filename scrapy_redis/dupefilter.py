@@ -167,3 +167,251 @@ class RFPDupeFilter(BaseDupeFilter):
             )
             self.logger.debug(msg, {"request": request}, extra={"spider": spider})
             self.logdupes = False
+
+
+# Checks every filter of the scalable bloom filter and, if the fingerprint is
+# new, sets its bits in the newest filter (adding a filter when it is full).
+# Filter parameters are kept in the meta hash at KEYS[1], bitmaps are stored in
+# "<KEYS[1]>:<n>". Returns {seen, filter index}.
+BLOOM_SEEN_SCRIPT = """
+local meta = KEYS[1]
+local h1 = tonumber(ARGV[1])
+local h2 = tonumber(ARGV[2])
+local capacity = tonumber(ARGV[3])
+local error_rate = tonumber(ARGV[4])
+local growth = tonumber(ARGV[5])
+local tightening = tonumber(ARGV[6])
+
+local filters = tonumber(redis.call('HGET', meta, 'filters') or '0')
+
+for i = 0, filters - 1 do
+    local bits = tonumber(redis.call('HGET', meta, 'bits:' .. i))
+    local hashes = tonumber(redis.call('HGET', meta, 'hashes:' .. i))
+    local found = true
+    for j = 0, hashes - 1 do
+        if redis.call('GETBIT', meta .. ':' .. i, (h1 + j * h2) % bits) == 0 then
+            found = false
+            break
+        end
+    end
+    if found then
+        return {1, i}
+    end
+end
+
+local current = filters - 1
+if current < 0 or tonumber(redis.call('HGET', meta, 'count:' .. current)) >=
+        tonumber(redis.call('HGET', meta, 'capacity:' .. current)) then
+    current = filters
+    local cap = math.floor(capacity * growth ^ current)
+    -- per-filter error rates form a geometric series, scale them by
+    -- (1 - tightening) so that their sum stays below error_rate
+    local p = error_rate * (1 - tightening) * tightening ^ current
+    local bits = math.ceil(-cap * math.log(p) / (math.log(2) ^ 2))
+    if bits > 4294967295 then
+        bits = 4294967295
+    end
+    local hashes = math.max(1, math.ceil(bits / cap * math.log(2)))
+    redis.call('HSET', meta, 'filters', current + 1, 'bits:' .. current, bits,
+        'hashes:' .. current, hashes, 'capacity:' .. current, cap, 'count:' .. current, 0)
+end
+
+local bits = tonumber(redis.call('HGET', meta, 'bits:' .. current))
+local hashes = tonumber(redis.call('HGET', meta, 'hashes:' .. current))
+for j = 0, hashes - 1 do
+    redis.call('SETBIT', meta .. ':' .. current, (h1 + j * h2) % bits, 1)
+end
+redis.call('HINCRBY', meta, 'count:' .. current, 1)
+return {0, current}
+"""
+
+
+class BloomDupeFilter(RFPDupeFilter):
+    """Redis-based request duplicates filter backed by a scalable bloom filter.
+
+    Instead of storing every fingerprint in a SET, fingerprints are hashed
+    into redis bitmaps. Lookups and inserts run atomically in a Lua script.
+    When the current filter reaches its capacity a new, larger filter with a
+    tighter error rate is added. Filter ``n`` is built for
+    ``error_rate * (1 - tightening) * tightening ** n``; the false positive
+    rates of all filters add up, and this geometric series keeps the total
+    below ``error_rate`` however many filters are added.
+
+    Settings
+    --------
+    BLOOMFILTER_CAPACITY : int (default: 1000000)
+        Number of fingerprints the first filter holds.
+    BLOOMFILTER_ERROR_RATE : float (default: 0.001)
+        Target false positive rate.
+    BLOOMFILTER_GROWTH : int (default: 2)
+        Capacity multiplier for each additional filter.
+    BLOOMFILTER_TIGHTENING : float (default: 0.5)
+        Error rate multiplier for each additional filter.
+
+    """
+
+    # How often (in requests) to report the fill ratio in stats.
+    stats_interval = 1000
+
+    def __init__(
+        self,
+        server,
+        key,
+        debug=False,
+        capacity=defaults.BLOOMFILTER_CAPACITY,
+        error_rate=defaults.BLOOMFILTER_ERROR_RATE,
+        growth=defaults.BLOOMFILTER_GROWTH,
+        tightening=defaults.BLOOMFILTER_TIGHTENING,
+        stats=None,
+    ):
+        """Initialize the bloom duplicates filter.
+
+        Parameters
+        ----------
+        server : redis.StrictRedis
+            The redis server instance.
+        key : str
+            Redis key of the filter metadata hash. Bitmaps are stored in
+            ``<key>:<n>``.
+        debug : bool, optional
+            Whether to log filtered requests.
+        capacity : int, optional
+            Number of fingerprints the first filter holds.
+        error_rate : float, optional
+            Target false positive rate.
+        growth : int, optional
+            Capacity multiplier for each additional filter.
+        tightening : float, optional
+            Error rate multiplier for each additional filter.
+        stats : scrapy.statscollectors.StatsCollector, optional
+            Where to report the fill ratio.
+
+        """
+        super().__init__(server, key, debug=debug)
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        if not 0 < tightening < 1:
+            raise ValueError("tightening must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.stats = stats
+        self.seen_script = server.register_script(BLOOM_SEEN_SCRIPT)
+        self._requests = 0
+
+    @classmethod
+    def _bloom_params(cls, settings):
+        return {
+            "debug": settings.getbool("DUPEFILTER_DEBUG"),
+            "capacity": settings.getint(
+                "BLOOMFILTER_CAPACITY", defaults.BLOOMFILTER_CAPACITY
+            ),
+            "error_rate": settings.getfloat(
+                "BLOOMFILTER_ERROR_RATE", defaults.BLOOMFILTER_ERROR_RATE
+            ),
+            "growth": settings.getint("BLOOMFILTER_GROWTH", defaults.BLOOMFILTER_GROWTH),
+            "tightening": settings.getfloat(
+                "BLOOMFILTER_TIGHTENING", defaults.BLOOMFILTER_TIGHTENING
+            ),
+        }
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Returns an instance from given settings.
+
+        See ``RFPDupeFilter.from_settings``.
+
+        Parameters
+        ----------
+        settings : scrapy.settings.Settings
+
+        Returns
+        -------
+        BloomDupeFilter
+
+        """
+        server = get_redis_from_settings(settings)
+        key = defaults.DUPEFILTER_KEY % {"timestamp": int(time.time())}
+        return cls(server, key=key, **cls._bloom_params(settings))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        instance = cls.from_settings(crawler.settings)
+        instance.stats = crawler.stats
+        return instance
+
+    @classmethod
+    def from_spider(cls, spider):
+        settings = spider.settings
+        server = get_redis_from_settings(settings)
+        dupefilter_key = settings.get(
+            "SCHEDULER_DUPEFILTER_KEY", defaults.SCHEDULER_DUPEFILTER_KEY
+        )
+        key = dupefilter_key % {"spider": spider.name}
+        stats = getattr(getattr(spider, "crawler", None), "stats", None)
+        return cls(server, key=key, stats=stats, **cls._bloom_params(settings))
+
+    def request_seen(self, request):
+        """Returns True if request was already seen.
+
+        Parameters
+        ----------
+        request : scrapy.http.Request
+
+        Returns
+        -------
+        bool
+
+        """
+        fp = self.request_fingerprint(request)
+        # Two independent 32 bit hashes, combined as h1 + i * h2 (Kirsch-Mitzenmacher).
+        h1 = int(fp[:8], 16)
+        h2 = int(fp[8:16], 16) | 1
+        seen, _ = self.seen_script(
+            keys=[self.key],
+            args=[
+                h1,
+                h2,
+                self.capacity,
+                repr(self.error_rate),
+                self.growth,
+                repr(self.tightening),
+            ],
+        )
+        self._requests += 1
+        if self.stats is not None and self._requests % self.stats_interval == 1:
+            self.report_stats()
+        return seen == 1
+
+    def filter_info(self):
+        """Returns ``(filters, items, capacity)`` of the scalable filter."""
+        meta = self.server.hgetall(self.key)
+        meta = {
+            (k.decode() if isinstance(k, bytes) else k): int(v) for k, v in meta.items()
+        }
+        filters = meta.get("filters", 0)
+        items = sum(meta.get(f"count:{i}", 0) for i in range(filters))
+        capacity = sum(meta.get(f"capacity:{i}", 0) for i in range(filters))
+        return filters, items, capacity
+
+    def fill_ratio(self):
+        """Returns the ratio of stored fingerprints to the total capacity."""
+        _, items, capacity = self.filter_info()
+        return items / capacity if capacity else 0.0
+
+    def report_stats(self):
+        filters, items, capacity = self.filter_info()
+        self.stats.set_value("dupefilter/bloom/filters", filters)
+        self.stats.set_value("dupefilter/bloom/items", items)
+        self.stats.set_value(
+            "dupefilter/bloom/fill_ratio", round(items / capacity, 4) if capacity else 0
+        )
+
+    def clear(self):
+        """Clears the bloom filter bitmaps and metadata."""
+        filters, _, _ = self.filter_info()
+        keys = [f"{self.key}:{i}" for i in range(filters)]
+        self.server.delete(self.key, *keys)
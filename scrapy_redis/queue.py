@@ -67,6 +67,22 @@ class Base:
         """Pop a request"""
         raise NotImplementedError
 
+    def pop_batch(self, count, timeout=0):
+        """Pop up to ``count`` requests.
+
+        Only the first pop blocks (up to ``timeout`` seconds); the rest of the
+        batch is whatever is already available. Subclasses should override
+        this with a single round trip where redis allows it.
+        """
+        requests = []
+        request = self.pop(timeout)
+        while request:
+            requests.append(request)
+            if len(requests) >= count:
+                break
+            request = self.pop()
+        return requests
+
     def clear(self):
         """Clear queue/stack"""
         self.server.delete(self.key)
@@ -112,17 +128,28 @@ class PriorityQueue(Base):
         self.server.execute_command("ZADD", self.key, score, data)
 
     def pop(self, timeout=0):
+        """Pop a request"""
+        requests = self.pop_batch(1, timeout)
+        if requests:
+            return requests[0]
+
+    def pop_batch(self, count, timeout=0):
+        """Pop up to ``count`` requests with the highest priority.
+
+        Uses ZPOPMIN, which atomically takes the lowest scores. With a
+        ``timeout`` the first request is waited for with BZPOPMIN.
         """
-        Pop a request
-        timeout not support in this queue class
-        """
-        # use atomic range/remove using multi/exec
-        pipe = self.server.pipeline()
-        pipe.multi()
-        pipe.zrange(self.key, 0, 0).zremrangebyrank(self.key, 0, 0)
-        results, count = pipe.execute()
-        if results:
-            return self._decode_request(results[0])
+        if timeout > 0:
+            data = self.server.bzpopmin(self.key, timeout)
+            if not data:
+                return []
+            # (key, member, score)
+            results = [data[1]]
+            if count > 1:
+                results.extend(m for m, _ in self.server.zpopmin(self.key, count - 1))
+        else:
+            results = [m for m, _ in self.server.zpopmin(self.key, count)]
+        return [self._decode_request(data) for data in results]
 
 
 class LifoQueue(Base):
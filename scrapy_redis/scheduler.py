@@ -1,4 +1,5 @@
 import importlib
+from collections import deque
 
 from scrapy.utils.misc import load_object
 
@@ -27,6 +28,9 @@ class Scheduler:
         Scheduler dupefilter class.
     SCHEDULER_SERIALIZER : str
         Scheduler serializer.
+    SCHEDULER_POP_BATCH_SIZE : int (default: 1)
+        How many requests to take from redis per round trip. Extra requests
+        are buffered locally and returned to the queue on close.
 
     """
 
@@ -42,6 +46,7 @@ class Scheduler:
         dupefilter_cls=defaults.SCHEDULER_DUPEFILTER_CLASS,
         idle_before_close=0,
         serializer=None,
+        pop_batch_size=defaults.SCHEDULER_POP_BATCH_SIZE,
     ):
         """Initialize scheduler.
 
@@ -65,10 +70,14 @@ class Scheduler:
             Importable path to the dupefilter class.
         idle_before_close : int
             Timeout before giving up.
+        pop_batch_size : int
+            How many requests to pop from redis at once.
 
         """
         if idle_before_close < 0:
             raise TypeError("idle_before_close cannot be negative")
+        if pop_batch_size < 1:
+            raise TypeError("pop_batch_size must be at least 1")
 
         self.server = server
         self.persist = persist
@@ -80,10 +89,13 @@ class Scheduler:
         self.dupefilter_key = dupefilter_key
         self.idle_before_close = idle_before_close
         self.serializer = serializer
+        self.pop_batch_size = pop_batch_size
+        # Requests already popped from redis but not yet handed to the engine.
+        self.buffer = deque()
         self.stats = None
 
     def __len__(self):
-        return len(self.queue)
+        return len(self.queue) + len(self.buffer)
 
     @classmethod
     def from_settings(cls, settings):
@@ -91,6 +103,9 @@ class Scheduler:
             "persist": settings.getbool("SCHEDULER_PERSIST"),
             "flush_on_start": settings.getbool("SCHEDULER_FLUSH_ON_START"),
             "idle_before_close": settings.getint("SCHEDULER_IDLE_BEFORE_CLOSE"),
+            "pop_batch_size": settings.getint(
+                "SCHEDULER_POP_BATCH_SIZE", defaults.SCHEDULER_POP_BATCH_SIZE
+            ),
         }
 
         # If these values are missing, it means we want to use the defaults.
@@ -113,9 +128,18 @@ class Scheduler:
         if not hasattr(dupefilter_cls, "from_spider"):
             kwargs["dupefilter"] = dupefilter_cls.from_settings(settings)
 
-        # Support serializer as a path to a module.
+        # Support serializer as a path to a module or to a serializer class.
         if isinstance(kwargs.get("serializer"), str):
-            kwargs["serializer"] = importlib.import_module(kwargs["serializer"])
+            try:
+                kwargs["serializer"] = importlib.import_module(kwargs["serializer"])
+            except ImportError:
+                serializer = load_object(kwargs["serializer"])
+                if isinstance(serializer, type):
+                    if hasattr(serializer, "from_settings"):
+                        serializer = serializer.from_settings(settings)
+                    else:
+                        serializer = serializer()
+                kwargs["serializer"] = serializer
 
         server = connection.from_settings(settings)
         # Ensure the connection is working.
@@ -155,6 +179,9 @@ class Scheduler:
             spider.log(f"Resuming crawl ({len(self.queue)} requests scheduled)")
 
     def close(self, reason):
+        # Give back requests that were popped but never scheduled.
+        while self.buffer:
+            self.queue.push(self.buffer.popleft())
         if not self.persist:
             self.flush()
 
@@ -172,8 +199,17 @@ class Scheduler:
         return True
 
     def next_request(self):
-        block_pop_timeout = self.idle_before_close
-        request = self.queue.pop(block_pop_timeout)
+        if not self.buffer:
+            block_pop_timeout = self.idle_before_close
+            if self.pop_batch_size > 1 and hasattr(self.queue, "pop_batch"):
+                self.buffer.extend(
+                    self.queue.pop_batch(self.pop_batch_size, block_pop_timeout)
+                )
+            else:
+                request = self.queue.pop(block_pop_timeout)
+                if request:
+                    self.buffer.append(request)
+        request = self.buffer.popleft() if self.buffer else None
         if request and self.stats:
             self.stats.inc_value("scheduler/dequeued/redis", spider=self.spider)
         return request
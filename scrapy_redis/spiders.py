@@ -1,4 +1,7 @@
 import json
+import math
+import os
+import socket
 import time
 from collections.abc import Iterable
 
@@ -6,12 +9,87 @@ from scrapy import FormRequest, signals
 from scrapy import version_info as scrapy_version
 from scrapy.exceptions import DontCloseSpider
 from scrapy.spiders import CrawlSpider, Spider
+from twisted.internet import task
 
 from scrapy_redis.utils import TextColor
 
 from . import connection, defaults
 from .utils import bytes_to_str, is_dict
 
+# Moves up to ARGV[1] messages from the list KEYS[1] into the leases ZSET
+# KEYS[2] (scored by deadline, payload kept in the hash KEYS[3]). Lease ids are
+# "<worker id>:<seq>" with seq from KEYS[4]. Returns {id1, data1, id2, ...}.
+LEASE_POP_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items == 0 then
+    return {}
+end
+redis.call('LTRIM', KEYS[1], #items, -1)
+local now = tonumber(redis.call('TIME')[1])
+local deadline = now + tonumber(ARGV[2])
+local result = {}
+for _, data in ipairs(items) do
+    local id = ARGV[3] .. ':' .. redis.call('INCR', KEYS[4])
+    redis.call('ZADD', KEYS[2], deadline, id)
+    redis.call('HSET', KEYS[3], id, data)
+    result[#result + 1] = id
+    result[#result + 1] = data
+end
+return result
+"""
+
+# Releases the lease ARGV[1]. With ARGV[2] == "1" the payload goes back to the
+# tail of the list KEYS[1]. Only the first ack/nack/reap of a lease has any
+# effect. Returns 1 if the lease was still held.
+LEASE_RELEASE_SCRIPT = """
+if redis.call('ZREM', KEYS[2], ARGV[1]) == 0 then
+    return 0
+end
+local data = redis.call('HGET', KEYS[3], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+if ARGV[2] == '1' and data then
+    redis.call('RPUSH', KEYS[1], data)
+end
+return 1
+"""
+
+# Takes up to ARGV[1] due messages from the retry ZSET KEYS[1]. With a lease
+# time (ARGV[2] > 0) they are leased like LEASE_POP_SCRIPT does, otherwise the
+# returned ids are empty strings. Returns {id1, data1, id2, ...}.
+RETRY_POP_SCRIPT = """
+local now = tonumber(redis.call('TIME')[1])
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, tonumber(ARGV[1]))
+local lease_time = tonumber(ARGV[2])
+local result = {}
+for _, data in ipairs(items) do
+    redis.call('ZREM', KEYS[1], data)
+    local id = ''
+    if lease_time > 0 then
+        id = ARGV[3] .. ':' .. redis.call('INCR', KEYS[4])
+        redis.call('ZADD', KEYS[2], now + lease_time, id)
+        redis.call('HSET', KEYS[3], id, data)
+    end
+    result[#result + 1] = id
+    result[#result + 1] = data
+end
+return result
+"""
+
+# Requeues up to ARGV[1] leases whose deadline has passed.
+LEASE_REAP_SCRIPT = """
+local now = tonumber(redis.call('TIME')[1])
+local ids = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, tonumber(ARGV[1]))
+for _, id in ipairs(ids) do
+    redis.call('ZREM', KEYS[2], id)
+    local data = redis.call('HGET', KEYS[3], id)
+    redis.call('HDEL', KEYS[3], id)
+    if data then
+        redis.call('RPUSH', KEYS[1], data)
+    end
+end
+return #ids
+"""
+
 
 class RedisMixin:
     """Mixin class to implement reading urls from a redis queue."""
@@ -27,6 +105,26 @@ class RedisMixin:
     spider_idle_start_time = int(time.time())
     max_idle_time = None
 
+    # Wakeup notifications, see ``start_notify_listener``.
+    notify_channel = None
+    notify_thread = None
+    notify_pending = False
+    poll_interval = None
+    last_poll_time = 0
+
+    # At-least-once delivery, see ``pop_lease_queue``.
+    lease_time = None
+    lease_key = None
+    reap_task = None
+    worker_id = ""
+    # Whether ``item_scraped`` acknowledges the lease. Spiders whose pipelines
+    # persist items later (e.g. in batches) set this to False and call
+    # ``ack_request`` once the item is stored.
+    ack_on_item_scraped = True
+
+    # Delayed retries, see ``retry_request``.
+    retry_key = None
+
     def start_requests(self):
         """Returns a batch of start requests from redis."""
         return self.next_requests()
@@ -94,6 +192,42 @@ class RedisMixin:
             self.fetch_data = self.pop_list_queue
             self.count_size = self.server.llen
 
+        if self.lease_time is None:
+            self.lease_time = settings.getint(
+                "REDIS_START_URLS_LEASE_TIME", defaults.START_URLS_LEASE_TIME
+            )
+        if self.lease_time:
+            if self.fetch_data != self.pop_list_queue:
+                raise ValueError("leases are only supported for list start urls")
+            self.lease_key = settings.get(
+                "REDIS_START_URLS_LEASE_KEY", defaults.START_URLS_LEASE_KEY
+            ) % {"redis_key": self.redis_key}
+            self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+            self.lease_pop = self.server.register_script(LEASE_POP_SCRIPT)
+            self.lease_release = self.server.register_script(LEASE_RELEASE_SCRIPT)
+            self.lease_reap = self.server.register_script(LEASE_REAP_SCRIPT)
+            self.reap_interval = settings.getint(
+                "REDIS_START_URLS_REAP_INTERVAL", defaults.START_URLS_REAP_INTERVAL
+            )
+            crawler.signals.connect(self.start_reaper, signal=signals.spider_opened)
+            crawler.signals.connect(self.stop_reaper, signal=signals.spider_closed)
+            if self.ack_on_item_scraped:
+                crawler.signals.connect(self._item_done, signal=signals.item_scraped)
+            crawler.signals.connect(self._item_done, signal=signals.item_dropped)
+            crawler.signals.connect(self._item_failed, signal=signals.item_error)
+            crawler.signals.connect(self._callback_failed, signal=signals.spider_error)
+
+        self.retry_key = settings.get("REDIS_RETRY_KEY", defaults.RETRY_KEY) % {
+            "redis_key": self.redis_key
+        }
+        self.retry_dead_key = settings.get(
+            "REDIS_RETRY_DEAD_KEY", defaults.RETRY_DEAD_KEY
+        ) % {"redis_key": self.redis_key}
+        self.retry_share = settings.getfloat("REDIS_RETRY_SHARE", defaults.RETRY_SHARE)
+        self.retry_policy = dict(defaults.RETRY_POLICY)
+        self.retry_policy.update(settings.getdict("REDIS_RETRY_POLICY"))
+        self.retry_pop = self.server.register_script(RETRY_POP_SCRIPT)
+
         if self.max_idle_time is None:
             self.max_idle_time = settings.get(
                 "MAX_IDLE_TIME_BEFORE_CLOSE", defaults.MAX_IDLE_TIME
@@ -108,6 +242,91 @@ class RedisMixin:
         # that's when we will schedule new requests from redis queue
         crawler.signals.connect(self.spider_idle, signal=signals.spider_idle)
 
+        if settings.getbool("REDIS_START_URLS_NOTIFY", defaults.START_URLS_NOTIFY):
+            self.notify_channel = settings.get(
+                "REDIS_START_URLS_NOTIFY_CHANNEL", defaults.START_URLS_NOTIFY_CHANNEL
+            ) % {"redis_key": self.redis_key}
+            self.poll_interval = settings.getint(
+                "REDIS_START_URLS_POLL_INTERVAL", defaults.START_URLS_POLL_INTERVAL
+            )
+            crawler.signals.connect(
+                self.start_notify_listener, signal=signals.spider_opened
+            )
+            crawler.signals.connect(
+                self.stop_notify_listener, signal=signals.spider_closed
+            )
+
+    def start_notify_listener(self):
+        """Subscribe to wakeup notifications for ``redis_key``.
+
+        Producers publish on ``notify_channel`` after pushing data (see
+        ``scrapy_redis.utils.push_start_urls``). Keyspace notifications for
+        ``redis_key`` are handled too when the server has them enabled
+        (``notify-keyspace-events`` containing ``K`` and ``l``/``s``/``z``).
+        The subscription runs in a daemon thread; messages are handed over to
+        the reactor thread.
+        """
+        if self.notify_thread is not None and self.notify_thread.is_alive():
+            return
+        db = self.server.connection_pool.connection_kwargs.get("db", 0)
+        pubsub = self.server.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(
+            **{
+                self.notify_channel: self._notify_received,
+                f"__keyspace@{db}__:{self.redis_key}": self._notify_received,
+            }
+        )
+        self.notify_thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+        self.logger.info(f"Listening for wakeups on '{self.notify_channel}'")
+
+    def stop_notify_listener(self):
+        if self.notify_thread is not None:
+            self.notify_thread.stop()
+            self.notify_thread = None
+
+    def _notify_received(self, message):
+        # Called from the pubsub thread.
+        from twisted.internet import reactor
+
+        reactor.callFromThread(self.wakeup)
+
+    def wakeup(self):
+        """Fetch new requests right away if the spider has nothing to do.
+
+        A busy spider only remembers the wakeup; it fetches on its next
+        ``spider_idle``.
+        """
+        engine = self.crawler.engine
+        if engine is None or engine.spider is None:
+            return
+        if scrapy_version >= (2, 6):
+            idle = engine.spider_is_idle()
+        else:
+            idle = engine.spider_is_idle(self)
+        if not idle:
+            self.notify_pending = True
+            return
+        self.notify_pending = False
+        self.spider_idle_start_time = int(time.time())
+        self.schedule_next_requests()
+
+    def should_poll(self):
+        """Whether ``spider_idle`` has to check redis for new data.
+
+        Without wakeups every idle signal polls. With a live listener redis
+        is polled only after a missed wakeup or every ``poll_interval``
+        seconds as a fallback.
+        """
+        if self.notify_channel is None:
+            return True
+        if self.notify_thread is None or not self.notify_thread.is_alive():
+            self.logger.warning("Wakeup listener is not running, restarting it")
+            self.start_notify_listener()
+            return True
+        if self.notify_pending:
+            return True
+        return time.time() - self.last_poll_time >= self.poll_interval
+
     def pop_list_queue(self, redis_key, batch_size):
         with self.server.pipeline() as pipe:
             pipe.lrange(redis_key, 0, batch_size - 1)
@@ -122,24 +341,203 @@ class RedisMixin:
             datas, _ = pipe.execute()
         return datas
 
+    def pop_lease_queue(self, redis_key, batch_size):
+        """Pops a batch from the list and holds it under a lease.
+
+        Returns ``(lease_id, data)`` pairs. Each message stays in the leases
+        ZSET until it is acknowledged (``ack_request``), put back
+        (``nack_request``) or its lease expires and ``reap_leases`` returns it
+        to the list.
+        """
+        result = self.lease_pop(
+            keys=[
+                redis_key,
+                self.lease_key,
+                f"{self.lease_key}:data",
+                f"{self.lease_key}:seq",
+            ],
+            args=[batch_size, self.lease_time, self.worker_id],
+        )
+        return [
+            (bytes_to_str(result[i], self.redis_encoding), result[i + 1])
+            for i in range(0, len(result), 2)
+        ]
+
+    def pop_due_retries(self, count):
+        """Pops up to ``count`` retries whose backoff has elapsed.
+
+        Returns ``(lease_id, data)`` pairs like ``pop_lease_queue``; lease ids
+        are None when leases are disabled.
+        """
+        if count <= 0:
+            return []
+        result = self.retry_pop(
+            keys=[
+                self.retry_key,
+                self.lease_key or "",
+                f"{self.lease_key}:data" if self.lease_key else "",
+                f"{self.lease_key}:seq" if self.lease_key else "",
+            ],
+            args=[count, self.lease_time or 0, self.worker_id],
+        )
+        return [
+            (bytes_to_str(result[i], self.redis_encoding) or None, result[i + 1])
+            for i in range(0, len(result), 2)
+        ]
+
+    def retry_delay(self, failure_class, attempt):
+        """Returns the backoff in seconds, or None if no attempts are left."""
+        policy = self.retry_policy.get(failure_class) or self.retry_policy["default"]
+        if attempt > policy["max_attempts"]:
+            return None
+        return min(policy["cap"], policy["base"] * 2 ** (attempt - 1))
+
+    def retry_request(self, request, failure_class="default", reason=None, meta=None):
+        """Schedules the message a request was made from for a delayed retry.
+
+        The retry is stored in ``retry_key`` scored by the time it becomes
+        due, with the attempt count, ``failure_class`` and the extra ``meta``
+        (state the next attempt can start from) in its ``meta``.
+        Once the class runs out of attempts the message goes to
+        ``retry_dead_key`` instead. The request's lease, if any, is
+        acknowledged.
+
+        Returns the delay in seconds, or None if the message was dead-lettered.
+        """
+        attempt = request.meta.get("retry_attempts", 0) + 1
+        delay = self.retry_delay(failure_class, attempt)
+        stats = self.crawler.stats
+        if delay is None:
+            self.server.lpush(
+                self.retry_dead_key,
+                json.dumps(
+                    {
+                        "url": request.url,
+                        "meta": {
+                            "retry_attempts": attempt - 1,
+                            "failure_class": failure_class,
+                        },
+                        "reason": str(reason),
+                        "time": int(time.time()),
+                    }
+                ),
+            )
+            stats.inc_value(f"redis_retry/dead/{failure_class}")
+            self.logger.error(
+                f"Giving up {request.url} after {attempt - 1} attempts ({failure_class}): {reason}"
+            )
+        else:
+            data = json.dumps(
+                {
+                    "url": request.url,
+                    "meta": dict(
+                        meta or {}, retry_attempts=attempt, failure_class=failure_class
+                    ),
+                }
+            )
+            self.server.zadd(self.retry_key, {data: time.time() + delay})
+            stats.inc_value(f"redis_retry/scheduled/{failure_class}")
+            self.logger.info(
+                f"Retrying {request.url} in {delay}s (attempt {attempt}, {failure_class}): {reason}"
+            )
+        self.ack_request(request)
+        return delay
+
+    def release_lease(self, lease_id, requeue=False):
+        """Releases a lease, returning its message to the queue if ``requeue``."""
+        return self.lease_release(
+            keys=[self.redis_key, self.lease_key, f"{self.lease_key}:data"],
+            args=[lease_id, 1 if requeue else 0],
+        )
+
+    def ack_request(self, request):
+        """Marks the message the request was made from as processed."""
+        lease_id = request.meta.get("redis_lease") if request is not None else None
+        if lease_id and self.lease_time:
+            self.release_lease(lease_id)
+
+    def nack_request(self, request):
+        """Returns the message the request was made from to the queue now.
+
+        Returns True if the message was requeued, False if its lease was
+        already released (or leases are disabled).
+        """
+        lease_id = request.meta.get("redis_lease") if request is not None else None
+        if lease_id and self.lease_time:
+            return bool(self.release_lease(lease_id, requeue=True))
+        return False
+
+    def reap_leases(self, limit=100):
+        """Requeues messages whose lease expired, e.g. from a crashed worker."""
+        count = self.lease_reap(
+            keys=[self.redis_key, self.lease_key, f"{self.lease_key}:data"],
+            args=[limit],
+        )
+        if count:
+            self.logger.warning(f"Requeued {count} expired leases to '{self.redis_key}'")
+        return count
+
+    def start_reaper(self):
+        self.reap_leases()
+        if self.reap_interval > 0:
+            self.reap_task = task.LoopingCall(self.reap_leases)
+            self.reap_task.start(self.reap_interval, now=False)
+
+    def stop_reaper(self):
+        if self.reap_task is not None and self.reap_task.running:
+            self.reap_task.stop()
+        self.reap_task = None
+
+    def _item_done(self, item, response, spider, **kwargs):
+        if spider is self and response is not None:
+            self.ack_request(response.request)
+
+    def _item_failed(self, item, response, spider, failure):
+        if spider is self and response is not None:
+            self.nack_request(response.request)
+
+    def _callback_failed(self, failure, response, spider):
+        if spider is self and response is not None:
+            self.nack_request(response.request)
+
     def next_requests(self):
         """Returns a request to be scheduled or none."""
         # XXX: Do we need to use a timeout here?
         found = 0
-        datas = self.fetch_data(self.redis_key, self.redis_batch_size)
-        for data in datas:
+        # Due retries take up to ``retry_share`` of the batch.
+        leased = self.pop_due_retries(
+            math.ceil(self.redis_batch_size * self.retry_share)
+        )
+        size = self.redis_batch_size - len(leased)
+        if size > 0 and self.lease_time:
+            leased += self.pop_lease_queue(self.redis_key, size)
+        elif size > 0:
+            datas = self.fetch_data(self.redis_key, size)
+            leased += [(None, data) for data in datas]
+        for lease_id, data in leased:
             reqs = self.make_request_from_data(data)
             if isinstance(reqs, Iterable):
+                made = 0
                 for req in reqs:
+                    if lease_id:
+                        req.meta["redis_lease"] = lease_id
                     yield req
                     # XXX: should be here?
                     found += 1
+                    made += 1
                     self.logger.info(f"start req url:{req.url}")
             elif reqs:
+                if lease_id:
+                    reqs.meta["redis_lease"] = lease_id
                 yield reqs
                 found += 1
+                made = 1
             else:
+                made = 0
+            if not made:
                 self.logger.debug(f"Request not made from data: {data}")
+                if lease_id:
+                    self.release_lease(lease_id)
 
         if found:
             self.logger.debug(f"Read {found} requests from '{self.redis_key}'")
@@ -221,10 +619,16 @@ class RedisMixin:
         or close spider when waiting seconds > MAX_IDLE_TIME_BEFORE_CLOSE.
         MAX_IDLE_TIME_BEFORE_CLOSE will not affect SCHEDULER_IDLE_BEFORE_CLOSE.
         """
-        if self.server is not None and self.count_size(self.redis_key) > 0:
-            self.spider_idle_start_time = int(time.time())
+        if self.should_poll():
+            self.notify_pending = False
+            self.last_poll_time = time.time()
+            if self.server is not None and (
+                self.count_size(self.redis_key) > 0
+                or self.server.zcard(self.retry_key) > 0
+            ):
+                self.spider_idle_start_time = int(time.time())
 
-        self.schedule_next_requests()
+            self.schedule_next_requests()
 
         idle_time = int(time.time()) - self.spider_idle_start_time
         if self.max_idle_time != 0 and idle_time >= self.max_idle_time:
@@ -255,6 +659,29 @@ class RedisSpider(RedisMixin, Spider):
         the messages are retrieve using the LPOP command.
     REDIS_ENCODING : str (default: "utf-8")
         Default encoding to use when decoding messages from redis queue.
+    REDIS_START_URLS_NOTIFY : bool (default: False)
+        Fetch as soon as a producer publishes a wakeup instead of waiting for
+        the next idle signal.
+    REDIS_START_URLS_NOTIFY_CHANNEL : str (default: "<redis_key>:notify")
+        Pub/Sub channel of the wakeups.
+    REDIS_START_URLS_POLL_INTERVAL : int (default: 60)
+        With wakeups enabled, how often to still poll redis as a fallback.
+    REDIS_START_URLS_LEASE_TIME : int (default: 0)
+        When set, messages are leased for this many seconds instead of being
+        removed, and only deleted once acknowledged (item scraped or dropped,
+        or ``ack_request``; see ``ack_on_item_scraped``). Expired leases are
+        put back on the queue.
+    REDIS_START_URLS_REAP_INTERVAL : int (default: 60)
+        How often to look for expired leases.
+    REDIS_RETRY_KEY : str (default: "<redis_key>:retry")
+        ZSET of delayed retries scheduled with ``retry_request``.
+    REDIS_RETRY_DEAD_KEY : str (default: "<redis_key>:dead")
+        List of messages that ran out of retry attempts.
+    REDIS_RETRY_SHARE : float (default: 0.25)
+        Share of each batch that due retries may take.
+    REDIS_RETRY_POLICY : dict
+        ``{failure_class: {"base": s, "cap": s, "max_attempts": n}}``, merged
+        over the ``"default"`` class.
 
     """
 
@@ -287,6 +714,29 @@ class RedisCrawlSpider(RedisMixin, CrawlSpider):
         Use SET operations to retrieve messages from the redis queue.
     REDIS_ENCODING : str (default: "utf-8")
         Default encoding to use when decoding messages from redis queue.
+    REDIS_START_URLS_NOTIFY : bool (default: False)
+        Fetch as soon as a producer publishes a wakeup instead of waiting for
+        the next idle signal.
+    REDIS_START_URLS_NOTIFY_CHANNEL : str (default: "<redis_key>:notify")
+        Pub/Sub channel of the wakeups.
+    REDIS_START_URLS_POLL_INTERVAL : int (default: 60)
+        With wakeups enabled, how often to still poll redis as a fallback.
+    REDIS_START_URLS_LEASE_TIME : int (default: 0)
+        When set, messages are leased for this many seconds instead of being
+        removed, and only deleted once acknowledged (item scraped or dropped,
+        or ``ack_request``; see ``ack_on_item_scraped``). Expired leases are
+        put back on the queue.
+    REDIS_START_URLS_REAP_INTERVAL : int (default: 60)
+        How often to look for expired leases.
+    REDIS_RETRY_KEY : str (default: "<redis_key>:retry")
+        ZSET of delayed retries scheduled with ``retry_request``.
+    REDIS_RETRY_DEAD_KEY : str (default: "<redis_key>:dead")
+        List of messages that ran out of retry attempts.
+    REDIS_RETRY_SHARE : float (default: 0.25)
+        Share of each batch that due retries may take.
+    REDIS_RETRY_POLICY : dict
+        ``{failure_class: {"base": s, "cap": s, "max_attempts": n}}``, merged
+        over the ``"default"`` class.
 
     """
 
@@ -1,9 +1,11 @@
+import threading
 from datetime import datetime
 
 from scrapy.statscollectors import StatsCollector
+from twisted.internet import task
 
 from .connection import from_settings as redis_from_settings
-from .defaults import SCHEDULER_PERSIST, STATS_KEY
+from .defaults import SCHEDULER_PERSIST, STATS_FLUSH_INTERVAL, STATS_KEY
 from .utils import convert_bytes_to_str
 
 
@@ -88,3 +90,197 @@ class RedisStatsCollector(StatsCollector):
         self.spider = None
         if not self.persist:
             self.clear_stats(spider)
+
+
+# Atomically keep the max (ARGV[2] == "max") or min of a hash field.
+COMPARE_AND_SET_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+local value = tonumber(ARGV[3])
+if not current
+        or (ARGV[2] == 'max' and value > tonumber(current))
+        or (ARGV[2] == 'min' and value < tonumber(current)) then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+end
+"""
+
+
+def _to_number(value):
+    """Parse a redis hash value as int or float, leaving other strings as they are."""
+    if isinstance(value, (bytes, str)):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+        try:
+            return float(value)
+        except ValueError:
+            return convert_bytes_to_str(value)
+    return value
+
+
+class BufferedRedisStatsCollector(RedisStatsCollector):
+    """
+    Redis stats collector that aggregates updates in process and writes them
+    to redis in one pipeline every ``STATS_FLUSH_INTERVAL`` seconds.
+
+    ``max_value``/``min_value`` are applied with a Lua script so concurrent
+    processes don't race, and ``get_value``/``get_stats`` merge the values
+    not yet flushed with the ones in redis.
+    """
+
+    def __init__(self, crawler, spider=None):
+        super().__init__(crawler, spider)
+        self.flush_interval = crawler.settings.getfloat(
+            "STATS_FLUSH_INTERVAL", STATS_FLUSH_INTERVAL
+        )
+        self.compare_and_set = self.server.register_script(COMPARE_AND_SET_SCRIPT)
+        # Stats are bumped from downloader threads as well as the reactor.
+        self._lock = threading.Lock()
+        self._task = None
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        # {hash name: {field: value}}
+        self._sets = {}
+        self._starts = {}
+        self._incrs = {}
+        self._maxs = {}
+        self._mins = {}
+
+    def _buffer(self, buffer, spider):
+        return buffer.setdefault(self._get_key(spider), {})
+
+    def _discard_pending(self, name, key):
+        for buffer in (self._starts, self._incrs, self._maxs, self._mins):
+            buffer.get(name, {}).pop(key, None)
+
+    def get_value(self, key, default=None, spider=None):
+        """Return the value of hash stats, including updates not yet flushed"""
+        name = self._get_key(spider)
+        with self._lock:
+            # a buffered set_value overrides whatever is in redis
+            buffered = key in self._sets.get(name, {})
+        stats = {}
+        if not buffered:
+            value = self.server.hget(name, key)
+            if value is not None:
+                # redis returns strings, callers such as LogStats do arithmetic on the value
+                stats = {key: _to_number(value)}
+        self._apply_pending(name, stats, [key])
+        return stats.get(key, default)
+
+    def get_stats(self, spider=None):
+        """Return the values of hash stats, including updates not yet flushed"""
+        name = self._get_key(spider)
+        stats = convert_bytes_to_str(self.server.hgetall(name)) or {}
+        self._apply_pending(name, stats)
+        return stats
+
+    def _apply_pending(self, name, stats, keys=None):
+        """Merge the buffered updates of hash ``name`` (restricted to ``keys``
+        when given) into ``stats``."""
+
+        def pending(buffer):
+            values = buffer.get(name, {})
+            if keys is None:
+                return list(values.items())
+            return [(key, values[key]) for key in keys if key in values]
+
+        with self._lock:
+            for key, value in pending(self._sets):
+                stats[key] = value
+            for key, value in pending(self._starts):
+                stats.setdefault(key, value)
+            for key, count in pending(self._incrs):
+                stats[key] = _to_number(stats.get(key, 0)) + count
+            for key, value in pending(self._maxs):
+                stats[key] = max(_to_number(stats.get(key, value)), value)
+            for key, value in pending(self._mins):
+                stats[key] = min(_to_number(stats.get(key, value)), value)
+
+    def set_value(self, key, value, spider=None):
+        """Set the value according to hash key of stats"""
+        if isinstance(value, datetime):
+            value = value.timestamp()
+        name = self._get_key(spider)
+        with self._lock:
+            self._discard_pending(name, key)
+            self._buffer(self._sets, spider)[key] = value
+
+    def set_stats(self, stats, spider=None):
+        """Set all the hash stats"""
+        for key, value in stats.items():
+            self.set_value(key, value, spider)
+
+    def inc_value(self, key, count=1, start=0, spider=None):
+        """Set increment of value according to key"""
+        with self._lock:
+            if start:
+                self._buffer(self._starts, spider).setdefault(key, start)
+            incrs = self._buffer(self._incrs, spider)
+            incrs[key] = incrs.get(key, 0) + count
+
+    def max_value(self, key, value, spider=None):
+        """Set max value between current and new value"""
+        if isinstance(value, datetime):
+            value = value.timestamp()
+        with self._lock:
+            maxs = self._buffer(self._maxs, spider)
+            maxs[key] = max(maxs.get(key, value), value)
+
+    def min_value(self, key, value, spider=None):
+        """Set min value between current and new value"""
+        if isinstance(value, datetime):
+            value = value.timestamp()
+        with self._lock:
+            mins = self._buffer(self._mins, spider)
+            mins[key] = min(mins.get(key, value), value)
+
+    def clear_stats(self, spider=None):
+        """Clear all the hash stats"""
+        name = self._get_key(spider)
+        with self._lock:
+            for buffer in (self._sets, self._starts, self._incrs, self._maxs, self._mins):
+                buffer.pop(name, None)
+        super().clear_stats(spider)
+
+    def flush(self):
+        """Write all buffered updates to redis in one pipeline"""
+        with self._lock:
+            sets, starts, incrs = self._sets, self._starts, self._incrs
+            maxs, mins = self._maxs, self._mins
+            self._reset_buffer()
+
+        pipe = self.server.pipeline(transaction=False)
+        for name, values in sets.items():
+            if values:
+                pipe.hset(name, mapping=values)
+        for name, values in starts.items():
+            for key, value in values.items():
+                pipe.hsetnx(name, key, value)
+        for name, values in incrs.items():
+            for key, count in values.items():
+                if isinstance(count, float):
+                    pipe.hincrbyfloat(name, key, count)
+                else:
+                    pipe.hincrby(name, key, count)
+        for op, buffer in (("max", maxs), ("min", mins)):
+            for name, values in buffer.items():
+                for key, value in values.items():
+                    self.compare_and_set(keys=[name], args=[key, op, value], client=pipe)
+        # a redis-py pipeline is always truthy, check the queued commands
+        if len(pipe):
+            pipe.execute()
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        if self.flush_interval > 0 and self._task is None:
+            self._task = task.LoopingCall(self.flush)
+            self._task.start(self.flush_interval, now=False)
+
+    def close_spider(self, spider, reason):
+        if self._task is not None and self._task.running:
+            self._task.stop()
+        self._task = None
+        self.flush()
+        super().close_spider(spider, reason)
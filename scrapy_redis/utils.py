@@ -3,6 +3,8 @@ from json import JSONDecodeError
 
 import six
 
+from . import defaults
+
 
 class TextColor:
     HEADER = "\033[95m"
@@ -42,3 +44,24 @@ def convert_bytes_to_str(data, encoding="utf-8"):
     elif isinstance(data, tuple):
         return map(convert_bytes_to_str, data)
     return data
+
+
+def push_start_urls(
+    server, redis_key, *datas, as_set=False, as_zset=False, priority=0, channel=None
+):
+    """Push start url data to ``redis_key`` and wake up listening spiders.
+
+    ``datas`` are pushed with LPUSH (or SADD/ZADD), followed by a PUBLISH on
+    the spider's notify channel in the same round trip.
+    """
+    if channel is None:
+        channel = defaults.START_URLS_NOTIFY_CHANNEL % {"redis_key": redis_key}
+    pipe = server.pipeline()
+    if as_set:
+        pipe.sadd(redis_key, *datas)
+    elif as_zset:
+        pipe.zadd(redis_key, {data: priority for data in datas})
+    else:
+        pipe.lpush(redis_key, *datas)
+    pipe.publish(channel, len(datas))
+    pipe.execute()
@@ -0,0 +1,132 @@
+import pytest
+from scrapy import Request, Spider
+from scrapy.utils.request import request_from_dict
+
+from scrapy_redis import compactcompat, picklecompat
+from scrapy_redis.compactcompat import CODEC_RAW, CODEC_ZLIB, CODEC_ZSTD, FLAG_DICT, CompactSerializer
+
+
+class QueueSpider(Spider):
+    name = "queue"
+
+    def parse(self, response):
+        pass
+
+    def parse_listing(self, response, unique_id=None, page=1):
+        pass
+
+    def errback_listing(self, failure):
+        pass
+
+
+@pytest.fixture
+def spider():
+    return QueueSpider()
+
+
+def sample_requests(spider):
+    """Requests shaped like the ones the realestate spider queues."""
+    url = "https://www.realestate.com.au/property-house-nsw-sydney-140000001"
+    return [
+        Request(url),
+        Request(url, callback=spider.parse, errback=spider.errback_listing),
+        Request(
+            url,
+            callback=spider.parse_listing,
+            errback=spider.errback_listing,
+            priority=-2,
+            dont_filter=True,
+            headers={"Referer": "https://www.realestate.com.au/buy"},
+            meta={
+                "unique_id": "140000001",
+                "property_type": "house",
+                "retry_times": 1,
+                "dims": (1280, 720),
+                "gallery_partial": ["https://i2.au.reastatic.net/1.jpg"] * 40,
+            },
+            cb_kwargs={"unique_id": "140000001", "page": (2, 3)},
+        ),
+        Request(url, method="POST", body=b"\x00\xff" * 600, priority=5, flags=["retry"]),
+    ]
+
+
+def dictionary(spider):
+    return b"".join(compactcompat._pack(r.to_dict(spider=spider)) for r in sample_requests(spider))
+
+
+SERIALIZERS = [
+    pytest.param(lambda spider: picklecompat, id="pickle"),
+    pytest.param(lambda spider: compactcompat, id="compact"),
+    pytest.param(lambda spider: CompactSerializer(compression="none"), id="raw"),
+    pytest.param(lambda spider: CompactSerializer(compression="zlib", threshold=0), id="zlib"),
+    pytest.param(
+        lambda spider: CompactSerializer(compression="zlib", threshold=0, dictionary=dictionary(spider)),
+        id="zlib-dict",
+    ),
+    pytest.param(
+        lambda spider: CompactSerializer(compression="zstd", threshold=0),
+        id="zstd",
+        marks=pytest.mark.skipif(compactcompat.zstandard is None, reason="zstandard not installed"),
+    ),
+    pytest.param(
+        lambda spider: CompactSerializer(compression="zstd", threshold=0, dictionary=dictionary(spider)),
+        id="zstd-dict",
+        marks=pytest.mark.skipif(compactcompat.zstandard is None, reason="zstandard not installed"),
+    ),
+]
+
+
+@pytest.mark.parametrize("make_serializer", SERIALIZERS)
+def test_round_trip(make_serializer, spider):
+    serializer = make_serializer(spider)
+    for request in sample_requests(spider):
+        expected = request.to_dict(spider=spider)
+        decoded = request_from_dict(serializer.loads(serializer.dumps(expected)), spider=spider)
+        assert decoded.to_dict(spider=spider) == expected
+        assert decoded.meta == request.meta
+        assert decoded.cb_kwargs == request.cb_kwargs
+        assert decoded.priority == request.priority
+
+
+@pytest.mark.parametrize(
+    "compression, dictionary_used, codec",
+    [
+        ("none", False, CODEC_RAW),
+        ("zlib", False, CODEC_ZLIB),
+        ("zlib", True, CODEC_ZLIB | FLAG_DICT),
+        pytest.param(
+            "zstd", False, CODEC_ZSTD,
+            marks=pytest.mark.skipif(compactcompat.zstandard is None, reason="zstandard not installed"),
+        ),
+        pytest.param(
+            "zstd", True, CODEC_ZSTD | FLAG_DICT,
+            marks=pytest.mark.skipif(compactcompat.zstandard is None, reason="zstandard not installed"),
+        ),
+    ],
+)
+def test_payload_header(compression, dictionary_used, codec, spider):
+    serializer = CompactSerializer(
+        compression=compression,
+        threshold=0,
+        dictionary=dictionary(spider) if dictionary_used else None,
+    )
+    payload = serializer.dumps(sample_requests(spider)[2].to_dict(spider=spider))
+    assert payload[0] == codec
+
+
+def test_small_payload_not_compressed(spider):
+    payload = CompactSerializer(compression="zlib").dumps(Request("https://a.example/").to_dict(spider=spider))
+    assert payload[0] == CODEC_RAW
+
+
+def test_defaults_dropped(spider):
+    payload = CompactSerializer(compression="none").dumps(Request("https://a.example/").to_dict(spider=spider))
+    assert compactcompat._unpack(payload[1:]) == {"url": "https://a.example/"}
+
+
+def test_dictionary_required(spider):
+    payload = CompactSerializer(compression="zlib", threshold=0, dictionary=dictionary(spider)).dumps(
+        sample_requests(spider)[2].to_dict(spider=spider)
+    )
+    with pytest.raises(ValueError):
+        CompactSerializer(compression="zlib").loads(payload)
@@ -0,0 +1,296 @@
+"""
+房源解析基准：在保存的房源页面（fixtures）上统计每个解析函数的耗时（µs/页）、内存峰值和 整个文档范围的 XPath 扫描次数，
+并校验 build_item 的输出与 expected 一致。完全离线运行，不需要浏览器、Redis 和数据库，
+只导入 res_ads.parser、res_ads.extract 和 res_ads.items（不加载项目 settings，不连接数据库）。
+
+fixtures 目录中每个房源两个文件：<name>.html（页面源码）和 <name>.json（{"url", "meta", "expected"}），
+meta 是 build_item 需要的 request.meta（gallery 等），expected 是期望的 item。
+fixtures 应当是线上抓取的真实页面：用 --from-archive 从快照归档导出，导出时会脱敏（经纪人电话、邮箱，
+浏览器 profile 等），提交前再人工检查一遍。tools/fixtures 在 .gitattributes 中排除了 git-crypt。
+
+用法：
+    # 从快照归档导出 fixtures，第一次运行时以当前解析结果作为 expected
+    python tools/bench_parser.py --from-archive /data/snapshots --limit 50
+    # 运行基准并保存为 baseline（使用默认的 -n 20；耗时与机器有关，在运行基准的机器上重新保存）
+    python tools/bench_parser.py --save-baseline tools/fixtures/parser_baseline.json
+    # 修改解析逻辑后与 baseline 比较，变慢超过 tolerance、扫描次数增加或输出不一致时退出码为 1
+    python tools/bench_parser.py --baseline tools/fixtures/parser_baseline.json
+    # 有意修改输出后更新 expected
+    python tools/bench_parser.py --update-expected
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsel
+from scrapy import Selector
+
+from res_ads.items import CombinedRealEstateItem
+from res_ads import extract
+from res_ads.extract import clear_document_cache
+from res_ads.parser import ListingParser, extract_embedded_state
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'listings')
+
+# 与线上 spider 的 name 一致，expected 中的 item['name']
+SPIDER_NAME = 'realestate'
+
+# 导出 fixtures 时保留的 request.meta 字段（不保存 browser_user_id 等与机器相关的信息）
+FIXTURE_META_KEYS = ('gallery', 'off_market', 'unique_id', 'property_type')
+
+# 脱敏：经纪人的邮箱和电话（页面源码和内嵌状态中都有）
+EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+PHONE_RE = re.compile(r'(?<![\w.])(?:\+?61[ -]?|0)[2-478](?:[ -]?\d){8}(?!\d)')
+
+# XPath 回退函数，签名为 (sel, item)
+XPATH_FUNCTIONS = (
+    'parse_address',
+    'parse_primary_features',
+    'parse_property_features',
+    'parse_agent_and_agency',
+    'parse_price',
+    'parse_coordinates',
+    'parse_description',
+    'parse_statement_pdf',
+)
+
+_xpath_calls = 0
+_xpath = parsel.Selector.xpath
+
+
+def _counting_xpath(self, query, *args, **kwargs):
+    global _xpath_calls
+    # 只统计整个文档范围的查询，区块/元素内的相对查询（./、.//）代价很小
+    if query.lstrip().startswith('/'):
+        _xpath_calls += 1
+    return _xpath(self, query, *args, **kwargs)
+
+
+def _counting(compiled):
+    def evaluate(node):
+        global _xpath_calls
+        _xpath_calls += 1
+        return compiled(node)
+    return evaluate
+
+
+def instrument_xpath():
+    """统计整个文档范围的 XPath 扫描次数：Selector.xpath 的绝对路径查询和 ListingDocument 的区块定位。"""
+    parsel.Selector.xpath = _counting_xpath
+    extract.COMPILED_SECTIONS = {name: _counting(compiled) for name, compiled in extract.COMPILED_SECTIONS.items()}
+
+
+def load_fixtures(directory):
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.html'):
+            continue
+        base = os.path.join(directory, name[:-len('.html')])
+        with open(base + '.html', encoding='utf-8') as f:
+            page_source = f.read()
+        with open(base + '.json', encoding='utf-8') as f:
+            fixture = json.load(f)
+        fixture['name'] = os.path.basename(base)
+        fixture['page_source'] = page_source
+        fixture['path'] = base + '.json'
+        fixtures.append(fixture)
+    return fixtures
+
+
+def sanitize(page_source):
+    """替换页面中的邮箱和电话号码，不改变页面结构，解析结果中只有这些字段不同。"""
+    page_source = EMAIL_RE.sub('agent@example.com', page_source)
+    return PHONE_RE.sub('0400 000 000', page_source)
+
+
+def export_archive(archive_dir, directory, limit):
+    """从 SnapshotArchive 导出解析成功（status=ok）的页面作为 fixtures，页面和 meta 都会脱敏。"""
+    # 只有导出时需要读归档
+    from res_ads.utils.archive import decode_record, read_frames, read_index, segments
+
+    os.makedirs(directory, exist_ok=True)
+    exported = 0
+    for path in segments(archive_dir):
+        entries = [entry for entry in read_index(path) if entry['status'] == 'ok']
+        for frame in read_frames(path, entries):
+            header, page_source = decode_record(path, frame)
+            name = header['unique_id'] or header['url_md5']
+            meta = {key: value for key, value in (header['meta'] or {}).items() if key in FIXTURE_META_KEYS}
+            with open(os.path.join(directory, name + '.html'), 'w', encoding='utf-8') as f:
+                f.write(sanitize(page_source))
+            with open(os.path.join(directory, name + '.json'), 'w', encoding='utf-8') as f:
+                json.dump({'url': header['url'], 'meta': meta, 'expected': None}, f, ensure_ascii=False)
+            exported += 1
+            if exported >= limit:
+                return exported
+    return exported
+
+
+def normalize(item):
+    return json.loads(json.dumps(dict(item), default=str, sort_keys=True)) if item is not None else None
+
+
+def build_item(parser, fixture):
+    # 与 ListingItemMixin.build_item 相同，只是不检查房源是否已入库
+    sel = Selector(text=fixture['page_source'])
+    return parser.build_item(fixture['url'], sel, fixture.get('meta') or {}, SPIDER_NAME)
+
+
+def new_item():
+    # 与 build_item 中的初始状态一致
+    return CombinedRealEstateItem(origin_images=[], image_meta={})
+
+
+def bench_functions(parser, fixture, number):
+    """返回 {函数: (µs/次, 文档扫描次数/次, 内存峰值 KiB)}，每个函数使用新的 item、同一个 Selector。"""
+    global _xpath_calls
+    url = fixture['url']
+
+    def selector():
+        return Selector(text=fixture['page_source'])
+
+    sel = selector()
+    calls = {
+        'selector': selector,
+        'extract_embedded_state': lambda: extract_embedded_state(sel),
+        'parse_property_id_type': lambda: parser.parse_property_id_type(url, sel, new_item()),
+        'parse': lambda: parser.parse(url, sel, new_item()),
+        'build_item': lambda: build_item(parser, fixture),
+    }
+    for name in XPATH_FUNCTIONS:
+        calls[name] = (lambda func: lambda: func(sel, new_item()))(getattr(parser, name))
+
+    results = {}
+    for name, call in calls.items():
+        def run():
+            # 每次都重新定位区块，各函数的耗时包含区块扫描
+            clear_document_cache()
+            try:
+                call()
+            except Exception:
+                # URL 中没有 property ID 等情况，耗时仍然计入
+                pass
+
+        _xpath_calls = 0
+        run()
+        scans = _xpath_calls
+
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # 取多轮中最快的一轮，减少其他进程造成的抖动
+        seconds = min(timeit.repeat(run, number=number, repeat=3)) / number
+        results[name] = (seconds * 1e6, scans, peak / 1024)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, current in results.items():
+        previous = baseline['functions'].get(name)
+        if previous is None:
+            continue
+        if current['us'] > previous['us'] * (1 + tolerance):
+            regressions.append(f"{name}: {previous['us']:.1f} -> {current['us']:.1f} µs")
+        if current['scans'] > previous.get('scans', current['scans']):
+            regressions.append(f"{name}: scans {previous['scans']:.1f} -> {current['scans']:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help='fixtures 目录')
+    parser.add_argument('-n', type=int, default=20, help='每个函数在每个页面上重复的次数')
+    parser.add_argument('--from-archive', help='从 SnapshotArchive 目录导出 fixtures 后退出')
+    parser.add_argument('--limit', type=int, default=50, help='导出的页面数')
+    parser.add_argument('--update-expected', action='store_true', help='用当前解析结果覆盖 expected')
+    parser.add_argument('--baseline', help='与 baseline JSON 比较')
+    parser.add_argument('--save-baseline', help='把本次结果保存为 baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='允许的耗时增长比例')
+    args = parser.parse_args()
+
+    if args.from_archive:
+        count = export_archive(args.from_archive, args.fixtures, args.limit)
+        print(f"exported {count} fixtures to {args.fixtures}, expected items are recorded on the next run")
+        return 0
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"no fixtures in {args.fixtures}")
+        return 1
+
+    listing_parser = ListingParser()
+    instrument_xpath()
+
+    # 输出校验
+    mismatches = recorded = 0
+    for fixture in fixtures:
+        try:
+            actual = normalize(build_item(listing_parser, fixture))
+        except Exception as e:
+            actual = {'error': repr(e)}
+        if args.update_expected or fixture.get('expected') is None:
+            with open(fixture['path'], 'w', encoding='utf-8') as f:
+                json.dump({'url': fixture['url'], 'meta': fixture.get('meta') or {}, 'expected': actual},
+                          f, ensure_ascii=False, indent=1, sort_keys=True)
+            recorded += 1
+            continue
+        expected = fixture['expected']
+        if actual != expected:
+            mismatches += 1
+            fields = sorted(key for key in set(expected) | set(actual) if expected.get(key) != actual.get(key))
+            print(f"MISMATCH {fixture['name']}: {', '.join(fields)}")
+    if recorded:
+        print(f"recorded expected items for {recorded} fixtures")
+    checked = len(fixtures) - recorded
+    if checked:
+        print(f"output check: {checked - mismatches}/{checked} fixtures match")
+
+    totals = {}
+    for fixture in fixtures:
+        for name, (us, scans, peak) in bench_functions(listing_parser, fixture, args.n).items():
+            total = totals.setdefault(name, [0.0, 0, 0.0])
+            total[0] += us
+            total[1] += scans
+            total[2] = max(total[2], peak)
+    results = {
+        name: {'us': us / len(fixtures), 'scans': scans / len(fixtures), 'peak_kib': peak}
+        for name, (us, scans, peak) in totals.items()
+    }
+
+    print(f"{'function':<26}{'µs/page':>12}{'scans/page':>12}{'peak KiB':>12}")
+    for name, result in results.items():
+        print(f"{name:<26}{result['us']:>12.1f}{result['scans']:>12.1f}{result['peak_kib']:>12.1f}")
+
+    status = 1 if mismatches else 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('n', args.n) != args.n or baseline.get('fixtures', len(fixtures)) != len(fixtures):
+            # 重复次数或页面不同，µs/page 不可比
+            print(f"WARNING baseline recorded with -n {baseline.get('n')} on {baseline.get('fixtures')} fixtures, "
+                  f"this run uses -n {args.n} on {len(fixtures)}")
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            status = 1
+        else:
+            print(f"no regressions against {args.baseline}")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'fixtures': len(fixtures), 'n': args.n, 'functions': results}, f, indent=1)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+比较 scrapy_redis 队列序列化器：每个 request 的字节数和编码/解码耗时（µs）。
+
+往返校验（meta、cb_kwargs、priority 等）在 tests/test_compactcompat.py 中，用 python -m pytest tests 运行。
+
+用法：python tools/bench_serializer.py [-n 20000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy import Request, Spider
+
+from scrapy_redis import compactcompat, picklecompat
+from scrapy_redis.compactcompat import CompactSerializer
+
+
+class BenchSpider(Spider):
+    name = 'bench'
+
+    def parse(self, response):
+        pass
+
+    def errback_listing(self, failure):
+        pass
+
+
+def sample_requests(spider):
+    """与 realestate spider 实际入队的 request 形态一致的样本。"""
+    requests = []
+    for i in range(200):
+        url = f'https://www.realestate.com.au/property-house-nsw-sydney-{140000000 + i}'
+        requests.append(Request(url, callback=spider.parse, errback=spider.errback_listing))
+        requests.append(Request(
+            url,
+            callback=spider.parse,
+            errback=spider.errback_listing,
+            priority=i % 3,
+            dont_filter=True,
+            headers={'Referer': 'https://www.realestate.com.au/buy'},
+            meta={
+                'unique_id': str(140000000 + i),
+                'property_type': 'house',
+                'retry_times': 1,
+                'dims': (1280, 720),
+            },
+        ))
+    return requests
+
+
+def bench(name, serializer, dicts, number):
+    payloads = [serializer.dumps(d) for d in dicts]
+    size = sum(len(p) for p in payloads) / len(payloads)
+    encode = timeit.timeit(lambda: [serializer.dumps(d) for d in dicts], number=number) / (number * len(dicts))
+    decode = timeit.timeit(lambda: [serializer.loads(p) for p in payloads], number=number) / (number * len(dicts))
+    print(f"{name:<28}{size:>10.1f}{encode * 1e6:>12.2f}{decode * 1e6:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=20000, help='每个序列化器编码/解码的 request 总数')
+    args = parser.parse_args()
+
+    spider = BenchSpider()
+    requests = sample_requests(spider)
+    dicts = [r.to_dict(spider=spider) for r in requests]
+    number = max(1, args.n // len(dicts))
+
+    # 用一部分样本作为共享字典，模拟线上预先训练好的字典
+    dictionary = b''.join(compactcompat._pack(d) for d in dicts[:20])
+
+    serializers = [
+        ('pickle', picklecompat),
+        ('compact', compactcompat),
+        ('compact raw', CompactSerializer(compression='none')),
+        ('compact zlib (all)', CompactSerializer(compression='zlib', threshold=0)),
+        ('compact zlib + dict', CompactSerializer(compression='zlib', threshold=0, dictionary=dictionary)),
+    ]
+    if compactcompat.zstandard is not None:
+        serializers.append(('compact zstd (all)', CompactSerializer(compression='zstd', threshold=0)))
+        serializers.append((
+            'compact zstd + dict',
+            CompactSerializer(compression='zstd', threshold=0, dictionary=dictionary),
+        ))
+
+    print(f"{'serializer':<28}{'bytes/req':>10}{'encode µs':>12}{'decode µs':>12}")
+    for name, serializer in serializers:
+        bench(name, serializer, dicts, number)
+
+
+if __name__ == '__main__':
+    main()